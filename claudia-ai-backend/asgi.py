@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Ponto de entrada ASGI da Claudia.AI
+Use com servidores ASGI como Uvicorn: uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+from src.asgi import create_asgi_app
+
+# Criar instância da aplicação ASGI
+app = create_asgi_app()
+
+if __name__ == '__main__':
+    # Para desenvolvimento local
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
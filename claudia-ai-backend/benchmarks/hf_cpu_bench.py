@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark do Hugging Face na CPU: tokens/s e pico de memória (RSS) do caminho
+anterior (float32, no_grad, threads padrão do PyTorch) contra as
+configurações de HF_DTYPE, HF_STATIC_CACHE e HF_COMPILE. Cada modo roda em
+um processo próprio, para que o pico de RSS de um não contamine o outro:
+
+    python benchmarks/hf_cpu_bench.py --model microsoft/DialoGPT-medium --tokens 64
+    python benchmarks/hf_cpu_bench.py --modes baseline,int8,bfloat16 --threads 8
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Variáveis HF_* de cada modo (baseline reproduz o caminho anterior)
+MODES = {
+    'baseline': None,
+    'float32': {'HF_DTYPE': 'float32'},
+    'bfloat16': {'HF_DTYPE': 'bfloat16'},
+    'int8': {'HF_DTYPE': 'int8'},
+    'static': {'HF_DTYPE': 'float32', 'HF_STATIC_CACHE': 'true'},
+    'compile': {'HF_DTYPE': 'float32', 'HF_STATIC_CACHE': 'true', 'HF_COMPILE': 'true'},
+}
+
+PROMPT = ("Usuário: Olá! Pode me explicar em poucas palavras como funciona a fotossíntese?\n"
+          "Claudia:")
+
+
+def peak_rss_mb():
+    # ru_maxrss vem em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(mode, model_name, tokens, runs):
+    """Executa no processo filho: carrega o modelo no modo dado e mede a geração"""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    started = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    runtime = None
+    if MODES[mode] is not None:
+        sys.path.insert(0, ROOT)
+        from src.services.hf_runtime import HFRuntimeConfig
+
+        runtime = HFRuntimeConfig.from_env()
+        model = runtime.prepare(model)
+        runtime.apply_threads()
+    load_seconds = time.perf_counter() - started
+    inputs = tokenizer.encode(PROMPT, return_tensors='pt')
+
+    def generate():
+        # Mesmo número de tokens em todos os modos: sem parada antecipada no EOS
+        kwargs = dict(min_new_tokens=tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        if runtime is None:
+            with torch.no_grad():
+                return model.generate(inputs, max_length=inputs.shape[1] + tokens, **kwargs)
+        with torch.inference_mode():
+            return model.generate(inputs, max_new_tokens=tokens, **kwargs)
+
+    # Aquecimento (inclui a compilação no modo compile)
+    warmup_started = time.perf_counter()
+    generate()
+    warmup_seconds = time.perf_counter() - warmup_started
+
+    rates = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        outputs = generate()
+        rates.append((outputs.shape[1] - inputs.shape[1]) / (time.perf_counter() - started))
+
+    return {
+        'mode': mode,
+        'load_seconds': load_seconds,
+        'warmup_seconds': warmup_seconds,
+        'tokens_per_second': statistics.median(rates),
+        'peak_rss_mb': peak_rss_mb(),
+        'threads': torch.get_num_threads(),
+        'runtime': runtime.to_dict() if runtime else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do Hugging Face na CPU')
+    parser.add_argument('--model', default=os.getenv('HF_MODEL_NAME', 'microsoft/DialoGPT-medium'))
+    parser.add_argument('--modes', default='baseline,float32,bfloat16,int8,static',
+                        help=f"modos separados por vírgula ({', '.join(MODES)})")
+    parser.add_argument('--tokens', type=int, default=64, help='tokens gerados por medição')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--threads', default=None, help='HF_NUM_THREADS dos modos otimizados (padrão: auto)')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.model, args.tokens, args.runs)))
+        return 0
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"modos desconhecidos: {', '.join(unknown)}")
+
+    print(f"modelo: {args.model}, {args.tokens} tokens por geração, mediana de {args.runs} execuções")
+    print(f"{'modo':<9} {'dtype':<9} {'threads':>7} {'carga':>7} {'aquec.':>7} {'tok/s':>8} {'pico RSS':>10}")
+    baseline = None
+    for mode in modes:
+        env = dict(os.environ, CUDA_VISIBLE_DEVICES='')
+        env.update(MODES[mode] or {})
+        if args.threads and MODES[mode] is not None:
+            env['HF_NUM_THREADS'] = args.threads
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', mode, '--model', args.model,
+             '--tokens', str(args.tokens), '--runs', str(args.runs)],
+            cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()[-1:] or ['erro desconhecido']
+            print(f"{mode:<9} falhou: {error[0]}")
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        dtype = result['runtime']['dtype'] if result['runtime'] else 'float32'
+        speedup = ''
+        if mode == 'baseline':
+            baseline = result
+        elif baseline:
+            speedup = (f"  ({result['tokens_per_second'] / baseline['tokens_per_second']:.2f}x tok/s, "
+                       f"{result['peak_rss_mb'] - baseline['peak_rss_mb']:+.0f} MB)")
+        print(f"{mode:<9} {dtype:<9} {result['threads']:>7} {result['load_seconds']:>6.1f}s "
+              f"{result['warmup_seconds']:>6.1f}s {result['tokens_per_second']:>8.2f} "
+              f"{result['peak_rss_mb']:>8.0f} MB{speedup}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da serialização JSON das respostas
+Compara objetos ORM + to_dict() + encoder padrão do Flask (forma anterior) com
+linhas Core serializadas pelo provider da biblioteca padrão e pelo orjson, na
+listagem de conversas, na janela de mensagens e nos eventos SSE:
+
+    python benchmarks/json_bench.py --conversations 200 --messages 1000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('AI_MODEL_TYPE', 'demo')
+
+
+def measure(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da serialização JSON')
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='json-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    try:
+        from flask.json.provider import DefaultJSONProvider
+        from sqlalchemy.orm import undefer
+        from src.json_provider import OrjsonProvider, StdlibJSONProvider
+        from src.main import create_app
+        from src.models.conversation import Conversation, Message
+        from src.models.user import db
+        from src.services.message_writer import insert_messages, message_row
+
+        app = create_app()
+        with app.app_context():
+            conversations = [Conversation(user_id=1, title=f'Conversa {i}', metadata_dict={'origem': 'bench'})
+                             for i in range(args.conversations)]
+            db.session.add_all(conversations)
+            db.session.commit()
+            target = conversations[0].id
+            insert_messages([
+                message_row(target, 'user' if j % 2 == 0 else 'assistant', 'Olá, tudo bem? ' * 20,
+                            metadata_dict={'model': 'demo-mode', 'status': 'demo', 'usage_tokens': 42})
+                for j in range(args.messages)
+            ])
+
+            count = Conversation.message_count_subquery().label('message_count')
+            providers = {
+                'stdlib': StdlibJSONProvider(app),
+                'orjson': OrjsonProvider(app)
+            }
+            flask_default = DefaultJSONProvider(app)
+
+            def list_before():
+                db.session.expunge_all()
+                rows = db.session.query(Conversation, count).all()
+                return flask_default.dumps([conv.to_dict(message_count=n) for conv, n in rows])
+
+            def list_rows(provider):
+                rows = db.session.execute(db.select(*Conversation.json_columns(), count)).all()
+                return provider.dumps([row._asdict() for row in rows])
+
+            def window_before():
+                db.session.expunge_all()
+                messages = Message.query.filter_by(conversation_id=target).options(
+                    undefer(Message.metadata_json)
+                ).order_by(Message.created_at, Message.id)
+                return [flask_default.dumps(msg.to_dict()) for msg in messages.yield_per(200)]
+
+            def window_rows(provider):
+                rows = db.session.execute(db.select(*Message.json_columns()).where(
+                    Message.conversation_id == target
+                ).order_by(Message.created_at, Message.id).execution_options(yield_per=200))
+                return [provider.dumps(row._asdict()) for row in rows]
+
+            chunk = {'chunk': 'Olá! ', 'is_final': False, 'model': 'demo-mode',
+                     'timestamp': datetime.now().isoformat()}
+
+            cases = [
+                (f'listagem ({args.conversations} conversas)', list_before, list_rows),
+                (f'janela ({args.messages} mensagens)', window_before, window_rows),
+                (f'SSE ({args.chunks} eventos)',
+                 lambda: [f"data: {json.dumps(chunk)}\n\n" for _ in range(args.chunks)],
+                 lambda provider: [f"data: {provider.dumps(chunk)}\n\n" for _ in range(args.chunks)])
+            ]
+            for label, before, rows in cases:
+                baseline = measure(before, args.repeat)
+                line = f"{label:<28} antes={baseline:8.2f}ms"
+                for name, provider in providers.items():
+                    elapsed = measure(lambda: rows(provider), args.repeat)
+                    line += f"  {name}={elapsed:8.2f}ms ({baseline / elapsed:4.1f}x)"
+                print(line)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark do cliente OpenAI gerenciado contra o servidor stub local
+Compara um cliente novo por chamada (sem reuso de conexão nem retentativas)
+com o OpenAIClient compartilhado, sob carga concorrente:
+
+    python benchmarks/openai_client_bench.py --concurrency 32 --requests 400
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.openai_stub_server import start_stub_server
+from src.services.openai_client import OpenAIClient
+
+REQUEST = {
+    'model': 'gpt-3.5-turbo',
+    'messages': [{'role': 'user', 'content': 'Olá, você está funcionando?'}],
+    'max_tokens': 50
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(label, call, concurrency, total):
+    latencies, errors = [], 0
+
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            call()
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, error in pool.map(timed, range(total)):
+            if error:
+                errors += 1
+            else:
+                latencies.append(latency)
+    elapsed = time.perf_counter() - start
+
+    ms = [value * 1000 for value in latencies] or [0]
+    print(f"{label:<10} req/s={total / elapsed:8.1f}  p50={percentile(ms, 50):7.1f}ms  "
+          f"p95={percentile(ms, 95):7.1f}ms  p99={percentile(ms, 99):7.1f}ms  "
+          f"mean={statistics.mean(ms):7.1f}ms  erros={errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do cliente OpenAI')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    import openai
+
+    server, base_url = start_stub_server(latency=args.latency, error_rate=args.error_rate)
+    print(f"Stub em {base_url} (latência {args.latency}s, erros {args.error_rate:.0%})")
+
+    def naive_call():
+        # Comportamento anterior: cliente novo, conexão nova, sem retentativas
+        client = openai.OpenAI(api_key='stub', base_url=base_url, max_retries=0,
+                               http_client=openai.DefaultHttpxClient())
+        try:
+            return client.chat.completions.create(**REQUEST)
+        finally:
+            client.close()
+
+    pooled = OpenAIClient(api_key='stub', base_url=base_url, max_concurrency=args.concurrency,
+                          backoff_base=0.05)
+
+    run('naive', naive_call, args.concurrency, args.requests)
+    run('pooled', lambda: pooled.chat_completion(**REQUEST), args.concurrency, args.requests)
+    print(f"métricas do cliente: {pooled.get_stats()}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
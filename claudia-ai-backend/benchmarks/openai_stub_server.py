@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Servidor stub compatível com a API de chat completions da OpenAI
+Simula latência e falhas (429/500) para testar o cliente sem custo:
+
+    python benchmarks/openai_stub_server.py --port 8089 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub AI_MODEL_TYPE=openai python src/main.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    latency = 0.05
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(random.lognormvariate(0, 0.5) * self.latency)
+
+        if random.random() < self.error_rate:
+            status = random.choice([429, 500, 503])
+            self._send_json(status, {'error': {'message': 'stub error', 'type': 'server_error'}},
+                            {'Retry-After': '0'} if status == 429 else None)
+            return
+
+        text = 'Olá! Esta é uma resposta do servidor stub.'
+        if body.get('stream'):
+            self._send_stream(body, text)
+        else:
+            self._send_json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': text},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': 20, 'completion_tokens': 9, 'total_tokens': 29}
+            })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, body, text):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            chunk = {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{'index': 0, 'delta': {'content': word + (' ' if i < len(words) - 1 else '')},
+                             'finish_reason': None}]
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        if (body.get('stream_options') or {}).get('include_usage'):
+            usage = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                     'model': body.get('model', 'stub'), 'choices': [],
+                     'usage': {'prompt_tokens': 20, 'completion_tokens': len(words),
+                               'total_tokens': 20 + len(words)}}
+            self._write_chunk(f"data: {json.dumps(usage)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+
+
+def start_stub_server(port=0, latency=0.05, error_rate=0.0):
+    """Inicia o servidor stub em uma thread e retorna (servidor, url base)"""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'latency': latency, 'error_rate': error_rate})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Servidor stub da API OpenAI')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.05, help='latência média em segundos')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fração de respostas 429/5xx')
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.port, args.latency, args.error_rate)
+    print(f"Stub OpenAI ouvindo em {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
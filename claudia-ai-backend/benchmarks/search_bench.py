@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark da busca textual (/api/search) em um histórico grande
+Popula um banco novo com mensagens sintéticas (os gatilhos indexam cada lote)
+e mede a latência de consultas com termos raros, comuns, múltiplos e prefixos:
+
+    python benchmarks/search_bench.py --messages 300000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('AI_MODEL_TYPE', 'demo')
+
+WORDS = (
+    'olá como você pode ajudar projeto código python função erro banco dados consulta '
+    'índice tabela servidor resposta pergunta modelo inteligência artificial aprendizado '
+    'rede neural treinamento conversa mensagem usuário sistema memória desempenho cache '
+    'latência tempo requisição arquivo configuração ambiente variável teste produção '
+    'receita viagem música filme livro história ciência matemática física química'
+).split()
+
+QUERIES = {
+    'termo raro': 'zebrafish',
+    'termo comum': 'python',
+    'dois termos': 'banco dados',
+    'prefixo': 'latên',
+    'sem acento': 'memoria desempenho'
+}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def synthetic_message(rng):
+    # Distribuição aproximadamente Zipf: poucas palavras muito frequentes
+    words = [WORDS[min(int(rng.paretovariate(1.2)) - 1, len(WORDS) - 1)] for _ in range(rng.randint(8, 60))]
+    if rng.random() < 0.0005:
+        words.append('zebrafish')
+    return ' '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da busca textual')
+    parser.add_argument('--messages', type=int, default=300000)
+    parser.add_argument('--conversations', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='search-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    try:
+        from src.main import create_app
+        from src.models.conversation import Conversation
+        from src.models.search import search_index
+        from src.models.user import db
+        from src.services.message_writer import insert_messages, message_row
+
+        app = create_app()
+        client = app.test_client()
+        rng = random.Random(42)
+
+        start = time.perf_counter()
+        with app.app_context():
+            conversations = [Conversation(user_id=1, title=' '.join(rng.sample(WORDS, 4)))
+                             for _ in range(args.conversations)]
+            db.session.add_all(conversations)
+            db.session.commit()
+            ids = [conversation.id for conversation in conversations]
+            for offset in range(0, args.messages, 5000):
+                insert_messages([
+                    message_row(rng.choice(ids), 'user', synthetic_message(rng))
+                    for _ in range(min(5000, args.messages - offset))
+                ])
+        print(f"{args.messages} mensagens indexadas em {time.perf_counter() - start:.1f}s "
+              f"(índice: {search_index.backend})")
+
+        for label, query in QUERIES.items():
+            latencies = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get('/api/search', query_string={'q': query, 'user_id': 1, 'limit': 20})
+                latencies.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.get_json()
+            hits = len(response.get_json()['results'])
+            print(f"{label:<12} q={query!r:<22} resultados={hits:3d}  p50={percentile(latencies, 50):7.1f}ms  "
+                  f"p95={percentile(latencies, 95):7.1f}ms  mean={statistics.mean(latencies):7.1f}ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark do perfil SQLite (WAL e PRAGMAs) nos endpoints do chat
+Executa a mesma carga concorrente de leitura e escrita com SQLITE_PROFILE=default
+(journal padrão) e SQLITE_PROFILE=production, cada um em um banco novo:
+
+    python benchmarks/sqlite_profile_bench.py --concurrency 16 --requests 2000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('AI_MODEL_TYPE', 'demo')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def seed(app, client, conversations, messages):
+    """Cria conversas com histórico para as leituras"""
+    from src.services.message_writer import insert_messages, message_row
+
+    ids = []
+    for i in range(conversations):
+        conversation = client.post('/api/conversations', json={'user_id': 1, 'title': f'bench {i}'}).get_json()
+        ids.append(conversation['id'])
+        with app.app_context():
+            insert_messages([
+                message_row(conversation['id'], 'user' if j % 2 == 0 else 'assistant', f'mensagem {j} ' * 20)
+                for j in range(messages)
+            ])
+    return ids
+
+
+def run(profile, args):
+    from src.main import create_app
+
+    workdir = tempfile.mkdtemp(prefix='sqlite-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    os.environ['SQLITE_PROFILE'] = profile
+    try:
+        app = create_app()
+        client = app.test_client()
+        ids = seed(app, client, args.conversations, args.messages)
+
+        def request(n):
+            conversation_id = random.choice(ids)
+            start = time.perf_counter()
+            if random.random() < args.write_ratio:
+                kind = 'write'
+                response = client.post('/api/ai/generate', json={
+                    'message': f'pergunta {n}', 'conversation_id': conversation_id, 'cache': False
+                })
+            else:
+                kind = 'read'
+                if n % 2:
+                    response = client.get(f'/api/conversations/{conversation_id}?limit=50')
+                else:
+                    response = client.get('/api/conversations?user_id=1')
+            return kind, time.perf_counter() - start, response.status_code
+
+        results = {'read': [], 'write': []}
+        errors = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for kind, latency, status in pool.map(request, range(args.requests)):
+                if status >= 400:
+                    errors += 1
+                else:
+                    results[kind].append(latency * 1000)
+        elapsed = time.perf_counter() - start
+
+        print(f"{profile:<10} req/s={args.requests / elapsed:8.1f}  erros={errors}")
+        for kind, ms in results.items():
+            ms = ms or [0]
+            print(f"  {kind:<6} n={len(ms):5d}  p50={percentile(ms, 50):7.1f}ms  "
+                  f"p95={percentile(ms, 95):7.1f}ms  p99={percentile(ms, 99):7.1f}ms  "
+                  f"mean={statistics.mean(ms):7.1f}ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do perfil SQLite')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--conversations', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=40)
+    args = parser.parse_args()
+
+    for profile in ('default', 'production'):
+        run(profile, args)
+
+
+if __name__ == '__main__':
+    main()
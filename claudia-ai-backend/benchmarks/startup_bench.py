@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inicialização a frio: tempo até o primeiro /api/health com 200 e
+até o modelo ficar pronto (/api/health?ready=1), com o carregamento síncrono
+(forma anterior) e em segundo plano. O backend é o configurado no ambiente:
+
+    AI_MODEL_TYPE=huggingface python benchmarks/startup_bench.py --runs 3
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def status_of(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def cold_start(mode, workdir, timeout):
+    """Sobe um processo novo e retorna (segundos até saudável, segundos até pronto)"""
+    port = free_port()
+    env = dict(os.environ, AI_LOAD_MODE=mode, HOST='127.0.0.1', PORT=str(port),
+               LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'),
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, f'{mode}.db')}")
+    base = f'http://127.0.0.1:{port}/api/health'
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', 'from src.main import main; main()'],
+                               cwd=workdir, env=dict(env, PYTHONPATH=ROOT),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    healthy = ready = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f'servidor encerrou com código {process.returncode}')
+            if healthy is None and status_of(base) == 200:
+                healthy = time.perf_counter() - started
+            if healthy is not None and status_of(f'{base}?ready=1') == 200:
+                ready = time.perf_counter() - started
+                break
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+    return healthy, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inicialização a frio')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    print(f"backend: {os.getenv('AI_MODEL_TYPE') or os.getenv('AI_MODE', 'demo')}")
+    workdir = tempfile.mkdtemp(prefix='startup-bench-')
+    try:
+        for mode in ('sync', 'background'):
+            runs = [cold_start(mode, workdir, args.timeout) for _ in range(args.runs)]
+            healthy = statistics.median(run[0] for run in runs if run[0] is not None)
+            ready = [run[1] for run in runs if run[1] is not None]
+            ready = f"{statistics.median(ready):6.2f}s" if ready else 'não ficou pronto'
+            print(f"{mode:<11} primeiro health={healthy:6.2f}s  modelo pronto={ready}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark de exportação/importação do histórico (linhas/s)
+Compara percorrer a API conversa a conversa com o export NDJSON em streaming
+e mede a importação do arquivo em um banco novo:
+
+    python benchmarks/transfer_bench.py --conversations 500 --messages 200
+"""
+
+import argparse
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('AI_MODEL_TYPE', 'demo')
+
+
+def create_app_for(path):
+    from src.main import create_app
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    return create_app()
+
+
+def seed(app, conversations, messages):
+    from src.models.conversation import Conversation
+    from src.models.user import db
+    from src.services.message_writer import insert_messages, message_row
+
+    rng = random.Random(7)
+    with app.app_context():
+        rows = [Conversation(user_id=1, title=f'conversa {i}') for i in range(conversations)]
+        db.session.add_all(rows)
+        db.session.commit()
+        for conversation in rows:
+            insert_messages([
+                message_row(conversation.id, 'user' if j % 2 == 0 else 'assistant',
+                            'texto de exemplo ' * rng.randint(5, 60),
+                            metadata_dict={'model': 'demo-mode', 'status': 'demo'} if j % 2 else None)
+                for j in range(messages)
+            ])
+    return conversations * (messages + 1)
+
+
+def rest_export(client):
+    """Forma anterior: listar conversas e buscar cada uma, página a página"""
+    rows = 0
+    cursor = None
+    while True:
+        response = client.get('/api/conversations', query_string={'limit': 200, **({'cursor': cursor} if cursor else {})})
+        for conversation in response.get_json():
+            rows += 1
+            before = None
+            while True:
+                params = {'limit': 1000, **({'before': before} if before else {})}
+                page = client.get(f"/api/conversations/{conversation['id']}", query_string=params).get_json()
+                rows += len(page['messages'])
+                before = page['pagination']['before']
+                if not before:
+                    break
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return rows
+
+
+def report(label, rows, elapsed, extra=''):
+    print(f"{label:<16} {rows:8d} linhas em {elapsed:6.2f}s  {rows / elapsed:10,.0f} linhas/s {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de exportação/importação NDJSON')
+    parser.add_argument('--conversations', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='transfer-bench-')
+    try:
+        source = create_app_for(os.path.join(workdir, 'source.db'))
+        total = seed(source, args.conversations, args.messages)
+        client = source.test_client()
+
+        start = time.perf_counter()
+        rows = rest_export(client)
+        report('API por conversa', rows, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        response = client.get('/api/conversations/export')
+        body = response.get_data()
+        rows = body.count(b'\n')
+        report('export NDJSON', rows, time.perf_counter() - start, f'({len(body) / 1e6:.1f} MB)')
+        assert rows == total, (rows, total)
+
+        target = create_app_for(os.path.join(workdir, 'target.db')).test_client()
+        start = time.perf_counter()
+        stats = target.post('/api/conversations/import', data=io.BytesIO(body),
+                            content_type='application/x-ndjson').get_json()
+        report('import NDJSON', stats['conversations'] + stats['messages'], time.perf_counter() - start)
+        assert stats['conversations'] + stats['messages'] == total, stats
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
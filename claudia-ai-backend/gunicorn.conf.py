@@ -0,0 +1,26 @@
+# Configuração do Gunicorn (lida automaticamente por: gunicorn app:app)
+#
+# Com AI_LOAD_MODE=preload os pesos do modelo são carregados aqui, no
+# processo mestre, antes do fork: os workers compartilham as páginas por
+# copy-on-write em vez de cada um carregar a sua cópia. O app continua sendo
+# criado em cada worker; não use --preload junto (as threads do app não
+# sobrevivem ao fork). Só os pesos (somente leitura) são criados antes do
+# fork: conexões (cache SQLite), arquivos com lock (cache semântico), threads
+# e o agendador são abertos por cada worker no primeiro uso ou em load().
+
+import gc
+import os
+import sys
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+load_dotenv()
+
+if os.getenv('AI_LOAD_MODE', '').lower() == 'preload':
+    from src.services.ai_service import ai_service
+
+    if ai_service.preload():
+        # Objetos já criados saem do alcance do coletor: a coleta nos workers
+        # não escreve nos cabeçalhos deles e as páginas continuam compartilhadas
+        gc.freeze()
@@ -0,0 +1,235 @@
+# Modo de serviço ASGI da Claudia.AI
+
+import os
+import asyncio
+import logging
+
+from a2wsgi import WSGIMiddleware
+
+from src.main import create_app, get_cors_origins
+from src.routes.ai import LOADING_RETRY_AFTER, load_context, model_loading, save_exchange
+from src.services.ai_service import ai_service, parse_sampling, parse_timeout
+from src.services.async_ai_service import AsyncAIService
+from src.services.scheduler import QueueFullError, DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+
+class ClaudiaASGIApp:
+    """Aplicação ASGI: rotas de IA assíncronas e demais rotas servidas pelo Flask
+
+    /ai/generate e /ai/stream são tratadas nativamente, sem prender uma thread
+    durante a chamada ao modelo; todo o resto é repassado ao app Flask em um
+    pool de threads, servindo os mesmos blueprints.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=int(os.getenv('ASGI_WSGI_WORKERS', 10)))
+        self.ai = AsyncAIService(ai_service)
+        self.cors_origins = get_cors_origins()
+        self.routes = {}
+        for prefix in ('/api', ''):
+            self.routes[f'{prefix}/ai/generate'] = self.generate_response
+            self.routes[f'{prefix}/ai/stream'] = self.stream_response
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] == 'POST':
+            handler = self.routes.get(scope['path'])
+            if handler:
+                await handler(scope, receive, send)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def generate_response(self, scope, receive, send):
+        """Gera resposta da IA para uma mensagem"""
+        data = await self._read_json(receive)
+        if not data or not data.get('message'):
+            await self._send_json(scope, send, 400, {'error': 'Mensagem é obrigatória'})
+            return
+        try:
+            sampling = parse_sampling(data)
+            timeout = parse_timeout(data)
+        except ValueError as e:
+            await self._send_json(scope, send, 400, {'error': str(e)})
+            return
+        if model_loading():
+            await self._send_loading(scope, send)
+            return
+
+        message = data['message']
+        conversation_id = data.get('conversation_id')
+        try:
+            context = await self.ai.run_sync(
+                self._in_app_context, load_context, conversation_id, message
+            )
+            response_data = await self.ai.generate_response(
+                message=message,
+                conversation_id=conversation_id,
+                user_id=data.get('user_id', 1),
+                context=context,
+                timeout=timeout,
+                use_cache=data.get('cache', True),
+                sampling=sampling
+            )
+            await self.ai.run_sync(
+                self._in_app_context, save_exchange, conversation_id, message, response_data,
+                bool(data.get('durable'))
+            )
+        except QueueFullError:
+            await self._send_json(
+                scope, send, 429, {'error': 'Servidor ocupado, tente novamente em instantes'},
+                extra_headers=[(b'retry-after', b'1')]
+            )
+            return
+        except DeadlineExceededError:
+            await self._send_json(scope, send, 504, {'error': 'Tempo limite da requisição excedido'})
+            return
+        except Exception as e:
+            logger.error(f"Erro ao gerar resposta: {str(e)}")
+            await self._send_json(scope, send, 500, {'error': 'Erro interno do servidor'})
+            return
+
+        await self._send_json(scope, send, 200, response_data)
+
+    async def stream_response(self, scope, receive, send):
+        """Gera resposta da IA em streaming (SSE)"""
+        data = await self._read_json(receive)
+        if not data or not data.get('message'):
+            await self._send_json(scope, send, 400, {'error': 'Mensagem é obrigatória'})
+            return
+        try:
+            sampling = parse_sampling(data)
+            timeout = parse_timeout(data)
+        except ValueError as e:
+            await self._send_json(scope, send, 400, {'error': str(e)})
+            return
+        if model_loading():
+            await self._send_loading(scope, send)
+            return
+
+        message = data['message']
+        conversation_id = data.get('conversation_id')
+        try:
+            context = await self.ai.run_sync(
+                self._in_app_context, load_context, conversation_id, message
+            )
+            stream = self.ai.stream_response(
+                message, conversation_id, data.get('user_id', 1),
+                context=context, timeout=timeout, sampling=sampling
+            )
+        except QueueFullError:
+            await self._send_json(
+                scope, send, 429, {'error': 'Servidor ocupado, tente novamente em instantes'},
+                extra_headers=[(b'retry-after', b'1')]
+            )
+            return
+        except Exception as e:
+            logger.error(f"Erro ao iniciar streaming: {str(e)}")
+            await self._send_json(scope, send, 500, {'error': 'Erro interno do servidor'})
+            return
+
+        disconnected = asyncio.Event()
+        watcher = asyncio.create_task(self._watch_disconnect(receive, disconnected))
+        try:
+            # Dentro do try: se o envio falhar (cliente já saiu), o stream é fechado mesmo assim
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                    (b'access-control-allow-origin', b'*')
+                ]
+            })
+            async for chunk in stream:
+                if disconnected.is_set():
+                    break
+                await self._send_event(send, chunk)
+            else:
+                # Enviar evento de fim
+                await self._send_event(send, {'event': 'end'})
+        except Exception as e:
+            logger.error(f"Erro no streaming: {e}")
+            if not disconnected.is_set():
+                await self._send_event(send, {'error': 'Erro no streaming'})
+        finally:
+            watcher.cancel()
+            # Cliente desconectado ou fim do stream: interromper a geração no backend
+            await stream.aclose()
+
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def _send_loading(self, scope, send):
+        await self._send_json(
+            scope, send, 503, {'error': 'Modelo carregando, tente novamente em instantes', 'state': ai_service.state},
+            extra_headers=[(b'retry-after', LOADING_RETRY_AFTER.encode())]
+        )
+
+    def _in_app_context(self, fn, *args):
+        """Executa uma função que acessa o banco dentro do contexto do Flask"""
+        with self.flask_app.app_context():
+            return fn(*args)
+
+    async def _read_json(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        try:
+            return self.flask_app.json.loads(body) if body else None
+        except ValueError:
+            return None
+
+    async def _send_json(self, scope, send, status, payload, extra_headers=None):
+        body = self.flask_app.json.dumps(payload).encode('utf-8')
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode())
+        ] + self._cors_headers(scope) + (extra_headers or [])
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _send_event(self, send, payload):
+        await send({
+            'type': 'http.response.body',
+            'body': f"data: {self.flask_app.json.dumps(payload)}\n\n".encode('utf-8'),
+            'more_body': True
+        })
+
+    def _cors_headers(self, scope):
+        origin = dict(scope.get('headers', [])).get(b'origin', b'').decode('latin1')
+        if origin and origin in self.cors_origins:
+            return [(b'access-control-allow-origin', origin.encode('latin1')), (b'vary', b'Origin')]
+        return []
+
+    async def _watch_disconnect(self, receive, disconnected):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.ai.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app():
+    """Factory function para criar a aplicação ASGI"""
+    return ClaudiaASGIApp(create_app())
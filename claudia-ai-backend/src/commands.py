@@ -0,0 +1,50 @@
+import sys
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from src.services.transfer import DEFAULT_BATCH_SIZE, TransferProgress, export_ndjson, import_ndjson
+
+conversations_cli = AppGroup('conversations', help='Exporta e importa o histórico de conversas em NDJSON')
+
+
+def report_progress(progress):
+    """Progresso na saída de erro, para não misturar com o NDJSON na saída padrão"""
+    click.echo(f"\r{progress.rows} linhas em {progress.elapsed:.1f}s ({progress.rate:,.0f} linhas/s)",
+               err=True, nl=False)
+
+
+@conversations_cli.command('export')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='Arquivo de saída (padrão: saída padrão)')
+@click.option('--user-id', type=int, help='Exporta só as conversas deste usuário')
+@click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, show_default=True)
+def export_command(output, user_id, batch_size):
+    """Exporta conversas e mensagens em NDJSON"""
+    progress = TransferProgress(report_progress)
+    for chunk in export_ndjson(current_app.json.dumps, user_id=user_id, batch_size=batch_size,
+                               progress=progress):
+        output.write(chunk)
+    output.flush()
+    click.echo('', err=True)
+
+
+@conversations_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('--user-id', type=int, help='Atribui todas as conversas importadas a este usuário')
+@click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Linhas por transação')
+def import_command(source, user_id, batch_size):
+    """Importa NDJSON gerado pelo export"""
+    stats = import_ndjson(source, user_id=user_id, batch_size=batch_size,
+                          progress=TransferProgress(report_progress), loads=current_app.json.loads)
+    click.echo('', err=True)
+    click.echo(f"{stats['conversations']} conversas e {stats['messages']} mensagens importadas "
+               f"({stats['rows_per_second']:,.0f} linhas/s); {stats['invalid']} inválidas, "
+               f"{stats['skipped']} ignoradas", err=True)
+    for error in stats['errors']:
+        click.echo(f"  linha {error['line']}: {error['error']}", err=True)
+    if 'error' in stats:
+        click.echo(f"Importação interrompida: {stats['error']}", err=True)
+        sys.exit(1)
@@ -0,0 +1,41 @@
+# Cache HTTP das respostas de leitura (ETag + If-None-Match)
+
+import hashlib
+
+from flask import current_app, request
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+def etag_for(*parts):
+    """ETag forte a partir de valores baratos de consultar (updated_at, contagens, ids)
+
+    O provider JSON entra no cálculo: a mesma versão dos dados serializada por
+    outro encoder (ou indentada em debug) não é byte a byte igual.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (type(current_app.json).__name__, current_app.debug) + parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def with_etag(response, etag):
+    """Anexa o ETag e obriga o cliente a revalidar a cada uso"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
+
+
+def not_modified(etag):
+    """Resposta 304 se o cliente já tem a versão ``etag``; None caso contrário"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return with_etag(current_app.response_class(status=304), etag)
+
+
+def conditional(response):
+    """Para respostas estáticas: ETag pelo hash do corpo e 304 se o cliente já o tem"""
+    response.add_etag()
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response.make_conditional(request)
@@ -0,0 +1,85 @@
+# Serialização JSON das respostas da API
+
+import os
+import json
+import uuid
+import decimal
+import logging
+import dataclasses
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+
+def _default(obj):
+    """Tipos fora do JSON nativo; datas em ISO 8601, como no to_dict() dos modelos"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Encoder da biblioteca padrão com datas em ISO 8601 (mesma saída do OrjsonProvider)"""
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def __init__(self, app):
+        super().__init__(app)
+        # Um encoder reutilizado: o dumps padrão do Flask monta um a cada chamada
+        self._encoder = json.JSONEncoder(default=self.default, ensure_ascii=self.ensure_ascii)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encoder.encode(obj)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Encoder orjson: datetime, date, UUID e dataclasses são serializados em C
+
+    A resposta é montada direto dos bytes gerados, sem passar por str.
+    """
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def __init__(self, app):
+        super().__init__(app)
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return self._orjson.dumps(obj, default=self.default, option=self._options).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return self._orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        options = self._options
+        if self._app.debug:
+            options |= self._orjson.OPT_INDENT_2
+        body = self._orjson.dumps(obj, default=self.default, option=options)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+
+def create_json_provider(app):
+    """Escolhe o provider JSON via JSON_PROVIDER (auto, orjson, stdlib)"""
+    choice = os.getenv('JSON_PROVIDER', 'auto').lower()
+    if choice in ('auto', 'orjson'):
+        try:
+            return OrjsonProvider(app)
+        except ImportError:
+            if choice == 'orjson':
+                logger.warning("orjson não instalado; usando o encoder da biblioteca padrão")
+    return StdlibJSONProvider(app)
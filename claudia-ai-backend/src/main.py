@@ -10,9 +10,17 @@ load_dotenv()
 
 # Importar modelos e rotas
 from src.models.user import db
+from src.models.schema import upgrade_schema
+from src.models.search import search_index
+from src.models.sqlite import configure_sqlite, sqlite_engine_options, sqlite_profile_enabled
 from src.routes.user import user_bp
 from src.routes.conversation import conversation_bp
 from src.routes.ai import ai_bp
+from src.routes.search import search_bp
+from src.commands import conversations_cli
+from src.json_provider import create_json_provider
+from src.services.message_writer import create_message_writer
+from src.services.ai_service import ai_service, start_model_loading
 
 # Configuração de logging
 logging.basicConfig(
@@ -25,42 +33,59 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def get_cors_origins():
+    """Origens permitidas para CORS, configuradas via CORS_ORIGINS"""
+    return os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
+
 def create_app():
     """Factory function para criar a aplicação Flask"""
     app = Flask(__name__, static_folder='static', static_url_path='')
+    app.json = create_json_provider(app)
     
     # Configurações da aplicação
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-claudia-ai')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///src/database/app.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_timeout': 20,
-        'pool_recycle': -1,
-        'pool_pre_ping': True
-    }
+    if sqlite_profile_enabled(app.config['SQLALCHEMY_DATABASE_URI']):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options()
+    else:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_timeout': 20,
+            'pool_recycle': -1,
+            'pool_pre_ping': True
+        }
     
     # Configuração CORS
-    cors_origins = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
+    cors_origins = get_cors_origins()
     CORS(app, resources={
         r"/*": {
             "origins": cors_origins,
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["X-Next-Cursor", "Link"]
         }
     })
     
     # Inicialização do banco de dados
     db.init_app(app)
+    if sqlite_profile_enabled(app.config['SQLALCHEMY_DATABASE_URI']):
+        with app.app_context():
+            configure_sqlite(db.engine)
     
     # Registro de blueprints
     app.register_blueprint(user_bp, url_prefix='/api')
     app.register_blueprint(conversation_bp, url_prefix='/api')
     app.register_blueprint(ai_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
 
     # Rotas sem prefixo /api para compatibilidade
     app.register_blueprint(user_bp, name='user_noapi')
     app.register_blueprint(conversation_bp, name='conversation_noapi')
     app.register_blueprint(ai_bp, name='ai_noapi')
+    app.register_blueprint(search_bp, name='search_noapi')
+    
+    # Comandos de linha de comando (flask --app app conversations ...)
+    app.cli.add_command(conversations_cli)
     
     # Rotas principais
     @app.route('/')
@@ -78,7 +103,11 @@ def create_app():
     
     @app.route('/api/health')
     def health_check():
-        """Endpoint de verificação de saúde"""
+        """Endpoint de verificação de saúde
+        
+        Responde assim que o processo sobe, mesmo com o modelo carregando; com
+        ?ready=1 (readiness) retorna 503 até o modelo estar pronto.
+        """
         try:
             # Testar conexão com banco de dados
             db.session.execute(text('SELECT 1'))
@@ -87,13 +116,18 @@ def create_app():
             logger.error(f"Erro no banco de dados: {e}")
             db_status = 'unhealthy'
         
-        return jsonify({
+        model = ai_service.get_readiness()
+        response = jsonify({
             'status': 'healthy' if db_status == 'healthy' else 'degraded',
             'timestamp': datetime.utcnow().isoformat(),
             'database': db_status,
+            'model': model,
             'version': '1.0.0',
             'environment': os.getenv('FLASK_ENV', 'production')
         })
+        if request.args.get('ready', '').lower() in ('1', 'true') and (db_status != 'healthy' or model['state'] != 'ready'):
+            return response, 503
+        return response
     
     @app.route('/api/info')
     def app_info():
@@ -148,6 +182,8 @@ def create_app():
                 os.makedirs(db_dir, exist_ok=True)
             
             db.create_all()
+            upgrade_schema(db)
+            search_index.install(db)
             logger.info("Banco de dados inicializado com sucesso")
             
             # Criar usuário padrão se não existir
@@ -165,6 +201,12 @@ def create_app():
         except Exception as e:
             logger.error(f"Erro ao inicializar banco de dados: {e}")
     
+    # Gravação adiada das mensagens do chat (opcional, AI_PERSISTENCE_MODE)
+    app.extensions['message_writer'] = create_message_writer(app)
+    
+    # Modelo de IA carregado em segundo plano por padrão (AI_LOAD_MODE)
+    start_model_loading(ai_service)
+    
     logger.info("Claudia.AI Backend inicializado com sucesso")
     return app
 
@@ -1,12 +1,17 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import deferred
 from datetime import datetime
-import json
 
 # Importar db do user.py para evitar duplicação
-from .user import db
+from .user import db, JSONType
 
 class Conversation(db.Model):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        # Listagem por usuário ordenada por atividade (o id já vai junto no índice)
+        db.Index('ix_conversations_user_updated', 'user_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -14,17 +19,21 @@ class Conversation(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
-    metadata_json = db.Column(db.Text)  # JSON para metadados adicionais
+    metadata_json = db.Column(JSONType)  # metadados adicionais
     
     # Relacionamentos
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan')
+    summary = db.relationship('ConversationSummary', backref='conversation', uselist=False,
+                              lazy=True, cascade='all, delete-orphan')
     
     def __init__(self, user_id, title='Nova Conversa', metadata_dict=None):
         self.user_id = user_id
         self.title = title
-        self.metadata_json = json.dumps(metadata_dict) if metadata_dict else json.dumps({})
+        self.metadata_json = metadata_dict or {}
     
-    def to_dict(self):
+    def to_dict(self, message_count=None):
+        if message_count is None:
+            message_count = self.count_messages()
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -33,25 +42,55 @@ class Conversation(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'is_active': self.is_active,
             'metadata': self.get_metadata(),
-            'message_count': len(self.messages) if self.messages else 0
+            'message_count': message_count
         }
     
+    def count_messages(self):
+        """Conta as mensagens sem carregar o relacionamento (a menos que já esteja carregado)"""
+        if 'messages' not in inspect(self).unloaded:
+            return len(self.messages)
+        return db.session.query(func.count(Message.id)).filter(
+            Message.conversation_id == self.id
+        ).scalar()
+    
+    @classmethod
+    def activity_at(cls):
+        """Ordem de atividade da listagem: linhas antigas sem updated_at usam o created_at"""
+        return func.coalesce(cls.updated_at, cls.created_at)
+    
+    @classmethod
+    def json_columns(cls):
+        """Colunas de to_dict() (sem message_count), para listar sem instanciar objetos"""
+        return (cls.id, cls.user_id, cls.title, cls.created_at, cls.updated_at, cls.is_active,
+                cls.metadata_json.label('metadata'))
+    
+    @staticmethod
+    def message_count_subquery():
+        """Contagem de mensagens por conversa, para listar conversas em uma única consulta"""
+        return db.select(func.count(Message.id)).where(
+            Message.conversation_id == Conversation.id
+        ).correlate(Conversation).scalar_subquery()
+    
     def get_metadata(self):
         """Retorna metadados como dicionário"""
-        try:
-            return json.loads(self.metadata_json) if self.metadata_json else {}
-        except json.JSONDecodeError:
-            return {}
+        return self.metadata_json or {}
     
     def set_metadata(self, metadata_dict):
         """Define metadados a partir de dicionário"""
-        self.metadata_json = json.dumps(metadata_dict)
+        self.metadata_json = metadata_dict
     
     def __repr__(self):
         return f'<Conversation {self.id}: {self.title}>'
 
+# Listagem por usuário na ordem de activity_at() (índice de expressão, mesma expressão da consulta)
+db.Index('ix_conversations_user_activity', Conversation.user_id, Conversation.activity_at())
+
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Histórico de uma conversa em ordem cronológica (janelas e paginação por cursor)
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
@@ -59,17 +98,22 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     tokens = db.Column(db.Integer, default=0)
-    metadata_json = db.Column(db.Text)  # JSON para metadados adicionais
+    tokenizer = db.Column(db.String(200))  # tokenizador que contou `tokens` (None = não contado)
+    # Metadados (modelo, status, uso) só são carregados quando acessados: a
+    # montagem de contexto e o resumo leem muitas mensagens e nunca os usam.
+    # A serialização em lote usa json_columns(), que já inclui a coluna.
+    metadata_json = deferred(db.Column(JSONType))
     
     # Relacionamentos
     feedbacks = db.relationship('Feedback', backref='message', lazy=True, cascade='all, delete-orphan')
     
-    def __init__(self, conversation_id, role, content, tokens=0, metadata_dict=None):
+    def __init__(self, conversation_id, role, content, tokens=0, metadata_dict=None, tokenizer=None):
         self.conversation_id = conversation_id
         self.role = role
         self.content = content
         self.tokens = tokens
-        self.metadata_json = json.dumps(metadata_dict) if metadata_dict else json.dumps({})
+        self.tokenizer = tokenizer
+        self.metadata_json = metadata_dict or {}
     
     def to_dict(self):
         return {
@@ -82,20 +126,53 @@ class Message(db.Model):
             'metadata': self.get_metadata()
         }
     
+    @classmethod
+    def json_columns(cls):
+        """Colunas de to_dict(), para serializar linhas em lote sem instanciar objetos"""
+        return (cls.id, cls.conversation_id, cls.role, cls.content, cls.created_at, cls.tokens,
+                cls.metadata_json.label('metadata'))
+    
     def get_metadata(self):
         """Retorna metadados como dicionário"""
-        try:
-            return json.loads(self.metadata_json) if self.metadata_json else {}
-        except json.JSONDecodeError:
-            return {}
+        return self.metadata_json or {}
     
     def set_metadata(self, metadata_dict):
         """Define metadados a partir de dicionário"""
-        self.metadata_json = json.dumps(metadata_dict)
+        self.metadata_json = metadata_dict
     
     def __repr__(self):
         return f'<Message {self.id}: {self.role}>'
 
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summaries'
+    
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), primary_key=True)
+    content = db.Column(db.Text, nullable=False, default='')
+    summarized_until_id = db.Column(db.Integer, nullable=False, default=0)  # última mensagem resumida
+    summarized_messages = db.Column(db.Integer, nullable=False, default=0)
+    tokens = db.Column(db.Integer, default=0)
+    tokenizer = db.Column(db.String(200))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __init__(self, conversation_id, content=''):
+        self.conversation_id = conversation_id
+        self.content = content
+        self.summarized_until_id = 0
+        self.summarized_messages = 0
+    
+    def to_dict(self):
+        return {
+            'conversation_id': self.conversation_id,
+            'content': self.content,
+            'summarized_until_id': self.summarized_until_id,
+            'summarized_messages': self.summarized_messages,
+            'tokens': self.tokens,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ConversationSummary {self.conversation_id}: {self.summarized_messages} mensagens>'
+
 class Feedback(db.Model):
     __tablename__ = 'feedback'
     
@@ -0,0 +1,88 @@
+import json
+import logging
+from sqlalchemy import JSON, bindparam, inspect, text
+from sqlalchemy.schema import CreateIndex
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_schema(db):
+    """Atualiza tabelas já existentes com colunas e índices novos dos modelos
+
+    O db.create_all() só cria tabelas que ainda não existem e o projeto não usa
+    ferramenta de migração; colunas novas devem ser anuláveis ou ter default.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                upgrade_json_column(engine, table, column, existing[column.name])
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            logger.info(f"Coluna adicionada: {table.name}.{column.name}")
+        # IF NOT EXISTS em vez de checkfirst: a reflexão não enxerga índices de expressão
+        with engine.begin() as conn:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def upgrade_json_column(engine, table, column, existing_type):
+    """Prepara as colunas JSON que ainda são texto (tabelas anteriores ao tipo JSON)
+
+    Linhas antigas com texto inválido viram {} (como eram lidas antes); sem
+    isso a leitura e os filtros por chave falhariam na lista e na exportação. No
+    PostgreSQL a coluna é então convertida para JSONB; no SQLite o tipo JSON é
+    armazenado como texto e não há conversão.
+    """
+    if not isinstance(column.type, JSON) or isinstance(existing_type, JSON):
+        return
+    sanitize_json_column(engine, table, column)
+    if engine.dialect.name != 'postgresql':
+        return
+    column_type = column.type.compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.execute(text(
+            f'ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE {column_type} '
+            f'USING NULLIF({column.name}, \'\')::{column_type}'
+        ))
+    logger.info(f"Coluna convertida para {column_type}: {table.name}.{column.name}")
+
+
+def sanitize_json_column(engine, table, column):
+    """Troca por {} os valores de texto que não são JSON válido"""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            result = conn.execute(text(
+                f'UPDATE {table.name} SET {column.name} = \'{{}}\' '
+                f'WHERE {column.name} IS NOT NULL AND NOT json_valid({column.name})'
+            ))
+            invalid = result.rowcount
+        else:
+            key = table.primary_key.columns.values()[0].name
+            rows = conn.execute(text(
+                f'SELECT {key}, {column.name} FROM {table.name} WHERE {column.name} IS NOT NULL'
+            ))
+            ids = [row[0] for row in rows if not _is_json(row[1])]
+            for start in range(0, len(ids), 500):
+                conn.execute(
+                    text(f'UPDATE {table.name} SET {column.name} = \'{{}}\' WHERE {key} IN :ids')
+                    .bindparams(bindparam('ids', expanding=True)),
+                    {'ids': ids[start:start + 500]}
+                )
+            invalid = len(ids)
+    if invalid:
+        logger.warning(f"JSON inválido trocado por {{}} em {invalid} linha(s): {table.name}.{column.name}")
+
+
+def _is_json(value):
+    try:
+        json.loads(value)
+    except (TypeError, ValueError):
+        return False
+    return True
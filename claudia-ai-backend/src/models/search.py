@@ -0,0 +1,251 @@
+import os
+import re
+import html
+import logging
+from datetime import datetime
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Delimitadores internos do trecho destacado; o texto é escapado antes de virar <mark>
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SQLITE_FTS_DDL = [
+    # Tabelas FTS5 de conteúdo externo: o texto fica só em messages/conversations
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+        title, content='conversations', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    # Só alterações do texto reindexam (a contagem de tokens também atualiza a linha)
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts(rowid, title) VALUES (new.id, new.title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO conversations_fts(rowid, title) VALUES (new.id, new.title);
+    END"""
+]
+
+# No PostgreSQL o tsvector é uma coluna gerada: o próprio banco a mantém a cada escrita
+POSTGRES_FTS_DDL = [
+    """ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{config}', coalesce(content, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING gin (search_vector)",
+    """ALTER TABLE conversations ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{config}', coalesce(title, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_conversations_search_vector ON conversations USING gin (search_vector)"
+]
+
+# CROSS JOIN fixa a ordem no SQLite: primeiro o índice FTS, depois os filtros.
+# Termos muito frequentes são ranqueados só entre as ocorrências mais recentes
+# (janela de candidatos), o que mantém a consulta em milissegundos. Os filtros
+# de usuário/conversa valem também dentro da janela: senão uma busca restrita
+# ficaria vazia quando o termo é comum no resto da base.
+SQLITE_SEARCH = {
+    'message': """
+        SELECT 'message' AS type, m.id AS message_id, m.conversation_id, c.title AS conversation_title,
+               m.role, m.created_at,
+               snippet(messages_fts, 0, :mark_start, :mark_end, '…', :snippet_tokens) AS snippet,
+               bm25(messages_fts) AS score
+        FROM messages_fts
+        CROSS JOIN messages m ON m.id = messages_fts.rowid
+        CROSS JOIN conversations c ON c.id = m.conversation_id
+        WHERE messages_fts MATCH :query
+          AND messages_fts.rowid >= (
+              SELECT coalesce(min(rowid), 0) FROM (
+                  SELECT messages_fts.rowid FROM messages_fts {scope}
+                  WHERE messages_fts MATCH :query {filters}
+                  ORDER BY messages_fts.rowid DESC LIMIT :window)) {filters}""",
+    'conversation': """
+        SELECT 'conversation' AS type, NULL AS message_id, c.id AS conversation_id,
+               c.title AS conversation_title, NULL AS role, c.updated_at AS created_at,
+               highlight(conversations_fts, 0, :mark_start, :mark_end) AS snippet,
+               bm25(conversations_fts) AS score
+        FROM conversations_fts
+        CROSS JOIN conversations c ON c.id = conversations_fts.rowid
+        WHERE conversations_fts MATCH :query {filters}"""
+}
+
+# Junções da janela de candidatos quando há filtro de usuário/conversa
+SQLITE_WINDOW_SCOPE = """
+                  CROSS JOIN messages m ON m.id = messages_fts.rowid
+                  CROSS JOIN conversations c ON c.id = m.conversation_id"""
+
+POSTGRES_SEARCH = {
+    'message': """
+        SELECT 'message' AS type, m.id AS message_id, m.conversation_id, c.title AS conversation_title,
+               m.role, m.created_at,
+               ts_headline(CAST(:config AS regconfig), m.content, q.query, :headline_options) AS snippet,
+               -ts_rank_cd(m.search_vector, q.query) AS score
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id,
+             to_tsquery(CAST(:config AS regconfig), :query) AS q(query)
+        WHERE m.search_vector @@ q.query
+          AND m.id >= (
+              SELECT coalesce(min(id), 0) FROM (
+                  SELECT m.id FROM messages m {scope}
+                  WHERE m.search_vector @@ q.query {filters}
+                  ORDER BY m.id DESC LIMIT :window) AS recent) {filters}""",
+    'conversation': """
+        SELECT 'conversation' AS type, NULL AS message_id, c.id AS conversation_id,
+               c.title AS conversation_title, NULL AS role, c.updated_at AS created_at,
+               ts_headline(CAST(:config AS regconfig), c.title, q.query, :headline_options) AS snippet,
+               -ts_rank_cd(c.search_vector, q.query) AS score
+        FROM conversations c, to_tsquery(CAST(:config AS regconfig), :query) AS q(query)
+        WHERE c.search_vector @@ q.query {filters}"""
+}
+
+POSTGRES_WINDOW_SCOPE = "JOIN conversations c ON c.id = m.conversation_id"
+
+# Sem índice de texto (outros bancos ou SQLite sem FTS5): busca por substring, sem ranking
+FALLBACK_SEARCH = {
+    'message': """
+        SELECT 'message' AS type, m.id AS message_id, m.conversation_id, c.title AS conversation_title,
+               m.role, m.created_at, m.content AS snippet, 0 AS score
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE lower(m.content) LIKE :pattern {filters}""",
+    'conversation': """
+        SELECT 'conversation' AS type, NULL AS message_id, c.id AS conversation_id,
+               c.title AS conversation_title, NULL AS role, c.updated_at AS created_at,
+               c.title AS snippet, 0 AS score
+        FROM conversations c
+        WHERE lower(c.title) LIKE :pattern {filters}"""
+}
+
+
+class SearchIndex:
+    """Busca textual no histórico (mensagens e títulos de conversas)
+
+    Usa FTS5 no SQLite e tsvector com índice GIN no PostgreSQL; em ambos o
+    índice é atualizado pelo próprio banco a cada escrita (gatilhos ou coluna
+    gerada), sem reindexação pela aplicação.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.ts_config = os.getenv('SEARCH_TS_CONFIG', 'portuguese')
+        self.snippet_tokens = int(os.getenv('SEARCH_SNIPPET_TOKENS', 16))
+        self.candidate_window = int(os.getenv('SEARCH_CANDIDATE_WINDOW', 2000))
+
+    def install(self, db):
+        """Cria o índice e os gatilhos se ainda não existirem"""
+        engine = db.engine
+        try:
+            if engine.dialect.name == 'sqlite':
+                self._install_sqlite(engine)
+            elif engine.dialect.name == 'postgresql':
+                with engine.begin() as conn:
+                    for statement in POSTGRES_FTS_DDL:
+                        conn.execute(text(statement.format(config=self.ts_config)))
+                self.backend = 'postgresql'
+            else:
+                self.backend = 'like'
+        except Exception as e:
+            logger.warning(f"Índice de busca indisponível, usando busca por substring: {e}")
+            self.backend = 'like'
+        logger.info(f"Busca textual: {self.backend}")
+
+    def search(self, session, terms, user_id=None, conversation_id=None, kinds=('message', 'conversation'),
+               limit=20, offset=0):
+        """Retorna os resultados ordenados por relevância com trecho destacado"""
+        words = re.findall(r'\w+', terms.lower())
+        if not words:
+            return []
+
+        params = {
+            'mark_start': MARK_START,
+            'mark_end': MARK_END,
+            'snippet_tokens': self.snippet_tokens
+        }
+        scope = ''
+        if self.backend == 'sqlite':
+            queries = SQLITE_SEARCH
+            scope = SQLITE_WINDOW_SCOPE
+            # Termos entre aspas (sem operadores do usuário); o último vale como prefixo
+            params['query'] = ' '.join(f'"{word}"' for word in words) + '*'
+            params['window'] = self.candidate_window or -1
+        elif self.backend == 'postgresql':
+            queries = POSTGRES_SEARCH
+            scope = POSTGRES_WINDOW_SCOPE
+            params['query'] = ' & '.join(words) + ':*'
+            params['config'] = self.ts_config
+            params['window'] = self.candidate_window or None
+            params['headline_options'] = (
+                f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={self.snippet_tokens}, MinWords=5'
+            )
+        else:
+            queries = FALLBACK_SEARCH
+            params['pattern'] = '%' + ' '.join(words) + '%'
+
+        filters = ''
+        if user_id is not None:
+            filters += ' AND c.user_id = :user_id'
+            params['user_id'] = user_id
+        if conversation_id is not None:
+            filters += ' AND c.id = :conversation_id'
+            params['conversation_id'] = conversation_id
+        if not filters:
+            # Sem filtros a janela sai só do índice de texto
+            scope = ''
+
+        # Uma consulta por tipo (o planejador do SQLite lida mal com a UNION sobre
+        # duas tabelas FTS); cada uma traz até a página pedida e o merge é aqui
+        params['top'] = offset + limit
+        results = []
+        for kind in kinds:
+            sql = f'SELECT * FROM ({queries[kind].format(filters=filters, scope=scope)}) AS results ' \
+                  f'ORDER BY score, created_at DESC LIMIT :top'
+            results.extend(self._result(row) for row in session.execute(text(sql), params).mappings())
+        results.sort(key=lambda result: result['created_at'] or '', reverse=True)
+        results.sort(key=lambda result: result['score'], reverse=True)
+        return results[offset:offset + limit]
+
+    def _install_sqlite(self, engine):
+        with engine.begin() as conn:
+            existing = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE name IN ('messages_fts', 'conversations_fts')"
+            )).scalars().all()
+            for statement in SQLITE_FTS_DDL:
+                conn.execute(text(statement))
+            # Base existente: indexar o histórico anterior aos gatilhos
+            for table in ('messages_fts', 'conversations_fts'):
+                if table not in existing:
+                    conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+                    logger.info(f"Índice de busca criado: {table}")
+        self.backend = 'sqlite'
+
+    def _result(self, row):
+        result = dict(row)
+        snippet = result['snippet'] or ''
+        if self.backend == 'like' and len(snippet) > 200:
+            snippet = snippet[:200] + '…'
+        result['snippet'] = (
+            html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+        )
+        created_at = result['created_at']
+        if isinstance(created_at, str):
+            # SQLite devolve o texto gravado; mesmo formato de to_dict()
+            created_at = datetime.fromisoformat(created_at)
+        result['created_at'] = created_at.isoformat() if created_at else None
+        result['score'] = round(-float(result['score']), 4) or 0.0
+        return result
+
+
+search_index = SearchIndex()
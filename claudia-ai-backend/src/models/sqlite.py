@@ -0,0 +1,74 @@
+import os
+import logging
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Perfil de produção: leitores não bloqueiam o escritor (WAL), fsync só nos
+# checkpoints (seguro contra queda do processo), páginas mapeadas em memória
+# e espera pelo lock de escrita em vez de falhar com "database is locked".
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,   # 256 MiB
+    'cache_size': -64000,     # negativo = KiB (64 MB por conexão)
+    'busy_timeout': 5000,     # ms
+    'temp_store': 'MEMORY'
+}
+
+
+def is_sqlite_file(uri):
+    """Indica se a URI aponta para um arquivo SQLite (não para banco em memória)"""
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def sqlite_profile_enabled(uri):
+    """Perfil aplicado a bancos SQLite em arquivo, salvo SQLITE_PROFILE=default"""
+    return is_sqlite_file(uri) and os.getenv('SQLITE_PROFILE', 'production').lower() == 'production'
+
+
+def sqlite_pragmas():
+    """PRAGMAs do perfil, com substituições via SQLITE_<PRAGMA>"""
+    pragmas = {}
+    for name, default in DEFAULT_PRAGMAS.items():
+        value = os.getenv(f'SQLITE_{name.upper()}', default)
+        if value != '':
+            pragmas[name] = value
+    return pragmas
+
+
+def sqlite_engine_options():
+    """Opções do engine para SQLite em arquivo
+
+    Conexões SQLite são locais: sem pre-ping nem reciclagem. O pool mantém as
+    conexões (e seus caches de página e mmap) entre requisições; o tamanho
+    acompanha o número de threads do servidor.
+    """
+    return {
+        'poolclass': QueuePool,
+        'pool_size': int(os.getenv('SQLITE_POOL_SIZE', 16)),
+        'max_overflow': int(os.getenv('SQLITE_MAX_OVERFLOW', 16)),
+        'pool_timeout': 20,
+        'pool_pre_ping': False,
+        'connect_args': {'check_same_thread': False}
+    }
+
+
+def configure_sqlite(engine, pragmas=None):
+    """Aplica os PRAGMAs do perfil em cada nova conexão do engine"""
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    logger.info("Perfil SQLite ativo: " + ', '.join(f'{name}={value}' for name, value in pragmas.items()))
+    return pragmas
@@ -1,9 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
-import json
 
 db = SQLAlchemy()
 
+# JSON nativo do banco (JSONB no PostgreSQL; texto JSON no SQLite, compatível com
+# as linhas antigas). Decodificado uma vez ao carregar e filtrável por chave.
+JSONType = db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql')
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -13,7 +17,7 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
-    preferences = db.Column(db.Text)  # JSON string para preferências
+    preferences = db.Column(JSONType)
     
     # Relacionamentos
     conversations = db.relationship('Conversation', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -21,7 +25,7 @@ class User(db.Model):
     def __init__(self, username, email, preferences=None):
         self.username = username
         self.email = email
-        self.preferences = json.dumps(preferences) if preferences else json.dumps({})
+        self.preferences = preferences or {}
     
     def to_dict(self):
         return {
@@ -31,19 +35,16 @@ class User(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'is_active': self.is_active,
-            'preferences': json.loads(self.preferences) if self.preferences else {}
+            'preferences': self.get_preferences()
         }
     
     def get_preferences(self):
         """Retorna preferências como dicionário"""
-        try:
-            return json.loads(self.preferences) if self.preferences else {}
-        except json.JSONDecodeError:
-            return {}
+        return self.preferences or {}
     
     def set_preferences(self, preferences_dict):
         """Define preferências a partir de dicionário"""
-        self.preferences = json.dumps(preferences_dict)
+        self.preferences = preferences_dict
     
     def __repr__(self):
         return f'<User {self.username}>'
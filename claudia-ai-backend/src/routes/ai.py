@@ -1,12 +1,92 @@
-from flask import Blueprint, request, jsonify, Response
-from src.services.ai_service import ai_service
+from flask import Blueprint, request, jsonify, Response, current_app
+from src.http_cache import conditional
+from src.services.ai_service import MODEL_LOADING, ai_service, parse_sampling, parse_timeout
+from src.services.context_builder import create_context_builder
+from src.services.summarizer import create_summarizer
+from src.services.message_writer import insert_messages, message_row
+from src.services.scheduler import QueueFullError, DeadlineExceededError
 from src.models.user import db
-from src.models.conversation import Conversation, Message
 import logging
-import json
 
 ai_bp = Blueprint('ai', __name__)
 logger = logging.getLogger(__name__)
+# Segundos sugeridos ao cliente (Retry-After) enquanto o modelo carrega
+LOADING_RETRY_AFTER = '5'
+context_builder = create_context_builder(ai_service)
+summarizer = create_summarizer(ai_service, context_builder)
+
+def get_message_writer():
+    """Gravação adiada de mensagens da aplicação atual (None no modo síncrono)"""
+    return current_app.extensions.get('message_writer')
+
+def load_context(conversation_id, message):
+    """Carrega as mensagens recentes da conversa que cabem no orçamento de tokens"""
+    writer = get_message_writer()
+    if writer and conversation_id:
+        # Ler as próprias escritas: o turno anterior pode ainda estar na fila
+        writer.wait_for(conversation_id)
+    return context_builder.build(conversation_id, message)
+
+def save_exchange(conversation_id, message, response_data, durable=False):
+    """Salva a mensagem do usuário e a resposta da IA na conversa
+
+    Com a gravação adiada ativa, as linhas são enfileiradas e a resposta não
+    espera o commit; ``durable=True`` força a gravação síncrona.
+    """
+    if not conversation_id:
+        return
+    
+    try:
+        # Contagem com o tokenizador do backend, reaproveitada na montagem do contexto
+        tokens, tokenizer = context_builder.count(message)
+        rows = [message_row(conversation_id, 'user', message, tokens, tokenizer)]
+        
+        # Salvar resposta da IA
+        tokens, tokenizer = context_builder.count(response_data['response'])
+        rows.append(message_row(
+            conversation_id,
+            'assistant',
+            response_data['response'],
+            tokens,
+            tokenizer,
+            metadata_dict={
+                'model': response_data.get('model'),
+                'status': response_data.get('status'),
+                'usage_tokens': response_data.get('tokens', 0)
+            }
+        ))
+        
+        # Histórico antigo é incorporado ao resumo em segundo plano, após a gravação
+        schedule_summary = (lambda: summarizer.schedule(conversation_id)) if summarizer else None
+        
+        writer = get_message_writer()
+        if writer and not durable and writer.enqueue(rows, on_flush=schedule_summary):
+            return
+        
+        insert_messages(rows)
+        if schedule_summary:
+            schedule_summary()
+        
+    except Exception as e:
+        logger.error(f"Erro ao salvar mensagens: {e}")
+        db.session.rollback()
+
+def model_loading():
+    """Dispara o carregamento (no modo lazy) e indica se o modelo ainda está carregando"""
+    ai_service.start_loading()
+    return ai_service.state == MODEL_LOADING
+
+def _loading_response():
+    """Resposta enquanto o modelo carrega em segundo plano"""
+    response = jsonify({'error': 'Modelo carregando, tente novamente em instantes', 'state': ai_service.state})
+    response.headers['Retry-After'] = LOADING_RETRY_AFTER
+    return response, 503
+
+def _busy_response():
+    """Resposta de backpressure quando a fila de inferência está cheia"""
+    response = jsonify({'error': 'Servidor ocupado, tente novamente em instantes'})
+    response.headers['Retry-After'] = '1'
+    return response, 429
 
 @ai_bp.route('/ai/generate', methods=['POST'])
 def generate_response():
@@ -19,60 +99,35 @@ def generate_response():
         
         if not message:
             return jsonify({'error': 'Mensagem é obrigatória'}), 400
+        try:
+            sampling = parse_sampling(data)
+            timeout = parse_timeout(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if model_loading():
+            return _loading_response()
         
         # Buscar contexto da conversa se fornecido
-        context = None
-        if conversation_id:
-            conversation = Conversation.query.get(conversation_id)
-            if conversation:
-                # Pegar últimas 5 mensagens para contexto
-                recent_messages = Message.query.filter_by(
-                    conversation_id=conversation_id
-                ).order_by(Message.created_at.desc()).limit(5).all()
-                
-                context = []
-                for msg in reversed(recent_messages):
-                    context.append({
-                        "role": msg.role,
-                        "content": msg.content
-                    })
+        context = load_context(conversation_id, message)
         
         # Gerar resposta usando o serviço de IA
-        response_data = ai_service.generate_response(
-            message=message,
-            conversation_id=conversation_id,
-            user_id=user_id,
-            context=context
-        )
+        try:
+            response_data = ai_service.generate_response(
+                message=message,
+                conversation_id=conversation_id,
+                user_id=user_id,
+                context=context,
+                timeout=timeout,
+                use_cache=data.get('cache', True),
+                sampling=sampling
+            )
+        except QueueFullError:
+            return _busy_response()
+        except DeadlineExceededError:
+            return jsonify({'error': 'Tempo limite da requisição excedido'}), 504
         
         # Salvar mensagem do usuário no banco se conversation_id fornecido
-        if conversation_id:
-            try:
-                user_message = Message(
-                    conversation_id=conversation_id,
-                    role='user',
-                    content=message,
-                    tokens=len(message.split())
-                )
-                db.session.add(user_message)
-                
-                # Salvar resposta da IA
-                ai_message = Message(
-                    conversation_id=conversation_id,
-                    role='assistant',
-                    content=response_data['response'],
-                    tokens=response_data.get('tokens', 0),
-                    metadata_dict={
-                        'model': response_data.get('model'),
-                        'status': response_data.get('status')
-                    }
-                )
-                db.session.add(ai_message)
-                db.session.commit()
-                
-            except Exception as e:
-                logger.error(f"Erro ao salvar mensagens: {e}")
-                db.session.rollback()
+        save_exchange(conversation_id, message, response_data, durable=bool(data.get('durable')))
         
         return jsonify(response_data), 200
         
@@ -91,28 +146,54 @@ def stream_response():
         
         if not message:
             return jsonify({'error': 'Mensagem é obrigatória'}), 400
+        try:
+            sampling = parse_sampling(data)
+            timeout = parse_timeout(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if model_loading():
+            return _loading_response()
+        
+        context = load_context(conversation_id, message)
+        
+        try:
+            stream = ai_service.stream_response(
+                message, conversation_id, user_id, context=context, timeout=timeout,
+                sampling=sampling
+            )
+        except QueueFullError:
+            return _busy_response()
+        
+        dumps = current_app.json.dumps
         
         def generate():
             try:
-                for chunk in ai_service.stream_response(message, conversation_id, user_id):
-                    yield f"data: {json.dumps(chunk)}\n\n"
+                for chunk in stream:
+                    yield f"data: {dumps(chunk)}\n\n"
                 
                 # Enviar evento de fim
-                yield f"data: {json.dumps({'event': 'end'})}\n\n"
+                yield f"data: {dumps({'event': 'end'})}\n\n"
                 
             except Exception as e:
                 logger.error(f"Erro no streaming: {e}")
-                yield f"data: {json.dumps({'error': 'Erro no streaming'})}\n\n"
+                yield f"data: {dumps({'error': 'Erro no streaming'})}\n\n"
+            finally:
+                # Cliente desconectado ou fim do stream: interromper a geração no backend
+                stream.close()
         
-        return Response(
+        response = Response(
             generate(),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
                 'Connection': 'keep-alive',
+                'X-Accel-Buffering': 'no',
                 'Access-Control-Allow-Origin': '*'
             }
         )
+        # Desconexão antes do primeiro chunk: generate() nunca começa e o finally dele não roda
+        response.call_on_close(stream.close)
+        return response
         
     except Exception as e:
         logger.error(f"Erro ao iniciar streaming: {str(e)}")
@@ -123,6 +204,9 @@ def get_ai_status():
     """Retorna status do serviço de IA"""
     try:
         status = ai_service.get_model_info()
+        status['summarizer'] = summarizer.get_stats() if summarizer else None
+        writer = get_message_writer()
+        status['message_writer'] = writer.get_stats() if writer else None
         return jsonify(status), 200
     except Exception as e:
         logger.error(f"Erro ao obter status da IA: {str(e)}")
@@ -130,7 +214,11 @@ def get_ai_status():
 
 @ai_bp.route('/ai/models', methods=['GET'])
 def get_available_models():
-    """Lista modelos de IA disponíveis"""
+    """Lista modelos de IA disponíveis
+    
+    ``current`` traz as estatísticas de execução (roteador, disjuntores,
+    histogramas de latência): o corpo muda a cada requisição, então não há ETag.
+    """
     try:
         models = {
             'current': ai_service.get_model_info(),
@@ -168,7 +256,7 @@ def get_available_models():
 
 @ai_bp.route('/ai/config', methods=['GET'])
 def get_ai_config():
-    """Retorna configuração atual da IA"""
+    """Retorna configuração atual da IA (ETag pelo hash do conteúdo)"""
     try:
         import os
         # AI_MODEL_TYPE é preferencial. AI_MODE permanece por compatibilidade.
@@ -176,12 +264,13 @@ def get_ai_config():
         config = {
             'model_type': model_type,
             'model_name': os.getenv('AI_MODEL_NAME', 'demo'),
+            'backends': [name.strip() for name in os.getenv('AI_BACKENDS', '').split(',') if name.strip()],
             'openai_configured': bool(os.getenv('OPENAI_API_KEY')),
             'hf_model': os.getenv('HF_MODEL_NAME', 'microsoft/DialoGPT-medium'),
             'llama_path': os.getenv('LLAMA_MODEL_PATH', './models/llama-3.3-70b-instruct'),
-            'status': ai_service.get_model_info()
+            'status': ai_service.get_model_summary()
         }
-        return jsonify(config), 200
+        return conditional(jsonify(config))
     except Exception as e:
         logger.error(f"Erro ao obter configuração: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -190,6 +279,8 @@ def get_ai_config():
 def test_ai():
     """Testa o serviço de IA com uma mensagem simples"""
     try:
+        if model_loading():
+            return _loading_response()
         test_message = "Olá, você está funcionando?"
         
         response_data = ai_service.generate_response(
@@ -205,6 +296,10 @@ def test_ai():
             'timestamp': response_data.get('timestamp')
         }), 200
         
+    except QueueFullError:
+        return _busy_response()
+    except DeadlineExceededError:
+        return jsonify({'test_status': 'failed', 'error': 'Tempo limite da requisição excedido'}), 504
     except Exception as e:
         logger.error(f"Erro no teste da IA: {str(e)}")
         return jsonify({
@@ -1,23 +1,102 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from sqlalchemy import and_, func, or_
+from src.http_cache import etag_for, not_modified, with_etag
 from src.models.user import db
 from src.models.conversation import Conversation, Message, Feedback
+from src.services.transfer import export_ndjson, import_ndjson
+from datetime import datetime
+from urllib.parse import urlencode
+import base64
+import io
 import logging
 
 conversation_bp = Blueprint('conversation', __name__)
 logger = logging.getLogger(__name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DEFAULT_MESSAGE_PAGE_SIZE = 100
+MAX_MESSAGE_PAGE_SIZE = 1000
+
+def encode_cursor(timestamp, row_id):
+    """Cursor opaco para paginação keyset (posição = timestamp + id)"""
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor):
+    """Decodifica um cursor; levanta ValueError se for inválido"""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        timestamp, row_id = datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Cursor inválido")
+    # Os timestamps do banco não têm fuso: um cursor com fuso não foi gerado aqui
+    if timestamp.tzinfo is not None:
+        raise ValueError("Cursor inválido")
+    return timestamp, row_id
+
+def page_size(default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Tamanho de página pedido em ?limit=, dentro dos limites"""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, maximum))
+
+def set_next_cursor(response, cursor):
+    """Expõe o cursor da próxima página nos cabeçalhos, mantendo o corpo como lista"""
+    response.headers['X-Next-Cursor'] = cursor
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    response.headers['Link'] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+
 @conversation_bp.route('/conversations', methods=['GET'])
 def get_conversations():
-    """Lista conversas (opcionalmente filtradas por usuário)"""
+    """Lista conversas (opcionalmente filtradas por usuário), paginadas por cursor
+    
+    A ordem é updated_at desc (created_at nas linhas antigas sem updated_at),
+    id desc; a próxima página é pedida com
+    ?cursor=<X-Next-Cursor>. O ETag vem de um agregado sobre as conversas do
+    filtro (quantidade, maior updated_at e maior id): novas mensagens avançam o
+    updated_at da conversa, então um 304 não monta a listagem.
+    """
     try:
         user_id = request.args.get('user_id', type=int)
+        limit = page_size()
         
+        version = db.select(func.count(Conversation.id), func.max(Conversation.updated_at),
+                            func.max(Conversation.id))
         if user_id:
-            conversations = Conversation.query.filter_by(user_id=user_id).order_by(Conversation.updated_at.desc()).all()
-        else:
-            conversations = Conversation.query.order_by(Conversation.updated_at.desc()).all()
-        
-        return jsonify([conv.to_dict() for conv in conversations]), 200
+            version = version.where(Conversation.user_id == user_id)
+        etag = etag_for('conversations', *db.session.execute(version).one())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        # Linhas com as colunas de to_dict(), serializadas sem instanciar objetos
+        query = db.select(
+            *Conversation.json_columns(), Conversation.message_count_subquery().label('message_count')
+        )
+        if user_id:
+            query = query.where(Conversation.user_id == user_id)
+        
+        activity_at = Conversation.activity_at()
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                position, conversation_id = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.where(or_(
+                activity_at < position,
+                and_(activity_at == position, Conversation.id < conversation_id)
+            ))
+        
+        rows = db.session.execute(query.order_by(
+            activity_at.desc(), Conversation.id.desc()
+        ).limit(limit + 1)).all()
+        
+        response = jsonify([row._asdict() for row in rows[:limit]])
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            set_next_cursor(response, encode_cursor(last.updated_at or last.created_at, last.id))
+        return with_etag(response, etag), 200
     except Exception as e:
         logger.error(f"Erro ao buscar conversas: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -48,23 +127,152 @@ def create_conversation():
         logger.error(f"Erro ao criar conversa: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+@conversation_bp.route('/conversations/export', methods=['GET'])
+def export_conversations():
+    """Exporta conversas e mensagens em NDJSON, em streaming (?user_id= opcional)"""
+    try:
+        user_id = request.args.get('user_id', type=int)
+        return Response(
+            stream_with_context(export_ndjson(current_app.json.dumps, user_id=user_id)),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename=conversations.ndjson'}
+        )
+    except Exception as e:
+        logger.error(f"Erro ao exportar conversas: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
+@conversation_bp.route('/conversations/import', methods=['POST'])
+def import_conversations():
+    """Importa NDJSON do export lendo o corpo em streaming (?user_id= reatribui as conversas)"""
+    try:
+        # Leitura bufferizada: o readline do stream WSGI lê byte a byte
+        lines = io.BufferedReader(request.stream, buffer_size=1 << 16)
+        stats = import_ndjson(lines, user_id=request.args.get('user_id', type=int), loads=current_app.json.loads)
+        logger.info(f"Importação: {stats['conversations']} conversas, {stats['messages']} mensagens")
+        return jsonify(stats), 500 if 'error' in stats else 200
+    except Exception as e:
+        logger.error(f"Erro ao importar conversas: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
+
 @conversation_bp.route('/conversations/<int:conversation_id>', methods=['GET'])
 def get_conversation(conversation_id):
-    """Busca uma conversa específica com suas mensagens"""
+    """Busca uma conversa específica com uma janela de suas mensagens
+    
+    Sem cursor retorna as ``limit`` mensagens mais recentes; ``before``/``after``
+    (id de mensagem) pedem a janela anterior/seguinte. ``role``, ``model`` e
+    ``status`` filtram as mensagens no banco. As mensagens vêm em ordem
+    cronológica e o JSON é gerado em streaming, linha a linha do banco.
+    
+    O ETag combina o updated_at da conversa com a quantidade e o maior id das
+    suas mensagens (consulta só no índice); com If-None-Match válido a janela
+    não é localizada nem serializada.
+    """
     try:
         conversation = Conversation.query.get(conversation_id)
         if not conversation:
             return jsonify({'error': 'Conversa não encontrada'}), 404
         
-        # Incluir mensagens na resposta
-        result = conversation.to_dict()
-        result['messages'] = [msg.to_dict() for msg in conversation.messages]
-        
-        return jsonify(result), 200
+        message_count, last_message_id = db.session.execute(
+            db.select(func.count(Message.id), func.max(Message.id)).where(Message.conversation_id == conversation_id)
+        ).one()
+        etag = etag_for('conversation', conversation_id, conversation.updated_at, message_count, last_message_id)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        before = request.args.get('before', type=int)
+        after = request.args.get('after', type=int)
+        if before and after:
+            return jsonify({'error': 'Use before ou after, não ambos'}), 400
+        limit = page_size(DEFAULT_MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGE_SIZE)
+        
+        anchor = None
+        if before or after:
+            anchor = Message.query.filter_by(id=before or after, conversation_id=conversation_id).first()
+            if not anchor:
+                return jsonify({'error': 'Mensagem de referência não encontrada'}), 400
+        
+        filters = message_filters()
+        window = message_window(conversation_id, limit, before=anchor if before else None,
+                                after=anchor if after else None, filters=filters)
+        
+        return with_etag(Response(
+            stream_with_context(stream_conversation(conversation.to_dict(message_count), conversation_id,
+                                                    window, filters)),
+            mimetype='application/json'
+        ), etag)
     except Exception as e:
         logger.error(f"Erro ao buscar conversa {conversation_id}: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
+def message_filters():
+    """Filtros de mensagem pedidos na query string (metadados consultados como JSON no banco)"""
+    filters = []
+    role = request.args.get('role')
+    if role:
+        filters.append(Message.role == role)
+    for key in ('model', 'status'):
+        value = request.args.get(key)
+        if value:
+            filters.append(Message.metadata_json[key].as_string() == value)
+    return filters
+
+def message_window(conversation_id, limit, before=None, after=None, filters=()):
+    """Localiza a janela de mensagens consultando apenas as chaves no índice
+    
+    Retorna os limites (created_at, id) da janela e se há mensagens antes/depois.
+    """
+    position = (Message.created_at, Message.id)
+    query = db.session.query(*position).filter(Message.conversation_id == conversation_id, *filters)
+    if after:
+        keys = query.filter(or_(
+            Message.created_at > after.created_at,
+            and_(Message.created_at == after.created_at, Message.id > after.id)
+        )).order_by(Message.created_at, Message.id).limit(limit + 1).all()
+        has_more_before, has_more_after = True, len(keys) > limit
+        keys = keys[:limit]
+    else:
+        if before:
+            query = query.filter(or_(
+                Message.created_at < before.created_at,
+                and_(Message.created_at == before.created_at, Message.id < before.id)
+            ))
+        keys = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        has_more_before, has_more_after = len(keys) > limit, before is not None
+        keys = keys[:limit][::-1]
+    
+    return {
+        'first': tuple(keys[0]) if keys else None,
+        'last': tuple(keys[-1]) if keys else None,
+        'has_more_before': has_more_before,
+        'has_more_after': has_more_after
+    }
+
+def stream_conversation(conversation_dict, conversation_id, window, filters=(), batch_size=200):
+    """Gera o JSON da conversa com as mensagens da janela sem montar a lista em memória"""
+    dumps = current_app.json.dumps
+    header = dumps(conversation_dict)
+    yield header[:-1] + (', ' if conversation_dict else '') + '"messages": ['
+    
+    first_id = last_id = None
+    if window['first']:
+        (first_at, first_id), (last_at, last_id) = window['first'], window['last']
+        messages = db.session.execute(db.select(*Message.json_columns()).where(
+            Message.conversation_id == conversation_id,
+            or_(Message.created_at > first_at, and_(Message.created_at == first_at, Message.id >= first_id)),
+            or_(Message.created_at < last_at, and_(Message.created_at == last_at, Message.id <= last_id)),
+            *filters
+        ).order_by(Message.created_at, Message.id).execution_options(yield_per=batch_size))
+        for index, row in enumerate(messages):
+            yield (', ' if index else '') + dumps(row._asdict())
+    
+    yield '], "pagination": ' + dumps({
+        'before': first_id if window['has_more_before'] else None,
+        'after': last_id if window['has_more_after'] else None,
+        'has_more_before': window['has_more_before'],
+        'has_more_after': window['has_more_after']
+    }) + '}'
+
 @conversation_bp.route('/conversations/<int:conversation_id>', methods=['PUT'])
 def update_conversation(conversation_id):
     """Atualiza uma conversa"""
@@ -116,10 +324,9 @@ def delete_conversation(conversation_id):
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @conversation_bp.route('/conversations/<int:conversation_id>/messages', methods=['POST'])
-def add_message():
+def add_message(conversation_id):
     """Adiciona uma mensagem à conversa"""
     try:
-        conversation_id = request.view_args['conversation_id']
         data = request.get_json()
         
         if not data or not data.get('role') or not data.get('content'):
@@ -139,6 +346,8 @@ def add_message():
         )
         
         db.session.add(message)
+        # Na mesma transação, como em insert_messages: a listagem e os ETags dependem do updated_at
+        conversation.updated_at = datetime.utcnow()
         db.session.commit()
         
         logger.info(f"Mensagem adicionada à conversa {conversation_id}")
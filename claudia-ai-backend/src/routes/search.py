@@ -0,0 +1,59 @@
+from flask import Blueprint, request, jsonify
+from src.models.user import db
+from src.models.search import search_index
+from src.routes.conversation import page_size, set_next_cursor
+import logging
+
+search_bp = Blueprint('search', __name__)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+SEARCH_TYPES = {
+    'all': ('message', 'conversation'),
+    'messages': ('message',),
+    'conversations': ('conversation',)
+}
+
+@search_bp.route('/search', methods=['GET'])
+def search():
+    """Busca no histórico por relevância, com trechos destacados e paginação"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+
+        kinds = SEARCH_TYPES.get(request.args.get('type', 'all'))
+        if not kinds:
+            return jsonify({'error': 'type deve ser all, messages ou conversations'}), 400
+
+        # Resultados por relevância: o cursor é a posição na lista
+        cursor = request.args.get('cursor', '0')
+        if not cursor.isdigit():
+            return jsonify({'error': 'Cursor inválido'}), 400
+        offset = int(cursor)
+        limit = page_size(DEFAULT_SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE)
+
+        results = search_index.search(
+            db.session,
+            query,
+            user_id=request.args.get('user_id', type=int),
+            conversation_id=request.args.get('conversation_id', type=int),
+            kinds=kinds,
+            limit=limit + 1,
+            offset=offset
+        )
+
+        has_more = len(results) > limit
+        response = jsonify({
+            'query': query,
+            'results': results[:limit],
+            'next_cursor': str(offset + limit) if has_more else None
+        })
+        if has_more:
+            set_next_cursor(response, str(offset + limit))
+        return response, 200
+
+    except Exception as e:
+        logger.error(f"Erro na busca: {str(e)}")
+        return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -1,4 +1,6 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy import func
+from src.http_cache import etag_for, not_modified, with_etag
 from src.models.user import db, User
 import logging
 
@@ -7,10 +9,17 @@ logger = logging.getLogger(__name__)
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    """Lista todos os usuários"""
+    """Lista todos os usuários (ETag pela quantidade, maior updated_at e maior id)"""
     try:
+        etag = etag_for('users', *db.session.execute(
+            db.select(func.count(User.id), func.max(User.updated_at), func.max(User.id))
+        ).one())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         users = User.query.all()
-        return jsonify([user.to_dict() for user in users]), 200
+        return with_etag(jsonify([user.to_dict() for user in users]), etag), 200
     except Exception as e:
         logger.error(f"Erro ao buscar usuários: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
@@ -58,7 +67,12 @@ def get_user(user_id):
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        return jsonify(user.to_dict()), 200
+        etag = etag_for('user', user.id, user.updated_at)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        return with_etag(jsonify(user.to_dict()), etag), 200
     except Exception as e:
         logger.error(f"Erro ao buscar usuário {user_id}: {str(e)}")
         return jsonify({'error': 'Erro interno do servidor'}), 500
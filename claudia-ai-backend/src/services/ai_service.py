@@ -1,19 +1,134 @@
 import os
+import copy
+import time
 import logging
+import threading
 from datetime import datetime
 import random
 
+from src.services.hf_runtime import HFRuntimeConfig
+from src.services.llama_runtime import LlamaRuntimeConfig
+from src.services.prefix_cache import PrefixStateCache
+from src.services.response_cache import create_response_cache
+from src.services.router import create_model_router
+from src.services.scheduler import DeadlineExceededError, InferenceScheduler, QueueFullError
+from src.services.speculative import SpeculativeDecoder
+
 logger = logging.getLogger(__name__)
 
+# Prompt de sistema padrão compartilhado por todos os backends
+SYSTEM_PROMPT = (
+    "Você é Claudia, uma assistente IA amigável, prestativa e inteligente. "
+    "Responda sempre em português de forma natural e conversacional."
+)
+
+# Parâmetros de amostragem usados pelos backends
+DEFAULT_SAMPLING = {'temperature': 0.7, 'top_p': 0.9}
+
+# Máximo de tokens gerados por resposta em cada backend (o Llama usa LLAMA_MAX_TOKENS)
+MAX_NEW_TOKENS = {'openai': 500, 'llama': 500, 'huggingface': 100}
+
+# Limites do que a requisição pode pedir em max_tokens e temperature
+MAX_TOKENS_LIMIT = int(os.getenv('AI_MAX_TOKENS_LIMIT', 4096))
+MAX_TEMPERATURE = 2.0
+# Maior prazo (segundos) que a requisição pode pedir em timeout; acima disso é limitado
+MAX_REQUEST_TIMEOUT = float(os.getenv('AI_MAX_REQUEST_TIMEOUT', 300))
+
+# Estados do carregamento do modelo (AIService.state)
+MODEL_PENDING = 'pending'
+MODEL_LOADING = 'loading'
+MODEL_READY = 'ready'
+MODEL_FAILED = 'failed'
+
+def parse_sampling(data):
+    """Sobrescritas de amostragem do corpo da requisição (max_tokens, temperature)
+    
+    Retorna None se não houver nenhuma; levanta ValueError com a mensagem para o cliente.
+    """
+    overrides = {}
+    max_tokens = data.get('max_tokens')
+    if max_tokens is not None:
+        if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or not 1 <= max_tokens <= MAX_TOKENS_LIMIT:
+            raise ValueError(f"max_tokens deve ser um inteiro entre 1 e {MAX_TOKENS_LIMIT}")
+        overrides['max_tokens'] = max_tokens
+    temperature = data.get('temperature')
+    if temperature is not None:
+        if isinstance(temperature, bool) or not isinstance(temperature, (int, float)) \
+                or not 0 <= temperature <= MAX_TEMPERATURE:
+            raise ValueError(f"temperature deve estar entre 0 e {MAX_TEMPERATURE}")
+        overrides['temperature'] = float(temperature)
+    return overrides or None
+
+def parse_timeout(data):
+    """Prazo da requisição em segundos (timeout do corpo), limitado a MAX_REQUEST_TIMEOUT
+    
+    Retorna None se ausente (prazo padrão do agendador); levanta ValueError com a mensagem para o cliente.
+    """
+    timeout = data.get('timeout')
+    if timeout is None:
+        return None
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0:
+        raise ValueError("timeout deve ser um número de segundos maior que 0")
+    return min(float(timeout), MAX_REQUEST_TIMEOUT)
+
+def _common_prefix_length(a, b):
+    """Conta quantos tokens iniciais duas sequências têm em comum"""
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
 class AIService:
-    def __init__(self):
-        # AI_MODEL_TYPE é a variável principal. AI_MODE é mantida por
+    def __init__(self, model_type=None, routed=False):
+        # AI_BACKENDS (lista) ativa o roteador entre vários backends e
+        # AI_MODEL_SOCKET delega ao servidor de modelo local. Senão,
+        # AI_MODEL_TYPE é a variável principal e AI_MODE é mantida por
         # compatibilidade retroativa.
-        self.model_type = os.getenv('AI_MODEL_TYPE') or os.getenv('AI_MODE', 'demo')
+        if model_type is None and os.getenv('AI_BACKENDS'):
+            model_type = 'router'
+        elif model_type is None and os.getenv('AI_MODEL_SOCKET'):
+            model_type = 'socket'
+        self.model_type = model_type or os.getenv('AI_MODEL_TYPE') or os.getenv('AI_MODE', 'demo')
+        # Instâncias gerenciadas pelo roteador não têm caches próprios e
+        # reportam falhas em vez de cair para o modo demonstração
+        self.routed = routed
         self.model_name = os.getenv('AI_MODEL_NAME', 'demo')
+        self.system_prompt = os.getenv('AI_SYSTEM_PROMPT') or SYSTEM_PROMPT
+        # Modelos como o DialoGPT não usam prompt de sistema; modelos instruct sim
+        self.hf_use_system_prompt = os.getenv('HF_USE_SYSTEM_PROMPT', 'false').lower() == 'true'
         self.model = None
         self.tokenizer = None
+        self.llama_runtime = None
+        self.hf_runtime = None
+        self.speculative = None
         self.is_initialized = False
+        self.scheduler = None
+        self.prefix_cache = None
+        self.openai_client = None
+        self.model_client = None
+        self.router = None
+        # Tokenizadores usados apenas para contar tokens do histórico
+        self._count_tokenizer = None
+        self._count_lock = threading.Lock()
+        self._tiktoken = None
+        self._llama_active_conversation = None
+        self._system_prefix = None
+        self.response_cache = None
+        self.semantic_cache = None
+        if not routed:
+            self.response_cache = create_response_cache()
+        
+        # Carregamento do modelo: feito por load()/start_loading(), nunca no construtor
+        self.state = MODEL_PENDING
+        self.load_error = None
+        self.load_seconds = None
+        self._load_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._loader = None
+        self._preloaded = False
         
         # Respostas de demonstração
         self.demo_responses = [
@@ -28,37 +143,135 @@ class AIService:
             "Estou funcionando em modo demonstração, mas posso ter conversas significativas!",
             "Que bom conversar com você! Há algo específico que gostaria de discutir?"
         ]
+    
+    def load(self):
+        """Carrega o modelo (e o cache semântico) na thread atual; retorna o estado final
+        
+        Idempotente: chamadas concorrentes esperam o primeiro carregamento.
+        """
+        with self._load_lock:
+            if self._loaded.is_set():
+                return self.state
+            self.state = MODEL_LOADING
+            started = time.perf_counter()
+            if not self.routed:
+                self._initialize_semantic_cache()
+            self.initialize_model()
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            self.state = MODEL_FAILED if self.load_error else MODEL_READY
+            self._loaded.set()
+        logger.info(f"Modelo {self.model_type} {self.state} em {self.load_seconds}s")
+        return self.state
+    
+    def start_loading(self):
+        """Inicia o carregamento em uma thread de fundo, se ainda não começou
         
-        self.initialize_model()
+        O modo demonstração não tem o que carregar e fica pronto na hora.
+        """
+        if self.state != MODEL_PENDING:
+            return
+        with self._start_lock:
+            if self.state != MODEL_PENDING:
+                return
+            if self.model_type == 'demo':
+                self.load()
+                return
+            self.state = MODEL_LOADING
+            self._loader = threading.Thread(target=self.load, name='ai-model-loader', daemon=True)
+            self._loader.start()
+    
+    def preload(self):
+        """Carrega só os pesos, no processo mestre, antes do fork dos workers
+        
+        Usado com AI_LOAD_MODE=preload (gunicorn.conf.py). Os workers herdam os
+        tensores por copy-on-write e, como ninguém escreve neles, as páginas
+        continuam compartilhadas. O que cria threads ou executa o modelo
+        (prompt de sistema, agendador) fica para load(), já em cada worker.
+        Só se aplica ao Hugging Face na CPU: o Llama mapeia o GGUF somente
+        leitura (use_mmap) e já compartilha o page cache; CUDA não sobrevive ao fork.
+        """
+        if self.model_type != 'huggingface':
+            logger.info(f"Preload não se aplica ao backend {self.model_type}; cada worker carrega o seu")
+            return False
+        try:
+            import torch
+            
+            if torch.cuda.is_available():
+                logger.info("GPU disponível: preload desativado, cada worker carrega o modelo")
+                return False
+            self._initialize_huggingface()
+            self._preloaded = True
+            logger.info("Pesos carregados antes do fork")
+        except Exception as e:
+            logger.error(f"Erro no preload do modelo: {e}; cada worker carregará o seu")
+            self.model = self.tokenizer = self._count_tokenizer = self.hf_runtime = None
+            self.is_initialized = False
+        return self._preloaded
+    
+    def wait_until_loaded(self, timeout=None):
+        """Aguarda o fim do carregamento; retorna o estado (MODEL_LOADING se expirou)"""
+        self._loaded.wait(timeout)
+        return self.state
+    
+    def get_readiness(self):
+        """Estado do carregamento para /api/health e /api/ai/status"""
+        return {
+            'state': self.state,
+            'model_type': self.model_type,
+            'load_seconds': self.load_seconds,
+            'error': self.load_error
+        }
     
     def initialize_model(self):
         """Inicializa o modelo de IA baseado na configuração"""
         try:
-            if self.model_type == 'openai':
+            if self._preloaded:
+                logger.info("Usando os pesos carregados pelo processo mestre")
+            elif self.model_type == 'openai':
                 self._initialize_openai()
+            elif self.model_type == 'socket':
+                self._initialize_socket()
             elif self.model_type == 'huggingface':
                 self._initialize_huggingface()
             elif self.model_type == 'llama':
                 self._initialize_llama()
+            elif self.model_type == 'router':
+                self._initialize_router()
             else:
                 logger.info("Usando modo demonstração")
                 self.is_initialized = True
+            
+            # Threads do PyTorch definidas no processo que executa o modelo
+            if self.hf_runtime and self.model.device.type == 'cpu':
+                self.hf_runtime.apply_threads()
+            
+            # Pré-computar o prompt de sistema antes de aceitar requisições
+            if self.model_type in ('huggingface', 'llama'):
+                self._get_system_prefix()
+            
+            # Modelos locais não são thread-safe: atender via fila dedicada
+            if self.model_type in ('huggingface', 'llama'):
+                self._initialize_scheduler()
         except Exception as e:
             logger.error(f"Erro ao inicializar modelo: {e}")
             logger.info("Fallback para modo demonstração")
+            self.load_error = str(e) or type(e).__name__
             self.model_type = 'demo'
             self.is_initialized = True
     
     def _initialize_openai(self):
         """Configura integração com OpenAI"""
         try:
-            import openai
+            from src.services.openai_client import OpenAIClient
+            
             api_key = os.getenv('OPENAI_API_KEY')
             if not api_key:
                 raise ValueError("OPENAI_API_KEY não configurada")
             
-            openai.api_key = api_key
+            # Cliente único com pool de conexões reaproveitado entre requisições
+            self.openai_client = OpenAIClient.from_env(api_key)
             self.model_name = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+            self._initialize_tiktoken()
             self.is_initialized = True
             logger.info(f"OpenAI configurado com modelo: {self.model_name}")
         except ImportError:
@@ -78,12 +291,20 @@ class AIService:
             
             self.tokenizer = AutoTokenizer.from_pretrained(model_name)
             self.model = AutoModelForCausalLM.from_pretrained(model_name)
+            # Cópia própria: o tokenizador principal é reconfigurado pela thread do modelo
+            self._count_tokenizer = copy.deepcopy(self.tokenizer)
             
             # Configurar para GPU se disponível
             if torch.cuda.is_available():
                 self.model = self.model.cuda()
                 logger.info("Modelo carregado na GPU")
             
+            # Precisão (bf16/int8), cache estático e compilação (HF_*); no preload,
+            # a conversão acontece no mestre e os pesos convertidos são compartilhados
+            self.hf_runtime = HFRuntimeConfig.from_env()
+            self.model = self.hf_runtime.prepare(self.model)
+            self._initialize_speculative()
+            
             self.is_initialized = True
             logger.info(f"Modelo Hugging Face carregado: {model_name}")
         except ImportError:
@@ -109,15 +330,21 @@ class AIService:
             if not os.path.exists(model_path):
                 raise FileNotFoundError(f"Modelo não encontrado: {model_path}")
 
+            # Threads, lote, contexto e afinidade detectados do host (LLAMA_*)
+            self.llama_runtime = LlamaRuntimeConfig.from_env()
+            self.llama_runtime.apply_affinity()
             self.model = Llama(
                 model_path=model_path,
-                n_ctx=2048,
-                n_threads=8,
-                verbose=False
+                verbose=False,
+                **self.llama_runtime.llama_kwargs()
             )
+            self._initialize_speculative()
+            self._initialize_prefix_cache()
             self.is_initialized = True
             logger.info(
-                f"Modelo Llama carregado com sucesso: {self.model_name}"
+                f"Modelo Llama carregado com sucesso: {self.model_name} "
+                f"(n_ctx={self.llama_runtime.n_ctx}, n_threads={self.llama_runtime.n_threads}, "
+                f"n_threads_batch={self.llama_runtime.n_threads_batch}, n_batch={self.llama_runtime.n_batch})"
             )
         except ImportError:
             logger.error("Biblioteca llama-cpp-python não instalada")
@@ -126,45 +353,445 @@ class AIService:
             logger.error(f"Erro ao carregar Llama: {e}")
             raise
     
-    def generate_response(self, message, conversation_id=None, user_id=None, context=None):
-        """Gera resposta usando o modelo configurado"""
+    def _initialize_socket(self):
+        """Conecta ao servidor de modelo local (AI_MODEL_SOCKET) e aguarda o modelo dele"""
+        from src.services.model_server import create_model_client
+        
+        self.model_client = create_model_client()
+        info = self.model_client.wait_until_ready(float(os.getenv('AI_MODEL_SERVER_WAIT', 600)))
+        self.model_name = info['model']['model_name']
+        self.is_initialized = True
+        logger.info(f"Servidor de modelo em {self.model_client.path}: {info['model']['model_type']} {self.model_name}")
+    
+    def _initialize_router(self):
+        """Inicializa todos os backends de AI_BACKENDS e o roteador entre eles"""
+        backends = {}
+        for name in [name.strip() for name in os.getenv('AI_BACKENDS', '').split(',') if name.strip()]:
+            service = AIService(model_type=name, routed=True)
+            service.load()
+            if service.model_type != name:
+                logger.warning(f"Backend {name} indisponível, ignorado pelo roteador")
+                continue
+            backends[name] = service
+        if not backends:
+            raise RuntimeError("Nenhum backend de AI_BACKENDS pôde ser inicializado")
+        
+        fallback = AIService(model_type='demo', routed=True)
+        fallback.load()
+        self.router = create_model_router(backends, fallback=fallback)
+        self.model_name = ','.join(backends)
+        self.is_initialized = True
+        logger.info(f"Roteador ativo com os backends: {self.model_name}")
+    
+    def _initialize_tiktoken(self):
+        """Carrega o tokenizador da OpenAI para contagem exata de tokens (opcional)"""
+        try:
+            import tiktoken
+            
+            try:
+                self._tiktoken = tiktoken.encoding_for_model(self.model_name)
+            except KeyError:
+                self._tiktoken = tiktoken.get_encoding('cl100k_base')
+        except ImportError:
+            logger.info("tiktoken não instalado; tokens da OpenAI serão estimados")
+    
+    def _initialize_semantic_cache(self):
+        """Configura o cache semântico de respostas (embeddings locais na CPU)"""
+        try:
+            from src.services.semantic_cache import create_semantic_cache
+            
+            self.semantic_cache = create_semantic_cache()
+        except ImportError:
+            logger.error("Bibliotecas numpy/sentence-transformers não instaladas; cache semântico desabilitado")
+        except Exception as e:
+            logger.error(f"Erro ao inicializar cache semântico: {e}")
+    
+    def _initialize_prefix_cache(self):
+        """Configura o cache de estados do llama.cpp por conversa"""
+        if os.getenv('LLAMA_PREFIX_CACHE_ENABLED', 'true').lower() != 'true':
+            logger.info("Cache de prefixo por conversa desabilitado")
+            return
+        
+        self.prefix_cache = PrefixStateCache(
+            max_entries=int(os.getenv('LLAMA_PREFIX_CACHE_MAX_ENTRIES', 16)),
+            max_bytes=int(os.getenv('LLAMA_PREFIX_CACHE_MAX_MB', 2048)) * 1024 ** 2
+        )
+    
+    def _initialize_speculative(self):
+        """Carrega o modelo rascunho da decodificação especulativa (opt-in)"""
+        self.speculative = SpeculativeDecoder.from_env()
+        if not self.speculative:
+            return
+        try:
+            if self.model_type == 'llama':
+                self.speculative.load_llama(self.model, self.llama_runtime)
+            else:
+                self.speculative.load_huggingface(self.model, self.hf_runtime)
+        except Exception as e:
+            logger.error(f"Erro ao carregar o modelo rascunho: {e}; decodificação especulativa desativada")
+            self.speculative = None
+    
+    def _initialize_scheduler(self):
+        """Configura o agendador que serializa e agrupa chamadas ao modelo local"""
+        if os.getenv('AI_SCHEDULER_ENABLED', 'true').lower() != 'true':
+            logger.info("Agendador de inferência desabilitado")
+            return
+        
+        self.scheduler = InferenceScheduler(
+            generate_fn=self._generate_direct,
+            stream_fn=self._stream_direct,
+            batch_generate_fn=self._generate_hf_batch if self.model_type == 'huggingface' else None,
+            max_batch_size=int(os.getenv('AI_MAX_BATCH_SIZE', 4)),
+            max_queue_size=int(os.getenv('AI_MAX_QUEUE_SIZE', 32)),
+            default_timeout=float(os.getenv('AI_REQUEST_TIMEOUT', 120)),
+            batch_wait=float(os.getenv('AI_BATCH_WAIT_MS', 10)) / 1000,
+            name=f'ai-scheduler-{self.model_type}'
+        )
+        logger.info(
+            f"Agendador de inferência ativo (lote máx. {self.scheduler.max_batch_size}, "
+            f"fila máx. {self.scheduler.max_queue_size})"
+        )
+    
+    def set_system_prompt(self, system_prompt):
+        """Altera o prompt de sistema, invalidando o prefixo pré-computado
+        
+        O novo prefixo é recalculado na próxima geração, na thread que detém o modelo.
+        """
+        if system_prompt == self.system_prompt:
+            return
+        self.system_prompt = system_prompt
+        if self.router:
+            for backend in self.router.backends:
+                backend.service.set_system_prompt(system_prompt)
+        self._system_prefix = None
+        if self.prefix_cache:
+            # Estados salvos das conversas começam com o prompt antigo
+            self.prefix_cache.clear()
+    
+    def _get_system_prefix(self):
+        """Retorna o prefixo do prompt de sistema já tokenizado e avaliado"""
+        if self._system_prefix is None or self._system_prefix['prompt'] != self.system_prompt:
+            self._system_prefix = self._compute_system_prefix()
+        return self._system_prefix
+    
+    def _compute_system_prefix(self):
+        """Tokeniza e avalia uma única vez o prefixo comum a todos os prompts"""
+        prefix = {'prompt': self.system_prompt, 'tokens': None, 'length': 0, 'state': None}
+        try:
+            if self.model_type == 'llama':
+                tokens = self._llama_tokenize(self._build_llama_system_header())
+                self.model.reset()
+                self.model.eval(tokens)
+                self._llama_active_conversation = None
+                prefix['tokens'] = tokens
+                prefix['length'] = len(tokens)
+                prefix['state'] = self.model.save_state()
+            elif self.model_type == 'huggingface' and self.hf_use_system_prompt:
+                import torch
+                
+                tokens = self.tokenizer.encode(f"{self.system_prompt}\n", return_tensors='pt')
+                tokens = tokens.to(self.model.device)
+                prefix['tokens'] = tokens
+                prefix['length'] = tokens.shape[1]
+                with torch.inference_mode():
+                    prefix['state'] = self.model(tokens, use_cache=True).past_key_values
+            else:
+                return prefix
+            logger.info(f"Prompt de sistema pré-computado ({prefix['length']} tokens)")
+        except Exception as e:
+            logger.error(f"Erro ao pré-computar prompt de sistema: {e}")
+            prefix['state'] = None
+        return prefix
+    
+    def count_tokens(self, text):
+        """Conta os tokens de um texto com o tokenizador do backend ativo"""
+        if self.router:
+            return self.router.backends[0].service.count_tokens(text)
+        if not text:
+            return 0
+        if self.model_client is not None:
+            return self.model_client.count_tokens(text)
+        if self.model_type == 'llama' and self.model is not None:
+            return len(self.model.tokenize(text.encode('utf-8'), add_bos=False, special=True))
+        if self.model_type == 'huggingface' and self._count_tokenizer is not None:
+            with self._count_lock:
+                return len(self._count_tokenizer.encode(text, add_special_tokens=False))
+        if self._tiktoken is not None:
+            return len(self._tiktoken.encode(text))
+        # Sem tokenizador: estimativa de ~4 caracteres por token
+        return max(1, (len(text) + 3) // 4)
+    
+    def get_tokenizer_id(self):
+        """Identifica o tokenizador usado por count_tokens (contagens salvas valem só para ele)"""
+        if self.router:
+            return self.router.backends[0].service.get_tokenizer_id()
+        if self.model_client is not None:
+            return self.model_client.info['tokenizer_id']
+        if self.model_type == 'llama' and self.model is not None:
+            return f"llama:{self.model_name}"
+        if self.model_type == 'huggingface' and self._count_tokenizer is not None:
+            return f"hf:{self._count_tokenizer.name_or_path}"
+        if self._tiktoken is not None:
+            return f"tiktoken:{self._tiktoken.name}"
+        return 'approx'
+    
+    def get_context_window(self):
+        """Tokens disponíveis para o prompt: janela do modelo menos a resposta
+        
+        Retorna None quando não há limite (modo demonstração).
+        """
+        if os.getenv('AI_CONTEXT_WINDOW'):
+            return int(os.getenv('AI_CONTEXT_WINDOW'))
+        if self.router:
+            windows = [backend.service.get_context_window() for backend in self.router.backends]
+            windows = [window for window in windows if window]
+            return min(windows) if windows else None
+        if self.model_client is not None:
+            return self.model_client.info['context_window']
+        if self.model_type == 'llama' and self.model is not None:
+            return self.model.n_ctx() - self.llama_runtime.max_tokens
+        if self.model_type == 'huggingface' and self.model is not None:
+            window = getattr(self.model.config, 'max_position_embeddings', None) or self.tokenizer.model_max_length
+            return window - MAX_NEW_TOKENS['huggingface']
+        if self.model_type == 'openai':
+            return int(os.getenv('OPENAI_CONTEXT_WINDOW', 16385)) - MAX_NEW_TOKENS['openai']
+        return None
+    
+    def uses_system_prompt(self):
+        """Indica se o prompt de sistema ocupa espaço na janela de contexto"""
+        if self.router:
+            return any(backend.service.uses_system_prompt() for backend in self.router.backends)
+        if self.model_client is not None:
+            return self.model_client.info['uses_system_prompt']
+        return self.model_type != 'huggingface' or self.hf_use_system_prompt
+    
+    def _build_openai_messages(self, message, context=None):
+        """Monta a lista de mensagens no formato de chat da OpenAI"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        
+        # Adicionar contexto se fornecido
+        if context and isinstance(context, list):
+            messages.extend(context)
+        
+        messages.append({"role": "user", "content": message})
+        return messages
+    
+    def sampling_params(self, overrides=None):
+        """Amostragem efetiva: padrões do backend com as sobrescritas da requisição"""
+        if self.llama_runtime:
+            max_tokens = self.llama_runtime.max_tokens
+        else:
+            max_tokens = MAX_NEW_TOKENS.get(self.model_type, MAX_NEW_TOKENS['openai'])
+        params = dict(DEFAULT_SAMPLING, max_tokens=max_tokens)
+        if overrides:
+            params.update(overrides)
+        return params
+    
+    def _build_openai_request(self, message, context=None, params=None):
+        """Parâmetros da chamada de chat completion da OpenAI"""
+        params = params or self.sampling_params()
+        return {
+            'model': self.model_name,
+            'messages': self._build_openai_messages(message, context),
+            'max_tokens': params['max_tokens'],
+            'temperature': params['temperature'],
+            'top_p': params['top_p']
+        }
+    
+    def _build_llama_system_header(self):
+        """Prefixo de sistema do prompt Llama 3.x, idêntico em todas as requisições"""
+        return (
+            "<|begin_of_text|>"
+            "<|start_header_id|>system<|end_header_id|>\n"
+            f"{self.system_prompt}"
+            "<|eot_id|>"
+        )
+    
+    def _build_llama_prompt(self, message, context=None):
+        """Constrói prompt no formato Llama 3.x"""
+        prompt = self._build_llama_system_header()
+        if context and isinstance(context, list):
+            for item in context:
+                role = item.get('role', 'user')
+                content = item.get('content', '')
+                prompt += (
+                    f"<|start_header_id|>{role}<|end_header_id|>\n"
+                    f"{content}<|eot_id|>"
+                )
+        prompt += (
+            "<|start_header_id|>user<|end_header_id|>\n"
+            f"{message}<|eot_id|>"
+            "<|start_header_id|>assistant<|end_header_id|>\n"
+        )
+        return prompt
+    
+    def _build_hf_input(self, message, context=None):
+        """Monta o texto de entrada para modelos Hugging Face"""
+        if context and isinstance(context, list):
+            history = "\n".join(item.get('content', '') for item in context)
+            return f"{history}\n{message}"
+        return message
+    
+    def _prepare_hf_inputs(self, message, context=None, reuse_prefix=True):
+        """Tokeniza a entrada do Hugging Face partindo do prefixo de sistema pré-computado
+        
+        Retorna os ids de entrada e uma cópia do KV cache do prefixo (ou None,
+        também quando ``reuse_prefix`` é falso).
+        """
+        import torch
+        
+        inputs = self.tokenizer.encode(self._build_hf_input(message, context), return_tensors='pt')
+        inputs = inputs.to(self.model.device)
+        if not self.hf_use_system_prompt:
+            return inputs, None
+        
+        prefix = self._get_system_prefix()
+        inputs = torch.cat([prefix['tokens'], inputs], dim=1)
+        if prefix['state'] is None or not reuse_prefix or self.hf_runtime.static_cache:
+            # O cache estático é alocado pelo próprio generate: só os tokens do prefixo
+            return inputs, None
+        # O generate estende o cache no lugar: cada requisição usa sua própria cópia
+        return inputs, copy.deepcopy(prefix['state'])
+    
+    def generate_response(self, message, conversation_id=None, user_id=None, context=None,
+                          timeout=None, use_cache=True, sampling=None):
+        """Gera resposta usando o modelo configurado
+        
+        ``sampling`` sobrescreve max_tokens/temperature (ver parse_sampling).
+        Com o agendador ativo, pode levantar QueueFullError ou DeadlineExceededError.
+        """
         if not self.is_initialized:
             return self._error_response("Modelo não inicializado")
         
+        cached, cache_state = self._check_response_caches(message, context, use_cache, sampling)
+        if cached:
+            return cached
+        
+        if self.router:
+            response = self.router.generate(
+                lambda service: service.generate_response(
+                    message, conversation_id, context=context, timeout=timeout, use_cache=False,
+                    sampling=sampling
+                )
+            )
+        elif self.scheduler:
+            response = self.scheduler.generate(message, context, conversation_id, timeout=timeout,
+                                               sampling=sampling)
+        elif self.model_client:
+            response = self._generate_socket_response(message, context, conversation_id, timeout, sampling)
+        else:
+            response = self._generate_direct(message, context, conversation_id, sampling)
+        
+        self._store_response_caches(message, cache_state, response)
+        return response
+    
+    def _check_response_caches(self, message, context, use_cache=True, sampling=None):
+        """Consulta os caches exato e semântico
+        
+        Retorna a resposta em cache (ou None) e o estado usado para armazenar
+        a resposta gerada depois.
+        """
+        cache_state = {'key': None, 'scope': None}
+        if not use_cache:
+            return None, cache_state
+        
+        params = self.sampling_params(sampling)
+        if self.response_cache:
+            cache_state['key'], cached = self._lookup_cached_response(message, context, params)
+            if cached:
+                return dict(cached, status='cached', timestamp=datetime.utcnow().isoformat()), cache_state
+        
+        if self.semantic_cache:
+            cache_state['scope'], cached = self._lookup_semantic_response(message, context, params)
+            if cached:
+                return cached, cache_state
+        return None, cache_state
+    
+    def _store_response_caches(self, message, cache_state, response):
+        """Armazena uma resposta gerada com sucesso nos caches consultados"""
+        if response.get('status') != 'success':
+            return
+        if cache_state['key']:
+            self.response_cache.set(cache_state['key'], response)
+        if cache_state['scope']:
+            self._store_semantic_response(message, cache_state['scope'], response)
+    
+    def _lookup_cached_response(self, message, context, params):
+        """Consulta o cache de respostas; retorna a chave usada e a resposta, se houver"""
+        if not self.response_cache.is_cacheable(params):
+            self.response_cache.record_bypass()
+            return None, None
+        
+        model = f"{self.model_type}:{self.model_name}:{self.system_prompt}"
+        key = self.response_cache.make_key(model, message, context, params)
+        return key, self.response_cache.get(key)
+    
+    def _lookup_semantic_response(self, message, context, params):
+        """Busca uma resposta para mensagem semanticamente equivalente"""
+        if not self.semantic_cache.is_cacheable(params):
+            self.semantic_cache.record_bypass()
+            return None, None
+        
+        model = f"{self.model_type}:{self.model_name}:{self.system_prompt}"
+        scope = self.semantic_cache.make_scope(model, context, params)
         try:
+            cached, similarity = self.semantic_cache.lookup(message, scope)
+        except Exception as e:
+            logger.error(f"Erro ao consultar cache semântico: {e}")
+            return None, None
+        
+        if cached:
+            cached = dict(
+                cached,
+                status='cached',
+                cache='semantic',
+                similarity=round(similarity, 4),
+                timestamp=datetime.utcnow().isoformat()
+            )
+        return scope, cached
+    
+    def _store_semantic_response(self, message, scope, response):
+        """Armazena a resposta gerada no cache semântico"""
+        try:
+            self.semantic_cache.add(message, scope, response)
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache semântico: {e}")
+    
+    def _generate_direct(self, message, context=None, conversation_id=None, sampling=None):
+        """Gera resposta chamando o backend diretamente na thread atual"""
+        try:
+            params = self.sampling_params(sampling)
             if self.model_type == 'openai':
-                return self._generate_openai_response(message, context)
+                return self._generate_openai_response(message, context, params)
+            elif self.model_type == 'socket':
+                return self._generate_socket_response(message, context, conversation_id, sampling=sampling)
             elif self.model_type == 'huggingface':
-                return self._generate_hf_response(message, context)
+                return self._generate_hf_response(message, context, params)
             elif self.model_type == 'llama':
-                return self._generate_llama_response(message, context)
+                return self._generate_llama_response(message, context, conversation_id, params)
             else:
                 return self._generate_demo_response(message, context)
         except Exception as e:
             logger.error(f"Erro ao gerar resposta: {e}")
             return self._error_response("Erro ao gerar resposta")
     
-    def _generate_openai_response(self, message, context=None):
+    def _generate_socket_response(self, message, context=None, conversation_id=None, timeout=None,
+                                  sampling=None):
+        """Gera resposta no servidor de modelo (fila cheia e prazo excedido são repassados)"""
+        try:
+            return self.model_client.generate(message, context, conversation_id, timeout=timeout,
+                                              sampling=sampling)
+        except (QueueFullError, DeadlineExceededError):
+            raise
+        except Exception as e:
+            logger.error(f"Erro no servidor de modelo: {e}")
+            return self._fallback_response(message)
+    
+    def _generate_openai_response(self, message, context=None, params=None):
         """Gera resposta usando OpenAI"""
         try:
-            import openai
-            
-            messages = [
-                {"role": "system", "content": "Você é Claudia, uma assistente IA amigável, prestativa e inteligente. Responda sempre em português de forma natural e conversacional."}
-            ]
-            
-            # Adicionar contexto se fornecido
-            if context and isinstance(context, list):
-                messages.extend(context)
-            
-            messages.append({"role": "user", "content": message})
-            
-            response = openai.ChatCompletion.create(
-                model=self.model_name,
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-                top_p=0.9
+            response = self.openai_client.chat_completion(
+                **self._build_openai_request(message, context, params)
             )
             
             return {
@@ -176,37 +803,46 @@ class AIService:
             }
         except Exception as e:
             logger.error(f"Erro OpenAI: {e}")
-            return self._generate_demo_response(message)
+            return self._fallback_response(message)
+    
+    @staticmethod
+    def _hf_sampling_kwargs(params):
+        """Argumentos de amostragem do generate (temperature 0 = decodificação gulosa)"""
+        if params['temperature'] <= 0:
+            return {'max_new_tokens': params['max_tokens'], 'do_sample': False}
+        return {'max_new_tokens': params['max_tokens'], 'do_sample': True, 'temperature': params['temperature']}
     
-    def _generate_hf_response(self, message, context=None):
+    def _hf_speculation(self):
+        """Argumentos do modelo assistente e o ponto de partida das métricas (vazios se inativo)"""
+        if not self.speculative or not self.speculative.enabled:
+            return {}, None
+        return self.speculative.hf_generate_kwargs(), self.speculative.hf_snapshot()
+    
+    def _generate_hf_response(self, message, context=None, params=None):
         """Gera resposta usando Hugging Face"""
         try:
             import torch
             
-            # Preparar input
-            input_text = message
-            if context:
-                input_text = f"{context}\n{message}"
-            
-            # Tokenizar
-            inputs = self.tokenizer.encode(input_text, return_tensors='pt')
+            # Preparar e tokenizar input (o assistente não recebe o KV do prefixo: sem reuso)
+            assistant, snapshot = self._hf_speculation()
+            inputs, past_key_values = self._prepare_hf_inputs(message, context, reuse_prefix=not assistant)
             
             # Gerar resposta
-            with torch.no_grad():
+            with torch.inference_mode():
                 outputs = self.model.generate(
                     inputs,
-                    max_length=inputs.shape[1] + 100,
-                    temperature=0.7,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id
+                    past_key_values=past_key_values,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    **self._hf_sampling_kwargs(params or self.sampling_params()),
+                    **assistant
                 )
+            if snapshot:
+                self.speculative.record_hf(snapshot, outputs.shape[1] - inputs.shape[1])
             
-            # Decodificar resposta
-            response_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            # Extrair apenas a nova parte da resposta
-            if input_text in response_text:
-                response_text = response_text.replace(input_text, "").strip()
+            # Decodificar apenas a nova parte da resposta
+            response_text = self.tokenizer.decode(
+                outputs[0][inputs.shape[1]:], skip_special_tokens=True
+            ).strip()
             
             return {
                 'response': response_text or "Desculpe, não consegui gerar uma resposta adequada.",
@@ -217,57 +853,129 @@ class AIService:
             }
         except Exception as e:
             logger.error(f"Erro Hugging Face: {e}")
-            return self._generate_demo_response(message)
+            return self._fallback_response(message)
+    
+    def _generate_hf_batch(self, requests):
+        """Gera respostas para várias requisições em um único lote do Hugging Face"""
+        import torch
+        
+        input_texts = [self._build_hf_input(message, context) for message, context in requests]
+        if self.hf_use_system_prompt:
+            # Com padding à esquerda o prefixo não fica alinhado: sem reuso do KV aqui
+            input_texts = [f"{self.system_prompt}\n{text}" for text in input_texts]
+        
+        # Padding à esquerda para que todas as sequências continuem do mesmo ponto;
+        # o tokenizador é compartilhado com a geração individual, então o lado é restaurado
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = 'left'
+        try:
+            inputs = self.tokenizer(input_texts, return_tensors='pt', padding=True)
+        finally:
+            self.tokenizer.padding_side = padding_side
+        if self.model.device.type != 'cpu':
+            inputs = inputs.to(self.model.device)
+        prompt_length = inputs['input_ids'].shape[1]
+        # Tokens reais de cada prompt, sem o padding
+        prompt_tokens = inputs['attention_mask'].sum(dim=1).tolist()
+        
+        with torch.inference_mode():
+            outputs = self.model.generate(
+                **inputs,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **self._hf_sampling_kwargs(self.sampling_params())
+            )
+        
+        results = []
+        for row, row_prompt_tokens in zip(outputs, prompt_tokens):
+            new_tokens = row[prompt_length:]
+            response_text = self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+            # Sequências que terminam antes das outras são completadas com padding após o EOS
+            finished = (new_tokens == self.tokenizer.eos_token_id).nonzero()
+            generated = int(finished[0]) + 1 if len(finished) else len(new_tokens)
+            results.append({
+                'response': response_text or "Desculpe, não consegui gerar uma resposta adequada.",
+                'tokens': int(row_prompt_tokens) + generated,
+                'model': 'huggingface-local',
+                'timestamp': datetime.utcnow().isoformat(),
+                'status': 'success'
+            })
+        return results
+    
+    def _llama_tokenize(self, prompt):
+        """Tokeniza o prompt da mesma forma que o llama.cpp faz ao gerar"""
+        return self.model.tokenize(prompt.encode('utf-8'), special=True)
+    
+    def _restore_llama_prefix(self, conversation_id, prompt):
+        """Carrega o estado já avaliado da conversa (ou do prompt de sistema) antes de gerar
+        
+        O llama.cpp compara os tokens carregados com o novo prompt e avalia
+        apenas a parte que não coincide com o prefixo.
+        """
+        prompt_tokens = self._llama_tokenize(prompt)
+        reused = 0
+        if self.prefix_cache and conversation_id:
+            if self._llama_active_conversation == conversation_id:
+                # O modelo já está no estado desta conversa
+                state_tokens = self.model.input_ids[:self.model.n_tokens]
+            else:
+                state = self.prefix_cache.get(conversation_id)
+                state_tokens = state.input_ids[:state.n_tokens] if state is not None else []
+                if len(state_tokens):
+                    self.model.load_state(state)
+            
+            reused = _common_prefix_length(state_tokens, prompt_tokens)
+            self.prefix_cache.record(reused > 0, reused)
+            self._llama_active_conversation = conversation_id
+        else:
+            self._llama_active_conversation = None
+        
+        # Sem estado aproveitável: partir do prompt de sistema já avaliado
+        system_prefix = self._get_system_prefix()
+        if system_prefix['state'] is not None and reused < system_prefix['length']:
+            current_tokens = self.model.input_ids[:self.model.n_tokens]
+            if _common_prefix_length(current_tokens, system_prefix['tokens']) < system_prefix['length']:
+                self.model.load_state(system_prefix['state'])
+    
+    def _save_llama_prefix(self, conversation_id):
+        """Salva o estado do modelo após a geração para o próximo turno"""
+        if not self.prefix_cache or not conversation_id:
+            return
+        
+        state = self.model.save_state()
+        size = state.llama_state_size + state.input_ids.nbytes + state.scores.nbytes
+        self.prefix_cache.put(conversation_id, state, size)
     
-    def _generate_llama_response(self, message, context=None):
+    def _generate_llama_response(self, message, context=None, conversation_id=None, params=None):
         """Gera resposta usando Llama"""
         try:
-            def build_prompt(msg, ctx):
-                """Constrói prompt no formato Llama 3.x"""
-                prompt = (
-                    "<|begin_of_text|>"
-                    "<|start_header_id|>system<|end_header_id|>\n"
-                    "Você é Claudia, uma assistente IA amigável, prestativa e inteligente. Responda sempre em português de forma natural e conversacional."
-                    "<|eot_id|>"
-                )
-                if ctx and isinstance(ctx, list):
-                    for item in ctx:
-                        role = item.get('role', 'user')
-                        content = item.get('content', '')
-                        prompt += (
-                            f"<|start_header_id|>{role}<|end_header_id|>\n"
-                            f"{content}<|eot_id|>"
-                        )
-                prompt += (
-                    "<|start_header_id|>user<|end_header_id|>\n"
-                    f"{msg}<|eot_id|>"
-                    "<|start_header_id|>assistant<|end_header_id|>\n"
-                )
-                return prompt
-
-            prompt = build_prompt(message, context)
+            params = params or self.sampling_params()
+            prompt = self._build_llama_prompt(message, context)
+            self._restore_llama_prefix(conversation_id, prompt)
 
             response = self.model(
                 prompt,
-                max_tokens=500,
-                temperature=0.7,
-                top_p=0.9,
+                max_tokens=params['max_tokens'],
+                temperature=params['temperature'],
+                top_p=params['top_p'],
                 stop=["<|eot_id|>"],
                 echo=False
             )
+            self._save_llama_prefix(conversation_id)
 
             text = response['choices'][0]['text'].strip()
 
             return {
                 'response': text,
-                'tokens': len(text.split()),
+                'tokens': response['usage']['total_tokens'],
                 'model': self.model_name,
                 'timestamp': datetime.utcnow().isoformat(),
                 'status': 'success'
             }
         except Exception as e:
             logger.error(f"Erro Llama: {e}")
-            return self._generate_demo_response(message)
+            return self._fallback_response(message)
     
     def _generate_demo_response(self, message, context=None):
         """Gera resposta de demonstração"""
@@ -298,6 +1006,12 @@ class AIService:
             'status': 'demo'
         }
     
+    def _fallback_response(self, message):
+        """Resposta após falha do backend: modo demonstração, ou erro sob o roteador"""
+        if self.routed:
+            return self._error_response("Falha no backend")
+        return self._generate_demo_response(message)
+    
     def _error_response(self, error_message):
         """Retorna resposta de erro padronizada"""
         return {
@@ -308,13 +1022,14 @@ class AIService:
             'status': 'error'
         }
     
-    def get_model_info(self):
-        """Retorna informações sobre o modelo atual"""
+    def get_model_summary(self):
+        """Identificação e capacidades do modelo atual (muda só ao reinicializar)"""
         return {
             'model_type': self.model_type,
             'model_name': self.model_name,
             'is_initialized': self.is_initialized,
             'status': 'online' if self.is_initialized else 'offline',
+            'state': self.state,
             'capabilities': {
                 'text_generation': True,
                 'conversation': True,
@@ -323,24 +1038,240 @@ class AIService:
             }
         }
     
-    def stream_response(self, message, conversation_id=None, user_id=None):
-        """Gera resposta em streaming (simulado para demo)"""
-        response_data = self.generate_response(message, conversation_id, user_id)
+    def get_model_info(self):
+        """Retorna informações sobre o modelo atual com as estatísticas de execução"""
+        return {
+            **self.get_model_summary(),
+            'loading': self.get_readiness(),
+            'scheduler': self.scheduler.get_stats() if self.scheduler else None,
+            'router': self.router.get_stats() if self.router else None,
+            'openai_client': self.openai_client.get_stats() if self.openai_client else None,
+            'llama_runtime': self.llama_runtime.to_dict() if self.llama_runtime else None,
+            'hf_runtime': self.hf_runtime.to_dict() if self.hf_runtime else None,
+            'speculative': self.speculative.get_stats() if self.speculative else None,
+            'model_server': self.model_client.get_stats() if self.model_client else None,
+            'prefix_cache': self.prefix_cache.get_stats() if self.prefix_cache else None,
+            'response_cache': self.response_cache.get_stats() if self.response_cache else None,
+            'semantic_cache': self.semantic_cache.get_stats() if self.semantic_cache else None,
+            'system_prefix': {
+                'precomputed': bool(self._system_prefix and self._system_prefix['state'] is not None),
+                'tokens': self._system_prefix['length'] if self._system_prefix else 0
+            }
+        }
+    
+    def stream_response(self, message, conversation_id=None, user_id=None, context=None, timeout=None,
+                        sampling=None):
+        """Gera resposta em streaming, emitindo os tokens à medida que são produzidos
         
-        # Simular streaming dividindo a resposta em chunks
-        response_text = response_data['response']
-        words = response_text.split()
+        Retorna um iterador de chunks; fechá-lo (ex.: cliente desconectado)
+        interrompe a geração no backend. Com o agendador ativo, a requisição é
+        enfileirada imediatamente e pode levantar QueueFullError.
+        """
+        if self.router and self.is_initialized:
+            return self.router.stream(
+                lambda service: service.stream_response(
+                    message, conversation_id, context=context, timeout=timeout, sampling=sampling
+                )
+            )
+        if self.scheduler and self.is_initialized:
+            return self.scheduler.stream(message, context, conversation_id, timeout=timeout, sampling=sampling)
+        if self.model_client and self.is_initialized:
+            return self.model_client.stream(message, context, conversation_id, timeout=timeout,
+                                            sampling=sampling)
+        return self._stream_direct(message, context, conversation_id, sampling)
+    
+    def _stream_direct(self, message, context=None, conversation_id=None, sampling=None):
+        """Executa o streaming chamando o backend diretamente na thread atual"""
+        if not self.is_initialized:
+            error = self._error_response("Modelo não inicializado")
+            yield self._stream_chunk('', True, error['model'], status='error')
+            return
         
-        for i, word in enumerate(words):
-            chunk = {
-                'chunk': word + ' ',
-                'is_final': i == len(words) - 1,
-                'tokens': response_data['tokens'],
-                'model': response_data['model'],
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            yield chunk
+        if self.model_type == 'openai':
+            model = self.model_name
+            backend_stream = self._stream_openai_response
+        elif self.model_type == 'huggingface':
+            model = 'huggingface-local'
+            backend_stream = self._stream_hf_response
+        elif self.model_type == 'llama':
+            model = self.model_name
+            backend_stream = self._stream_llama_response
+        else:
+            model = 'demo-mode'
+            backend_stream = self._stream_demo_response
+        
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+        status = 'demo' if model == 'demo-mode' else 'success'
+        emitted = False
+        params = self.sampling_params(sampling)
+        if self.model_type == 'llama':
+            stream = backend_stream(message, context, usage, conversation_id, params)
+        else:
+            stream = backend_stream(message, context, usage, params)
+        try:
+            for piece in stream:
+                if not piece:
+                    continue
+                emitted = True
+                yield self._stream_chunk(piece, False, model)
+        except Exception as e:
+            logger.error(f"Erro no streaming ({self.model_type}): {e}")
+            if emitted or self.routed:
+                status = 'error'
+            else:
+                # Nada foi enviado ainda: usar o modo demonstração como nos demais caminhos
+                model, status = 'demo-mode', 'demo'
+                usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+                for piece in self._stream_demo_response(message, context, usage):
+                    yield self._stream_chunk(piece, False, model)
+        finally:
+            stream.close()
+        
+        yield self._stream_chunk('', True, model, usage=usage, status=status)
+    
+    def _stream_chunk(self, text, is_final, model, usage=None, status=None):
+        """Monta um evento de streaming"""
+        chunk = {
+            'chunk': text,
+            'is_final': is_final,
+            'model': model,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        if is_final:
+            usage = usage or {'prompt_tokens': 0, 'completion_tokens': 0}
+            chunk['tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+            chunk['usage'] = dict(usage)
+            chunk['status'] = status
+        return chunk
+    
+    def _stream_openai_response(self, message, context, usage, params=None):
+        """Streaming de tokens usando OpenAI"""
+        stream = self.openai_client.stream_chat_completion(
+            stream_options={'include_usage': True},
+            **self._build_openai_request(message, context, params)
+        )
+        try:
+            for chunk in stream:
+                self._update_openai_usage(chunk, usage)
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        finally:
+            stream.close()
+    
+    @staticmethod
+    def _update_openai_usage(chunk, usage):
+        """Contabiliza tokens de um chunk de streaming da OpenAI
+        
+        O último chunk traz o uso real; até lá, cada delta conta como um token.
+        """
+        if chunk.usage:
+            usage['prompt_tokens'] = chunk.usage.prompt_tokens
+            usage['completion_tokens'] = chunk.usage.completion_tokens
+        elif chunk.choices and chunk.choices[0].delta.content:
+            usage['completion_tokens'] += 1
+    
+    def _stream_hf_response(self, message, context, usage, params=None):
+        """Streaming de tokens usando Hugging Face (TextIteratorStreamer)"""
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+        
+        assistant, snapshot = self._hf_speculation()
+        inputs, past_key_values = self._prepare_hf_inputs(message, context, reuse_prefix=not assistant)
+        usage['prompt_tokens'] = inputs.shape[1]
+        
+        stop_event = threading.Event()
+        
+        class StopOnEvent(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return stop_event.is_set()
+        
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=120
+        )
+        result = {}
+        
+        def run_generation():
+            try:
+                with torch.inference_mode():
+                    result['outputs'] = self.model.generate(
+                        inputs,
+                        past_key_values=past_key_values,
+                        pad_token_id=self.tokenizer.eos_token_id,
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([StopOnEvent()]),
+                        **self._hf_sampling_kwargs(params or self.sampling_params()),
+                        **assistant
+                    )
+                if snapshot:
+                    self.speculative.record_hf(snapshot, result['outputs'].shape[1] - inputs.shape[1])
+            except Exception as e:
+                result['error'] = e
+                # Libera o consumidor que está aguardando no streamer
+                streamer.end()
+        
+        worker = threading.Thread(target=run_generation, daemon=True)
+        worker.start()
+        try:
+            for text in streamer:
+                yield text
+        finally:
+            stop_event.set()
+            worker.join()
+        
+        if 'error' in result:
+            raise result['error']
+        usage['completion_tokens'] = result['outputs'].shape[1] - inputs.shape[1]
+    
+    def _stream_llama_response(self, message, context, usage, conversation_id=None, params=None):
+        """Streaming de tokens usando Llama (llama.cpp com stream=True)"""
+        params = params or self.sampling_params()
+        prompt = self._build_llama_prompt(message, context)
+        usage['prompt_tokens'] = len(self._llama_tokenize(prompt))
+        self._restore_llama_prefix(conversation_id, prompt)
+        
+        completion = self.model(
+            prompt,
+            max_tokens=params['max_tokens'],
+            temperature=params['temperature'],
+            top_p=params['top_p'],
+            stop=["<|eot_id|>"],
+            echo=False,
+            stream=True
+        )
+        try:
+            for chunk in completion:
+                # Cada chunk do llama.cpp corresponde a um token amostrado
+                usage['completion_tokens'] += 1
+                yield chunk['choices'][0]['text']
+        finally:
+            completion.close()
+        self._save_llama_prefix(conversation_id)
+    
+    def _stream_demo_response(self, message, context, usage, params=None):
+        """Streaming de demonstração, palavra por palavra"""
+        response_text = self._generate_demo_response(message, context)['response']
+        words = response_text.split()
+        usage['prompt_tokens'] = len(message.split())
+        for word in words:
+            usage['completion_tokens'] += 1
+            yield word + ' '
+
+def start_model_loading(service):
+    """Carrega o modelo conforme AI_LOAD_MODE
+    
+    ``background`` (padrão) carrega em uma thread enquanto o servidor já
+    responde; ``sync`` bloqueia até terminar; ``lazy`` só carrega na primeira
+    requisição de IA (útil em testes e comandos de linha de comando).
+    """
+    mode = os.getenv('AI_LOAD_MODE', 'background').lower()
+    if mode == 'sync':
+        service.load()
+    elif mode != 'lazy':
+        service.start_loading()
 
-# Instância global do serviço
+# Instância global do serviço (o modelo é carregado por start_model_loading)
 ai_service = AIService()
 
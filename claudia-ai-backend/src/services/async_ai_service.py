@@ -0,0 +1,160 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Marcador de fim para iteração de geradores síncronos no executor
+_EXHAUSTED = object()
+
+
+class AsyncAIService:
+    """Variante assíncrona do AIService para o modo de serviço ASGI
+
+    Chamadas à OpenAI usam o cliente assíncrono; modelos locais são
+    aguardados via agendador sem ocupar threads; o restante (demo, caches,
+    backends sem agendador) roda em um pool de threads pequeno.
+    """
+
+    def __init__(self, service, max_workers=None, executor=None):
+        self.service = service
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv('AI_ASYNC_WORKERS', 8)),
+            thread_name_prefix='ai-async'
+        )
+        # Variantes assíncronas dos backends do roteador, compartilhando o pool
+        self._routed = {}
+
+    async def run_sync(self, fn, *args):
+        """Executa uma função bloqueante no pool de threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def generate_response(self, message, conversation_id=None, user_id=None, context=None,
+                                timeout=None, use_cache=True, sampling=None):
+        """Gera resposta sem bloquear o event loop"""
+        service = self.service
+        if not service.is_initialized:
+            return service._error_response("Modelo não inicializado")
+
+        cached, cache_state = await self.run_sync(
+            service._check_response_caches, message, context, use_cache, sampling
+        )
+        if cached:
+            return cached
+
+        if service.router:
+            response = await service.router.generate_async(
+                lambda backend: self._for_backend(backend)._generate(
+                    message, context, conversation_id, timeout, sampling
+                )
+            )
+        else:
+            response = await self._generate(message, context, conversation_id, timeout, sampling)
+
+        await self.run_sync(service._store_response_caches, message, cache_state, response)
+        return response
+
+    async def _generate(self, message, context, conversation_id, timeout, sampling=None):
+        """Gera resposta no backend deste serviço, sem consultar caches"""
+        service = self.service
+        if service.scheduler:
+            return await service.scheduler.generate_async(
+                message, context, conversation_id, timeout=timeout, sampling=sampling
+            )
+        if service.model_type == 'openai':
+            return await self._generate_openai_response(message, context, sampling)
+        if service.model_client:
+            return await self.run_sync(
+                service._generate_socket_response, message, context, conversation_id, timeout, sampling
+            )
+        return await self.run_sync(service._generate_direct, message, context, conversation_id, sampling)
+
+    def stream_response(self, message, conversation_id=None, user_id=None, context=None, timeout=None,
+                        sampling=None):
+        """Retorna um gerador assíncrono de chunks
+
+        Com o agendador ativo a requisição é enfileirada imediatamente e pode
+        levantar QueueFullError.
+        """
+        service = self.service
+        if service.router and service.is_initialized:
+            return service.router.stream_async(
+                lambda backend: self._for_backend(backend).stream_response(
+                    message, conversation_id, context=context, timeout=timeout, sampling=sampling
+                )
+            )
+        if service.scheduler and service.is_initialized:
+            return service.scheduler.stream_async(
+                message, context, conversation_id, timeout=timeout, sampling=sampling
+            )
+        if service.model_type == 'openai' and service.is_initialized:
+            return self._stream_openai_response(message, context, sampling)
+        if service.model_client and service.is_initialized:
+            return self._iterate_in_executor(
+                service.model_client.stream(message, context, conversation_id, timeout=timeout, sampling=sampling)
+            )
+        return self._iterate_in_executor(service._stream_direct(message, context, conversation_id, sampling))
+
+    async def _generate_openai_response(self, message, context=None, sampling=None):
+        """Gera resposta usando o cliente assíncrono da OpenAI"""
+        service = self.service
+        try:
+            response = await service.openai_client.achat_completion(
+                **service._build_openai_request(message, context, service.sampling_params(sampling))
+            )
+
+            return {
+                'response': response.choices[0].message.content.strip(),
+                'tokens': response.usage.total_tokens,
+                'model': service.model_name,
+                'timestamp': datetime.utcnow().isoformat(),
+                'status': 'success'
+            }
+        except Exception as e:
+            logger.error(f"Erro OpenAI: {e}")
+            return service._fallback_response(message)
+
+    async def _stream_openai_response(self, message, context=None, sampling=None):
+        """Streaming assíncrono de tokens usando OpenAI"""
+        service = self.service
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+        status = 'success'
+        stream = service.openai_client.astream_chat_completion(
+            stream_options={'include_usage': True},
+            **service._build_openai_request(message, context, service.sampling_params(sampling))
+        )
+        try:
+            async for chunk in stream:
+                service._update_openai_usage(chunk, usage)
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield service._stream_chunk(content, False, service.model_name)
+        except Exception as e:
+            logger.error(f"Erro no streaming (openai): {e}")
+            status = 'error'
+        finally:
+            await stream.aclose()
+
+        yield service._stream_chunk('', True, service.model_name, usage=usage, status=status)
+
+    def _for_backend(self, backend):
+        """Variante assíncrona de um backend do roteador"""
+        if backend not in self._routed:
+            self._routed[backend] = AsyncAIService(backend, executor=self.executor)
+        return self._routed[backend]
+
+    async def _iterate_in_executor(self, stream):
+        """Consome um gerador síncrono no pool de threads, chunk a chunk"""
+        try:
+            while True:
+                chunk = await self.run_sync(next, stream, _EXHAUSTED)
+                if chunk is _EXHAUSTED:
+                    return
+                yield chunk
+        finally:
+            await self.run_sync(stream.close)
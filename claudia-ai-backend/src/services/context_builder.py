@@ -0,0 +1,115 @@
+import os
+import logging
+
+from src.models.user import db
+from src.models.conversation import ConversationSummary, Message
+
+logger = logging.getLogger(__name__)
+
+# Tokens do template de chat por mensagem (cabeçalho de papel e separadores)
+MESSAGE_OVERHEAD_TOKENS = 6
+
+
+class ContextBuilder:
+    """Monta o histórico da conversa dentro de um orçamento de tokens
+
+    As mensagens são incluídas da mais recente para a mais antiga enquanto
+    couberem no orçamento, limitado pela janela do modelo menos o prompt de
+    sistema, a mensagem atual e a resposta. A contagem de cada mensagem é
+    feita com o tokenizador do backend ativo e salva na própria linha
+    (``Message.tokens``/``Message.tokenizer``), sendo refeita só quando o
+    tokenizador muda. Se a conversa tiver um resumo, ele abre o contexto e
+    as mensagens já resumidas ficam de fora.
+    """
+
+    def __init__(self, service, token_budget=None, max_messages=50):
+        self.service = service
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self._system_tokens = (None, 0)
+
+    def count(self, text):
+        """Retorna (tokens, tokenizador) para gravar junto de uma mensagem"""
+        return self.service.count_tokens(text), self.service.get_tokenizer_id()
+
+    def budget(self, message):
+        """Tokens disponíveis para o histórico nesta requisição"""
+        window = self.service.get_context_window()
+        if window is None:
+            return self.token_budget
+        available = window - self.count(message)[0] - 2 * MESSAGE_OVERHEAD_TOKENS
+        if self.service.uses_system_prompt():
+            available -= self._count_system_prompt()
+        if self.token_budget is not None:
+            available = min(available, self.token_budget)
+        return max(available, 0)
+
+    def build(self, conversation_id, message):
+        """Retorna as mensagens recentes da conversa que cabem no orçamento"""
+        if not conversation_id:
+            return None
+
+        budget = self.budget(message)
+        summary = db.session.get(ConversationSummary, conversation_id)
+        summarized_until = summary.summarized_until_id if summary else 0
+        recent_messages = Message.query.filter(
+            Message.conversation_id == conversation_id,
+            Message.id > summarized_until
+        ).order_by(Message.created_at.desc(), Message.id.desc()).limit(self.max_messages).all()
+
+        used = 0
+        recounted = False
+        summary_item = None
+        if summary and summary.content:
+            recounted |= self.ensure_counted(summary)
+            used = summary.tokens + MESSAGE_OVERHEAD_TOKENS
+            summary_item = {"role": "system", "content": f"Resumo da conversa até aqui: {summary.content}"}
+
+        context = []
+        for msg in recent_messages:
+            recounted |= self.ensure_counted(msg)
+            cost = msg.tokens + MESSAGE_OVERHEAD_TOKENS
+            if budget is not None and used + cost > budget:
+                break
+            context.append({"role": msg.role, "content": msg.content})
+            used += cost
+
+        if recounted:
+            self._save_counts()
+        if summary_item:
+            context.append(summary_item)
+        context.reverse()
+        return context
+
+    def ensure_counted(self, row):
+        """Recalcula ``row.tokens`` se foi contado por outro tokenizador; indica se mudou"""
+        tokenizer = self.service.get_tokenizer_id()
+        if row.tokenizer == tokenizer:
+            return False
+        row.tokens = self.service.count_tokens(row.content)
+        row.tokenizer = tokenizer
+        return True
+
+    def _count_system_prompt(self):
+        key = (self.service.get_tokenizer_id(), self.service.system_prompt)
+        if self._system_tokens[0] != key:
+            self._system_tokens = (key, self.service.count_tokens(self.service.system_prompt))
+        return self._system_tokens[1]
+
+    def _save_counts(self):
+        """Persiste as contagens refeitas para que o próximo turno não retokenize"""
+        try:
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Erro ao salvar contagem de tokens: {e}")
+            db.session.rollback()
+
+
+def create_context_builder(service):
+    """Cria o montador de contexto a partir das variáveis de ambiente AI_CONTEXT_*"""
+    budget = os.getenv('AI_CONTEXT_TOKEN_BUDGET')
+    return ContextBuilder(
+        service,
+        token_budget=int(budget) if budget else None,
+        max_messages=int(os.getenv('AI_CONTEXT_MAX_MESSAGES', 50))
+    )
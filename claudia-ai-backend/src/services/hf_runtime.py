@@ -0,0 +1,160 @@
+# Execução do Hugging Face na CPU: precisão, threads, KV cache e compilação
+
+import os
+import logging
+
+from src.services.llama_runtime import allowed_cpus, physical_cores
+
+logger = logging.getLogger(__name__)
+
+DTYPES = ('float32', 'bfloat16', 'int8', 'auto')
+
+
+def bf16_supported():
+    """Indica se a CPU executa bfloat16 de forma nativa pelo oneDNN (AVX512-BF16/AMX)"""
+    try:
+        import torch
+
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def _linearize_conv1d(model):
+    """Troca as Conv1D (GPT-2/DialoGPT) por nn.Linear equivalentes
+
+    A quantização dinâmica só alcança nn.Linear; a Conv1D do transformers é
+    a mesma operação com o peso transposto. Retorna quantas foram trocadas.
+    """
+    import torch
+
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:
+        return 0
+
+    replaced = 0
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if not isinstance(child, Conv1D):
+                continue
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features, device='meta')
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous(), requires_grad=False)
+            linear.bias = torch.nn.Parameter(child.bias.detach(), requires_grad=False)
+            setattr(parent, name, linear)
+            replaced += 1
+    return replaced
+
+
+def _env_flag(name, default='false'):
+    return os.getenv(name, default).lower() == 'true'
+
+
+class HFRuntimeConfig:
+    """Precisão, threads, cache estático e torch.compile do modelo Hugging Face
+
+    ``dtype`` int8 aplica a quantização dinâmica (pesos das camadas lineares
+    em int8, ativações quantizadas a cada chamada) e bfloat16 converte o
+    modelo inteiro; ambos só na CPU. ``auto`` usa bfloat16 quando a CPU tem
+    suporte nativo e float32 caso contrário. O cache estático aloca o KV
+    cache uma vez e o reaproveita entre gerações (formas fixas, o que também
+    favorece o torch.compile); com ele o KV do prompt de sistema não é
+    reaproveitado, pois o generate não aceita os dois juntos.
+    """
+
+    def __init__(self, dtype='float32', num_threads=None, interop_threads=None,
+                 static_cache=False, compile=False, compile_mode='default'):
+        if dtype not in DTYPES:
+            raise ValueError(f"HF_DTYPE inválido: {dtype} (use {', '.join(DTYPES)})")
+        self.requested_dtype = dtype
+        self.dtype = dtype
+        self.num_threads = num_threads or physical_cores(allowed_cpus())
+        self.interop_threads = interop_threads
+        self.static_cache = static_cache
+        self.compile = compile
+        self.compile_mode = compile_mode
+        self.quantized_layers = 0
+
+    @classmethod
+    def from_env(cls):
+        """Cria a configuração a partir das variáveis HF_*"""
+        threads = os.getenv('HF_NUM_THREADS', 'auto').lower()
+        interop = os.getenv('HF_INTEROP_THREADS', '').lower()
+        return cls(
+            dtype=os.getenv('HF_DTYPE', 'float32').lower(),
+            num_threads=None if threads in ('', 'auto') else int(threads),
+            interop_threads=int(interop) if interop not in ('', 'auto') else None,
+            static_cache=_env_flag('HF_STATIC_CACHE'),
+            compile=_env_flag('HF_COMPILE'),
+            compile_mode=os.getenv('HF_COMPILE_MODE', 'default')
+        )
+
+    def apply_threads(self):
+        """Define as threads do PyTorch no processo que vai executar o modelo
+
+        Chamado em cada worker (e não no mestre do preload): o pool de
+        threads não sobrevive ao fork. O número de threads inter-op só pode
+        ser definido antes do primeiro uso; depois disso o pedido é ignorado.
+        """
+        import torch
+
+        torch.set_num_threads(self.num_threads)
+        if self.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError as e:
+                logger.warning(f"HF_INTEROP_THREADS ignorado: {e}")
+        logger.info(f"PyTorch com {torch.get_num_threads()} threads intra-op, "
+                    f"{torch.get_num_interop_threads()} inter-op")
+
+    def prepare(self, model):
+        """Aplica precisão, cache estático e compilação ao modelo carregado; retorna o modelo"""
+        import torch
+
+        model.eval()
+        on_cpu = model.device.type == 'cpu'
+        if self.dtype == 'auto':
+            self.dtype = 'bfloat16' if on_cpu and bf16_supported() else 'float32'
+        if not on_cpu and self.dtype != 'float32':
+            logger.info(f"HF_DTYPE={self.dtype} só se aplica à CPU; mantendo o modelo como está")
+            self.dtype = 'float32'
+
+        if self.dtype == 'bfloat16':
+            model = model.to(torch.bfloat16)
+        elif self.dtype == 'int8':
+            _linearize_conv1d(model)
+            self.quantized_layers = sum(isinstance(m, torch.nn.Linear) for m in model.modules())
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        if self.static_cache:
+            if getattr(model, '_supports_static_cache', getattr(model, '_can_compile_fullgraph', False)):
+                model.generation_config.cache_implementation = 'static'
+            else:
+                logger.warning(f"{type(model).__name__} não suporta cache estático; usando o dinâmico")
+                self.static_cache = False
+
+        if self.compile:
+            if hasattr(torch, 'compile'):
+                # A compilação acontece na primeira chamada (pré-cálculo do prompt de sistema)
+                model.forward = torch.compile(model.forward, mode=self.compile_mode, dynamic=not self.static_cache)
+            else:
+                logger.warning("torch.compile requer PyTorch 2; HF_COMPILE ignorado")
+                self.compile = False
+
+        logger.info(f"Hugging Face em {self.dtype}" +
+                    (f" ({self.quantized_layers} camadas int8)" if self.quantized_layers else '') +
+                    (", cache estático" if self.static_cache else '') +
+                    (", torch.compile" if self.compile else ''))
+        return model
+
+    def to_dict(self):
+        return {
+            'dtype': self.dtype,
+            'requested_dtype': self.requested_dtype,
+            'quantized_layers': self.quantized_layers,
+            'num_threads': self.num_threads,
+            'interop_threads': self.interop_threads,
+            'static_cache': self.static_cache,
+            'compile': self.compile
+        }
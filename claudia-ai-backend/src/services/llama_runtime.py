@@ -0,0 +1,270 @@
+# Parâmetros de execução do llama.cpp ajustados ao host
+
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+import itertools
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cpulist(text):
+    """Converte uma lista de CPUs no formato do kernel ("0-3,8,10-11") em lista de ids"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def allowed_cpus():
+    """CPUs em que o processo pode rodar (respeita taskset/cgroups)"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def numa_nodes():
+    """CPUs de cada nó NUMA ({nó: [cpus]}); vazio se o sistema não expõe a topologia"""
+    nodes = {}
+    for path in glob.glob('/sys/devices/system/node/node[0-9]*/cpulist'):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        with open(path) as f:
+            cpus = parse_cpulist(f.read())
+        if cpus:
+            nodes[node] = cpus
+    return dict(sorted(nodes.items()))
+
+
+def physical_cores(cpus):
+    """Núcleos físicos entre as CPUs dadas (irmãs de hyperthreading contam uma vez)"""
+    cores = set()
+    for cpu in cpus:
+        topology = f'/sys/devices/system/cpu/cpu{cpu}/topology'
+        try:
+            with open(f'{topology}/physical_package_id') as f:
+                package = f.read().strip()
+            with open(f'{topology}/core_id') as f:
+                core = f.read().strip()
+        except OSError:
+            return len(cpus)
+        cores.add((package, core))
+    return len(cores) or len(cpus)
+
+
+def _thread_ids():
+    """Ids (tid) das threads do processo; só a atual se /proc não estiver disponível"""
+    try:
+        return [int(tid) for tid in os.listdir('/proc/self/task')]
+    except OSError:
+        return [0]
+
+
+def _env_int(name, default=None):
+    value = os.getenv(name, '').strip().lower()
+    return default if value in ('', 'auto') else int(value)
+
+
+class LlamaRuntimeConfig:
+    """Contexto, lote, threads, NUMA e afinidade de CPU do llama.cpp
+
+    Sem configuração explícita as threads seguem os núcleos físicos
+    disponíveis: na geração o gargalo é a banda de memória e o
+    hyperthreading não ajuda. Com ``cpus`` (LLAMA_CPU_AFFINITY) o processo
+    inteiro é fixado nessas CPUs antes de criar o contexto, em qualquer modo
+    de carga: as threads de requisição, o agendador e as do llama.cpp.
+    """
+
+    def __init__(self, n_ctx=2048, n_batch=512, n_threads=None, n_threads_batch=None,
+                 max_tokens=500, numa=None, cpus=None, use_mmap=True, use_mlock=False):
+        self.nodes = numa_nodes()
+        self.cpus = cpus or allowed_cpus()
+        self.pinned = bool(cpus)
+        self.physical_cores = physical_cores(self.cpus)
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.n_threads = n_threads or self.physical_cores
+        self.n_threads_batch = n_threads_batch or self.physical_cores
+        self.max_tokens = max_tokens
+        # Em máquinas com mais de um nó, o llama.cpp distribui o trabalho por nó
+        self.numa = len(self.nodes) > 1 if numa is None else numa
+        self.use_mmap = use_mmap
+        self.use_mlock = use_mlock
+
+    @classmethod
+    def from_env(cls):
+        """Cria a configuração a partir das variáveis LLAMA_* ("auto" = detectar)"""
+        numa = os.getenv('LLAMA_NUMA', 'auto').lower()
+        return cls(
+            n_ctx=_env_int('LLAMA_N_CTX', 2048),
+            n_batch=_env_int('LLAMA_N_BATCH', 512),
+            n_threads=_env_int('LLAMA_N_THREADS'),
+            n_threads_batch=_env_int('LLAMA_N_THREADS_BATCH'),
+            max_tokens=_env_int('LLAMA_MAX_TOKENS', 500),
+            numa=None if numa == 'auto' else numa == 'true',
+            cpus=cls.parse_affinity(os.getenv('LLAMA_CPU_AFFINITY', '')),
+            use_mmap=os.getenv('LLAMA_USE_MMAP', 'true').lower() == 'true',
+            use_mlock=os.getenv('LLAMA_USE_MLOCK', 'false').lower() == 'true'
+        )
+
+    @staticmethod
+    def parse_affinity(value):
+        """Lista de CPUs ("0-15,32-47") ou nós NUMA ("node:0", "node:0,1"); vazio = sem fixar"""
+        value = value.strip().lower()
+        if not value:
+            return None
+        if value.startswith('node:'):
+            nodes = numa_nodes()
+            cpus = [cpu for node in parse_cpulist(value[5:]) for cpu in nodes.get(node, [])]
+            if not cpus:
+                raise ValueError(f"Nó NUMA inexistente em LLAMA_CPU_AFFINITY: {value}")
+            return cpus
+        return parse_cpulist(value)
+
+    def apply_affinity(self):
+        """Fixa todas as threads do processo nas CPUs configuradas
+
+        No Linux sched_setaffinity(0) vale só para a thread que chama (a que
+        carrega o modelo, no modo background); as threads já existentes são
+        fixadas uma a uma e as criadas depois, inclusive o pool do llama.cpp,
+        herdam a afinidade de quem as cria.
+        """
+        if not self.pinned:
+            return
+        try:
+            pinned = set()
+            while True:
+                threads = set(_thread_ids()) - pinned
+                if not threads:
+                    break
+                for tid in threads:
+                    try:
+                        os.sched_setaffinity(tid, self.cpus)
+                    except ProcessLookupError:
+                        pass  # thread encerrada entre a listagem e a chamada
+                pinned |= threads
+            logger.info(f"Afinidade do llama.cpp: {len(self.cpus)} CPUs")
+        except (AttributeError, OSError) as e:
+            logger.warning(f"Não foi possível aplicar LLAMA_CPU_AFFINITY: {e}")
+
+    def llama_kwargs(self):
+        """Argumentos de Llama(...) correspondentes a esta configuração"""
+        kwargs = {
+            'n_ctx': self.n_ctx,
+            'n_batch': self.n_batch,
+            'n_threads': self.n_threads,
+            'n_threads_batch': self.n_threads_batch,
+            'use_mmap': self.use_mmap,
+            'use_mlock': self.use_mlock
+        }
+        if self.numa:
+            kwargs['numa'] = True
+        return kwargs
+
+    def to_dict(self):
+        return {
+            **self.llama_kwargs(),
+            'numa': self.numa,
+            'max_tokens': self.max_tokens,
+            'cpus': len(self.cpus),
+            'pinned': self.pinned,
+            'physical_cores': self.physical_cores,
+            'numa_nodes': len(self.nodes)
+        }
+
+
+def _measure(model_path, config, prompt, tokens):
+    """Carrega o modelo com ``config`` e mede tokens/s no prompt (lote) e na geração"""
+    from llama_cpp import Llama
+
+    model = Llama(model_path=model_path, verbose=False, **config.llama_kwargs())
+    try:
+        prompt_tokens = model.tokenize(prompt.encode('utf-8'), special=True)
+        model.reset()
+        started = time.perf_counter()
+        model.eval(prompt_tokens)
+        prompt_rate = len(prompt_tokens) / (time.perf_counter() - started)
+
+        model.reset()
+        generated, first_at = 0, None
+        for _ in model(prompt, max_tokens=tokens, temperature=0.0, stream=True):
+            generated += 1
+            if first_at is None:
+                first_at = time.perf_counter()
+        elapsed = time.perf_counter() - first_at if first_at else 0
+        # O primeiro token inclui a avaliação do prompt: a taxa conta a partir dele
+        generation_rate = (generated - 1) / elapsed if generated > 1 and elapsed else 0.0
+        return prompt_rate, generation_rate
+    finally:
+        del model
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+
+def autotune(argv=None):
+    """python -m src.services.llama_runtime --threads 8,16,32 --batch 256,512
+
+    Carrega o modelo de LLAMA_MODEL_PATH com cada combinação e informa
+    tokens/s na avaliação do prompt e na geração, sugerindo as variáveis da
+    mais rápida. Com mmap, recarregar o mesmo GGUF sai do page cache.
+    """
+    detected = LlamaRuntimeConfig.from_env()
+    cores = detected.physical_cores
+    default_threads = sorted({max(1, cores // 4), max(1, cores // 2), cores, len(detected.cpus)})
+
+    parser = argparse.ArgumentParser(description='Ajuste de threads e lote do llama.cpp (tokens/s)')
+    parser.add_argument('--model-path', default=os.getenv('LLAMA_MODEL_PATH', './models/llama-3.3-70b-instruct'))
+    parser.add_argument('--threads', type=_int_list, default=default_threads,
+                        help='valores de n_threads (geração), separados por vírgula')
+    parser.add_argument('--threads-batch', type=_int_list, default=None,
+                        help='valores de n_threads_batch (padrão: os mesmos de --threads)')
+    parser.add_argument('--batch', type=_int_list, default=[256, 512, 1024], help='valores de n_batch')
+    parser.add_argument('--ctx', type=int, default=detected.n_ctx)
+    parser.add_argument('--tokens', type=int, default=64, help='tokens gerados por medição')
+    parser.add_argument('--prompt-words', type=int, default=300, help='tamanho do prompt de teste')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model_path):
+        parser.error(f"modelo não encontrado: {args.model_path}")
+    prompt = ' '.join(['Olá, tudo bem? Conte uma história curta sobre o mar.'] * max(1, args.prompt_words // 9))
+    print(f"{detected.physical_cores} núcleos físicos, {len(detected.cpus)} CPUs, "
+          f"{len(detected.nodes) or 1} nó(s) NUMA; modelo {args.model_path}")
+    print(f"{'n_threads':>9} {'n_threads_batch':>15} {'n_batch':>7} {'prompt tok/s':>13} {'geração tok/s':>14}")
+
+    results = []
+    for threads, threads_batch, batch in itertools.product(
+        args.threads, args.threads_batch or args.threads, args.batch
+    ):
+        config = LlamaRuntimeConfig(
+            n_ctx=args.ctx, n_batch=batch, n_threads=threads, n_threads_batch=threads_batch,
+            numa=detected.numa, cpus=detected.cpus if detected.pinned else None,
+            use_mmap=detected.use_mmap, use_mlock=detected.use_mlock
+        )
+        try:
+            prompt_rate, generation_rate = _measure(args.model_path, config, prompt, args.tokens)
+        except Exception as e:
+            print(f"{threads:>9} {threads_batch:>15} {batch:>7}  falhou: {e}")
+            continue
+        results.append((generation_rate, prompt_rate, threads, threads_batch, batch))
+        print(f"{threads:>9} {threads_batch:>15} {batch:>7} {prompt_rate:>13.1f} {generation_rate:>14.2f}")
+
+    if not results:
+        return 1
+    # A geração domina a latência percebida; o prompt desempata
+    generation_rate, prompt_rate, threads, threads_batch, batch = max(results)
+    print(f"\nMais rápida: LLAMA_N_THREADS={threads} LLAMA_N_THREADS_BATCH={threads_batch} "
+          f"LLAMA_N_BATCH={batch}  ({generation_rate:.2f} tok/s na geração, {prompt_rate:.1f} no prompt)")
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(autotune())
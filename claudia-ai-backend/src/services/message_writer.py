@@ -0,0 +1,332 @@
+import os
+import glob
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import Counter, deque
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from src.models.user import db
+from src.models.conversation import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+
+def message_row(conversation_id, role, content, tokens=0, tokenizer=None, metadata_dict=None):
+    """Linha da tabela messages pronta para inserção em lote
+
+    O created_at é fixado aqui, no momento da requisição, e não na gravação,
+    para que a ordem cronológica se mantenha com a escrita adiada.
+    """
+    return {
+        'conversation_id': conversation_id,
+        'role': role,
+        'content': content,
+        'created_at': datetime.utcnow(),
+        'tokens': tokens,
+        'tokenizer': tokenizer,
+        'metadata_json': metadata_dict or {}
+    }
+
+
+def insert_messages(rows):
+    """Insere as linhas em uma única transação (no contexto do app atual)
+
+    Na mesma transação, o updated_at das conversas afetadas avança: a listagem
+    ordena por atividade e os ETags de leitura dependem dele.
+    """
+    db.session.execute(insert(Message), rows)
+    db.session.execute(
+        update(Conversation)
+        .where(Conversation.id.in_(sorted({row['conversation_id'] for row in rows})))
+        .values(updated_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+class MessageWriter:
+    """Gravação adiada (write-behind) das mensagens em transações em lote
+
+    As linhas enfileiradas são gravadas por uma thread dedicada quando o lote
+    atinge ``batch_size`` linhas ou após ``flush_interval`` segundos. Se o
+    lote falhar repetidamente, as linhas são gravadas uma a uma: as que o
+    banco recusa vão para ``<spill>.failed.jsonl`` e não bloqueiam as demais.
+    Se nenhuma puder ser gravada (banco indisponível), ou no encerramento do
+    processo, elas vão para um arquivo JSONL reaplicado na próxima
+    inicialização por um único processo (o que conseguir reivindicá-lo).
+    """
+
+    def __init__(self, app, batch_size=100, flush_interval=0.05, max_queue_size=10000,
+                 spill_path='src/database/pending_messages.jsonl', max_attempts=3):
+        self.app = app
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.spill_path = spill_path
+        self.max_attempts = max_attempts
+
+        self._queue = deque()
+        self._queued_rows = 0
+        self._cond = threading.Condition()
+        self._unflushed = Counter()  # conversation_id -> linhas ainda não gravadas
+        self._closed = False
+        self._stats = {
+            'enqueued_rows': 0,
+            'flushed_rows': 0,
+            'batches': 0,
+            'retries': 0,
+            'spilled_rows': 0,
+            'failed_rows': 0,
+            'rejected': 0
+        }
+
+        self._replay_spill()
+        self._worker = threading.Thread(target=self._run, name='message-writer', daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def enqueue(self, rows, on_flush=None):
+        """Enfileira as linhas; retorna False se a fila está cheia (gravar de forma síncrona)
+
+        ``on_flush`` é chamado na thread de gravação, no contexto do app, após o commit.
+        """
+        with self._cond:
+            if self._closed or self._queued_rows + len(rows) > self.max_queue_size:
+                self._stats['rejected'] += 1
+                return False
+            self._queue.append((rows, on_flush))
+            self._queued_rows += len(rows)
+            self._stats['enqueued_rows'] += len(rows)
+            for row in rows:
+                self._unflushed[row['conversation_id']] += 1
+            # Acordar a thread no primeiro item (gatilho por tempo) ou com o lote cheio
+            if len(self._queue) == 1 or self._queued_rows >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def wait_for(self, conversation_id, timeout=2.0):
+        """Aguarda a gravação das linhas pendentes da conversa (leitura das próprias escritas)"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._unflushed[conversation_id], timeout)
+
+    def close(self, timeout=10.0):
+        """Grava o que estiver na fila e encerra a thread de gravação"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout)
+        with self._cond:
+            leftover = [row for rows, _ in self._queue for row in rows]
+            self._queue.clear()
+        if leftover:
+            self._spill(leftover)
+
+    def get_stats(self):
+        """Retorna métricas da fila de gravação"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queued_rows'] = self._queued_rows
+        stats['avg_batch_rows'] = (
+            round(stats['flushed_rows'] / stats['batches'], 2) if stats['batches'] else 0
+        )
+        stats['batch_size'] = self.batch_size
+        stats['flush_interval_ms'] = round(self.flush_interval * 1000)
+        return stats
+
+    # Internos
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # Gatilho por tempo: aguardar o lote encher até o intervalo
+                deadline = time.monotonic() + self.flush_interval
+                while self._queued_rows < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = []
+                batch_rows = 0
+                while self._queue and batch_rows < self.batch_size:
+                    rows, on_flush = self._queue.popleft()
+                    batch.append((rows, on_flush))
+                    batch_rows += len(rows)
+                self._queued_rows -= batch_rows
+            self._flush(batch)
+
+    def _flush(self, batch):
+        rows = [row for entry_rows, _ in batch for row in entry_rows]
+        try:
+            for attempt in range(self.max_attempts):
+                try:
+                    with self.app.app_context():
+                        insert_messages(rows)
+                        self._count('batches')
+                        self._count('flushed_rows', len(rows))
+                        for _, on_flush in batch:
+                            if on_flush:
+                                self._notify(on_flush)
+                    return
+                except Exception as e:
+                    logger.error(f"Erro ao gravar lote de mensagens (tentativa {attempt + 1}): {e}")
+                    with self.app.app_context():
+                        db.session.rollback()
+                    self._count('retries')
+                    time.sleep(0.1 * 2 ** attempt)
+            failed = self._insert_one_by_one(rows)
+            failed_ids = {id(row) for row in failed}
+            for entry_rows, on_flush in batch:
+                if on_flush and any(id(row) not in failed_ids for row in entry_rows):
+                    with self.app.app_context():
+                        self._notify(on_flush)
+            self._set_aside(failed, len(rows))
+        finally:
+            with self._cond:
+                for row in rows:
+                    self._unflushed[row['conversation_id']] -= 1
+                    if not self._unflushed[row['conversation_id']]:
+                        del self._unflushed[row['conversation_id']]
+                self._cond.notify_all()
+
+    def _insert_one_by_one(self, rows):
+        """Grava cada linha em sua própria transação; retorna as que falharam"""
+        failed = []
+        for row in rows:
+            try:
+                with self.app.app_context():
+                    insert_messages([row])
+                self._count('flushed_rows')
+            except Exception as e:
+                logger.error(f"Erro ao gravar mensagem da conversa {row['conversation_id']}: {e}")
+                with self.app.app_context():
+                    db.session.rollback()
+                failed.append(row)
+        return failed
+
+    def _set_aside(self, failed, total):
+        """Destino das linhas que falharam na gravação individual"""
+        if not failed:
+            return
+        if len(failed) == total:
+            # Nenhuma linha entrou: banco indisponível, tentar de novo na próxima inicialização
+            self._spill(failed)
+        else:
+            # As demais foram gravadas: estas o banco recusa e não devem voltar à fila
+            root, ext = os.path.splitext(self.spill_path)
+            self._spill(failed, f'{root}.failed{ext}', 'failed_rows')
+
+    def _notify(self, on_flush):
+        try:
+            on_flush()
+        except Exception as e:
+            logger.warning(f"Falha no callback pós-gravação: {e}")
+
+    def _spill(self, rows, path=None, stat='spilled_rows'):
+        """Salva em arquivo as linhas que não puderam ser gravadas no banco"""
+        path = path or self.spill_path
+        spill_dir = os.path.dirname(path)
+        if spill_dir and not os.path.exists(spill_dir):
+            os.makedirs(spill_dir, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(dict(row, created_at=row['created_at'].isoformat()),
+                                   ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._count(stat, len(rows))
+        if stat == 'spilled_rows':
+            logger.warning(f"{len(rows)} mensagens salvas em {path} para regravação")
+        else:
+            logger.error(f"{len(rows)} mensagens recusadas pelo banco salvas em {path}")
+
+    def _claim_spills(self):
+        """Reivindica os arquivos pendentes renomeando-os para um nome deste processo
+
+        Com vários workers, cada um tenta o rename: só um consegue e os demais
+        seguem sem regravar. Reivindicações de processos que morreram no meio
+        da regravação também são retomadas.
+        """
+        claimed = []
+        candidates = [self.spill_path]
+        for path in glob.glob(glob.escape(self.spill_path) + '.*.replay'):
+            pid = path[len(self.spill_path) + 1:-len('.replay')]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                candidates.append(path)
+        for index, path in enumerate(candidates):
+            target = f'{self.spill_path}.{os.getpid()}.replay' + (f'.{index}' if index else '')
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue
+            claimed.append(target)
+        return claimed
+
+    def _replay_spill(self):
+        """Regrava as mensagens deixadas no arquivo por uma execução anterior"""
+        for path in self._claim_spills():
+            self._replay_file(path)
+
+    def _replay_file(self, path):
+        rows = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # Linha parcial de uma escrita interrompida
+                    continue
+                row['created_at'] = datetime.fromisoformat(row['created_at'])
+                rows.append(row)
+        if rows:
+            try:
+                with self.app.app_context():
+                    insert_messages(rows)
+                failed = []
+            except Exception as e:
+                logger.error(f"Erro ao regravar mensagens pendentes em lote: {e}")
+                with self.app.app_context():
+                    db.session.rollback()
+                failed = self._insert_one_by_one(rows)
+                self._set_aside(failed, len(rows))
+            logger.info(f"{len(rows) - len(failed)} mensagens pendentes regravadas de {self.spill_path}")
+        os.remove(path)
+
+    def _count(self, key, amount=1):
+        with self._cond:
+            self._stats[key] += amount
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def create_message_writer(app):
+    """Cria a gravação adiada se AI_PERSISTENCE_MODE=write_behind (padrão: sync)"""
+    if os.getenv('AI_PERSISTENCE_MODE', 'sync').lower() != 'write_behind':
+        return None
+
+    writer = MessageWriter(
+        app,
+        batch_size=int(os.getenv('AI_WRITE_BATCH_SIZE', 100)),
+        flush_interval=float(os.getenv('AI_WRITE_FLUSH_MS', 50)) / 1000,
+        max_queue_size=int(os.getenv('AI_WRITE_MAX_QUEUE', 10000)),
+        spill_path=os.getenv('AI_WRITE_SPILL_PATH', 'src/database/pending_messages.jsonl')
+    )
+    logger.info(f"Gravação adiada de mensagens ativa (lote {writer.batch_size})")
+    return writer
@@ -0,0 +1,365 @@
+# Servidor de modelo compartilhado pelos workers via socket Unix
+#
+# Um único processo carrega o modelo; os workers (AI_MODEL_SOCKET) enviam
+# as requisições como JSON, uma por linha, e recebem a resposta ou os chunks
+# do streaming no mesmo formato.
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+
+from src.services.scheduler import DeadlineExceededError, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = '/tmp/claudia-ai-model.sock'
+
+# Erros do servidor que viram as mesmas exceções do agendador no cliente
+_ERRORS = {'queue_full': QueueFullError, 'deadline': DeadlineExceededError}
+
+
+def _encode(payload):
+    return json.dumps(payload, default=str).encode('utf-8') + b'\n'
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Atende uma conexão; cada linha recebida é uma requisição"""
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    self._send({'error': 'invalid', 'message': 'JSON inválido'})
+                    continue
+                self.server.dispatch(request, self._send)
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente desconectado (ex.: stream interrompido): nada a responder
+            pass
+
+    def _send(self, payload):
+        self.wfile.write(_encode(payload))
+        self.wfile.flush()
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Expõe um AIService aos workers; o agendador do serviço serializa o acesso ao modelo
+
+    Operações: ``info``, ``count_tokens``, ``generate`` e ``stream``. No
+    streaming, a primeira linha confirma que a requisição entrou na fila e as
+    seguintes trazem os chunks até o final; se o cliente desconectar, a
+    geração é interrompida.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service, path=DEFAULT_SOCKET_PATH):
+        self.service = service
+        self.path = path
+        _remove_stale_socket(path)
+        super().__init__(path, _RequestHandler)
+        # Só o usuário (e o grupo) do servidor conversam com o modelo
+        os.chmod(path, 0o660)
+
+    def info(self):
+        service = self.service
+        return {
+            'readiness': service.get_readiness(),
+            'model': service.get_model_info(),
+            'context_window': service.get_context_window(),
+            'uses_system_prompt': service.uses_system_prompt(),
+            'tokenizer_id': service.get_tokenizer_id(),
+            'pid': os.getpid()
+        }
+
+    def dispatch(self, request, send):
+        service = self.service
+        op = request.get('op')
+        try:
+            if op == 'info':
+                send(self.info())
+            elif op == 'count_tokens':
+                send({'tokens': service.count_tokens(request.get('text', ''))})
+            elif op in ('generate', 'stream') and not service.is_initialized:
+                send({'error': 'loading', 'message': f'modelo {service.state}'})
+            elif op == 'generate':
+                send({'response': service.generate_response(
+                    request['message'], request.get('conversation_id'), context=request.get('context'),
+                    timeout=request.get('timeout'), use_cache=False, sampling=request.get('sampling')
+                )})
+            elif op == 'stream':
+                stream = service.stream_response(
+                    request['message'], request.get('conversation_id'), context=request.get('context'),
+                    timeout=request.get('timeout'), sampling=request.get('sampling')
+                )
+                try:
+                    send({'ok': True})
+                    for chunk in stream:
+                        send({'chunk': chunk})
+                finally:
+                    stream.close()
+            else:
+                send({'error': 'invalid', 'message': f'operação desconhecida: {op!r}'})
+        except QueueFullError as e:
+            send({'error': 'queue_full', 'message': str(e)})
+        except DeadlineExceededError as e:
+            send({'error': 'deadline', 'message': str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            raise
+        except Exception as e:
+            logger.error(f"Erro no servidor de modelo ({op}): {e}")
+            send({'error': 'internal', 'message': str(e)})
+
+
+def _remove_stale_socket(path):
+    """Remove o socket deixado por um servidor encerrado; falha se outro ainda atende nele"""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"Já existe um servidor de modelo em {path}")
+
+
+class _Connection:
+    def __init__(self, path, timeout):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rwb')
+
+    def send(self, request):
+        self.file.write(_encode(request))
+        self.file.flush()
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Servidor de modelo fechou a conexão")
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.file.close()
+        except OSError:
+            # Conexão já rompida: o flush do que restou no buffer falha
+            pass
+        finally:
+            self.sock.close()
+
+
+class ModelServerClient:
+    """Cliente do servidor de modelo, com conexões reaproveitadas entre requisições
+
+    Uma conexão ociosa pode ter sido fechada por um reinício do servidor: se
+    ela for fechada ou rompida antes de qualquer resposta, a requisição é
+    reenviada uma única vez em uma conexão nova. Timeouts nunca são
+    reenviados, pois a requisição pode já estar sendo processada.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET_PATH, timeout=300.0, max_idle=8):
+        self.path = path
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.info = None
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'streams': 0, 'errors': 0, 'connections': 0}
+
+    def wait_until_ready(self, timeout=600.0, interval=0.5):
+        """Aguarda o servidor subir e terminar de carregar o modelo; retorna o ``info``"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                info = self.get_info()
+                if info['readiness']['state'] in ('ready', 'failed'):
+                    return info
+                reason = f"modelo {info['readiness']['state']}"
+            except OSError as e:
+                reason = str(e)
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Servidor de modelo em {self.path} indisponível: {reason}")
+            time.sleep(interval)
+
+    def get_info(self):
+        self.info = self._call({'op': 'info'})
+        return self.info
+
+    def count_tokens(self, text):
+        return self._call({'op': 'count_tokens', 'text': text})['tokens']
+
+    def generate(self, message, context=None, conversation_id=None, timeout=None, sampling=None):
+        """Gera a resposta no servidor (pode levantar QueueFullError/DeadlineExceededError)"""
+        return self._call({'op': 'generate', 'message': message, 'context': context,
+                           'conversation_id': conversation_id, 'timeout': timeout,
+                           'sampling': sampling})['response']
+
+    def stream(self, message, context=None, conversation_id=None, timeout=None, sampling=None):
+        """Enfileira o streaming no servidor e retorna o iterador de chunks
+
+        A requisição é confirmada antes do retorno, então QueueFullError é
+        levantada aqui, como no agendador local. Fechar o iterador fecha a
+        conexão e interrompe a geração no servidor.
+        """
+        conn, _ = self._request({'op': 'stream', 'message': message, 'context': context,
+                                 'conversation_id': conversation_id, 'timeout': timeout,
+                                 'sampling': sampling}, stream=True)
+        return self._iterate(conn)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle_connections'] = len(self._idle)
+        stats['path'] = self.path
+        stats['server_pid'] = self.info['pid'] if self.info else None
+        return stats
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    # Internos
+
+    def _call(self, request):
+        conn, reply = self._request(request)
+        self._release(conn)
+        return reply
+
+    def _request(self, request, stream=False):
+        """Envia a requisição e lê a primeira resposta; retorna a conexão ainda em uso"""
+        self._count('streams' if stream else 'requests')
+        conn, reused = self._acquire()
+        try:
+            reply = self._exchange(conn, request)
+        except ConnectionError:
+            # Conexão ociosa fechada pelo servidor (reinício) antes de qualquer resposta:
+            # as demais ociosas também estão mortas, reenviar uma única vez em uma nova
+            if not reused:
+                self._count('errors')
+                raise
+            self.close()
+            conn = self._connect()
+            try:
+                reply = self._exchange(conn, request)
+            except (OSError, ValueError):
+                self._count('errors')
+                raise
+        except (OSError, ValueError):
+            # Timeout e respostas inválidas não são reenviados: o servidor pode estar gerando
+            self._count('errors')
+            raise
+        try:
+            return conn, self._check(reply)
+        except Exception:
+            self._release(conn)
+            raise
+
+    def _iterate(self, conn):
+        finished = False
+        try:
+            while not finished:
+                chunk = self._check(conn.receive())['chunk']
+                finished = chunk.get('is_final', False)
+                yield chunk
+        finally:
+            if finished:
+                self._release(conn)
+            else:
+                conn.close()
+
+    def _check(self, reply):
+        error = reply.get('error')
+        if error:
+            self._count('errors')
+            raise _ERRORS.get(error, RuntimeError)(reply.get('message') or error)
+        return reply
+
+    def _exchange(self, conn, request):
+        try:
+            conn.send(request)
+            return conn.receive()
+        except (OSError, ValueError):
+            conn.close()
+            raise
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _connect(self):
+        self._count('connections')
+        return _Connection(self.path, self.timeout)
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+def create_model_client():
+    """Cria o cliente do servidor de modelo a partir de AI_MODEL_SOCKET"""
+    return ModelServerClient(
+        path=os.getenv('AI_MODEL_SOCKET') or DEFAULT_SOCKET_PATH,
+        timeout=float(os.getenv('AI_MODEL_SERVER_TIMEOUT', 300)),
+        max_idle=int(os.getenv('AI_MODEL_SERVER_MAX_IDLE', 8))
+    )
+
+
+def main():
+    """python -m src.services.model_server [--socket CAMINHO]"""
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description='Servidor de modelo compartilhado pelos workers')
+    parser.add_argument('--socket', help=f'caminho do socket (padrão: AI_MODEL_SOCKET ou {DEFAULT_SOCKET_PATH})')
+    args = parser.parse_args()
+
+    load_dotenv()
+    # AI_MODEL_SOCKET configura os workers; este processo usa o backend de AI_MODEL_TYPE
+    path = args.socket or os.getenv('AI_MODEL_SOCKET') or DEFAULT_SOCKET_PATH
+    os.environ.pop('AI_MODEL_SOCKET', None)
+    logging.basicConfig(
+        level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    from src.services.ai_service import ai_service
+
+    server = ModelServer(ai_service, path)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"Servidor de modelo ouvindo em {path}")
+    ai_service.start_loading()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
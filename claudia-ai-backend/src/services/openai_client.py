@@ -0,0 +1,221 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIClient:
+    """Cliente OpenAI gerenciado: pool de conexões com keep-alive, timeouts,
+    retentativas com backoff e limite de concorrência
+
+    As retentativas (429, 5xx, falhas de conexão e timeout) são feitas aqui e não
+    pelo SDK, para aplicar jitter completo, respeitar Retry-After e contabilizar
+    métricas. Há um cliente síncrono e um assíncrono (criado no primeiro uso,
+    dentro do event loop do servidor ASGI).
+    """
+
+    def __init__(self, api_key, base_url=None, timeout=30.0, connect_timeout=5.0,
+                 max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0, max_concurrency=16):
+        import httpx
+        import openai
+
+        self._openai = openai
+        self._httpx = httpx
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            timeout=self.timeout,
+            http_client=openai.DefaultHttpxClient(limits=self.limits, timeout=self.timeout)
+        )
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_client = None
+        self._async_semaphore = None
+
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'errors': 0, 'in_flight': 0}
+
+    @classmethod
+    def from_env(cls, api_key):
+        """Cria o cliente a partir das variáveis de ambiente OPENAI_*"""
+        return cls(
+            api_key=api_key,
+            base_url=os.getenv('OPENAI_BASE_URL') or None,
+            timeout=float(os.getenv('OPENAI_TIMEOUT', 30)),
+            connect_timeout=float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5)),
+            max_connections=int(os.getenv('OPENAI_MAX_CONNECTIONS', 20)),
+            max_keepalive_connections=int(os.getenv('OPENAI_MAX_KEEPALIVE', 10)),
+            keepalive_expiry=float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 30)),
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 3)),
+            backoff_base=float(os.getenv('OPENAI_BACKOFF_BASE', 0.5)),
+            backoff_max=float(os.getenv('OPENAI_BACKOFF_MAX', 8)),
+            max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', 16))
+        )
+
+    # API síncrona
+
+    def chat_completion(self, **kwargs):
+        """Cria uma chat completion, com retentativas"""
+        with self._semaphore:
+            self._track_in_flight(1)
+            try:
+                return self._with_retries(lambda: self.client.chat.completions.create(**kwargs))
+            finally:
+                self._track_in_flight(-1)
+
+    def stream_chat_completion(self, **kwargs):
+        """Itera os chunks de uma chat completion em streaming
+
+        Só a abertura do stream é retentada; a vaga de concorrência fica ocupada
+        até o stream ser consumido ou fechado.
+        """
+        with self._semaphore:
+            self._track_in_flight(1)
+            stream = None
+            try:
+                stream = self._with_retries(
+                    lambda: self.client.chat.completions.create(stream=True, **kwargs)
+                )
+                for chunk in stream:
+                    yield chunk
+            finally:
+                if stream is not None:
+                    stream.close()
+                self._track_in_flight(-1)
+
+    # API assíncrona
+
+    async def achat_completion(self, **kwargs):
+        """Versão assíncrona de chat_completion"""
+        client, semaphore = self._get_async_client()
+        async with semaphore:
+            self._track_in_flight(1)
+            try:
+                return await self._with_retries_async(
+                    lambda: client.chat.completions.create(**kwargs)
+                )
+            finally:
+                self._track_in_flight(-1)
+
+    async def astream_chat_completion(self, **kwargs):
+        """Versão assíncrona de stream_chat_completion"""
+        client, semaphore = self._get_async_client()
+        async with semaphore:
+            self._track_in_flight(1)
+            stream = None
+            try:
+                stream = await self._with_retries_async(
+                    lambda: client.chat.completions.create(stream=True, **kwargs)
+                )
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                if stream is not None:
+                    await stream.close()
+                self._track_in_flight(-1)
+
+    def get_stats(self):
+        """Retorna métricas do cliente"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['max_concurrency'] = self.max_concurrency
+        stats['max_connections'] = self.limits.max_connections
+        return stats
+
+    def close(self):
+        self.client.close()
+
+    # Internos
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            self._async_client = self._openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                timeout=self.timeout,
+                http_client=self._openai.DefaultAsyncHttpxClient(limits=self.limits, timeout=self.timeout)
+            )
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_client, self._async_semaphore
+
+    def _with_retries(self, call):
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                return call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._count('errors')
+                    raise
+                attempt += 1
+                self._count('retries')
+                logger.warning(f"OpenAI: tentativa {attempt} falhou ({e}); nova tentativa em {delay:.2f}s")
+                time.sleep(delay)
+
+    async def _with_retries_async(self, call):
+        attempt = 0
+        while True:
+            self._count('requests')
+            try:
+                return await call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._count('errors')
+                    raise
+                attempt += 1
+                self._count('retries')
+                logger.warning(f"OpenAI: tentativa {attempt} falhou ({e}); nova tentativa em {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error, attempt):
+        """Calcula a espera antes da próxima tentativa, ou None se não deve retentar"""
+        openai = self._openai
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            retry_after = None
+        elif isinstance(error, openai.APIStatusError) and (
+            error.status_code == 429 or error.status_code >= 500
+        ):
+            retry_after = error.response.headers.get('retry-after')
+        else:
+            return None
+
+        # Backoff exponencial com jitter completo; Retry-After tem precedência
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        try:
+            if retry_after is not None:
+                delay = min(float(retry_after), self.backoff_max)
+        except ValueError:
+            pass
+        return delay
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _track_in_flight(self, delta):
+        with self._lock:
+            self._stats['in_flight'] += delta
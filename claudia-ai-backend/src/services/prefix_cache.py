@@ -0,0 +1,83 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixStateCache:
+    """Cache LRU de estados do llama.cpp por conversa
+
+    Guarda o estado (KV cache + tokens) já avaliado de cada conversa para que o
+    próximo turno avalie apenas o sufixo novo do prompt. A remoção segue a ordem
+    LRU respeitando um número máximo de entradas e um orçamento de memória.
+    """
+
+    def __init__(self, max_entries=16, max_bytes=2 * 1024 ** 3):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'reused_tokens': 0
+        }
+
+    def get(self, key):
+        """Retorna o estado salvo para a chave, ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, state, size):
+        """Armazena o estado da chave, removendo os menos usados se preciso"""
+        if size > self.max_bytes:
+            logger.warning(f"Estado de {size} bytes excede o orçamento do cache de prefixo")
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (state, size)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self._stats['evictions'] += 1
+
+    def discard(self, key):
+        """Remove o estado de uma chave (ex.: conversa apagada)"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[1]
+
+    def clear(self):
+        """Remove todos os estados armazenados"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def record(self, hit, reused_tokens=0):
+        """Contabiliza um acerto ou erro do cache"""
+        with self._lock:
+            self._stats['hits' if hit else 'misses'] += 1
+            self._stats['reused_tokens'] += reused_tokens
+
+    def get_stats(self):
+        """Retorna métricas do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._total_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """Armazenamento LRU em memória do processo"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """Armazenamento em arquivo SQLite, compartilhado entre processos e reinícios
+
+    A conexão é aberta no primeiro uso e pertence ao processo que a abriu:
+    uma conexão SQLite não pode atravessar um fork, então um worker criado
+    a partir do mestre (AI_LOAD_MODE=preload) abre a sua própria.
+    """
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._inherited = []
+        db_dir = os.path.dirname(path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+    def _connection(self):
+        """Conexão deste processo (chamado com o lock adquirido)"""
+        if self._pid != os.getpid():
+            # A conexão herdada do processo pai não é usada nem fechada aqui: fechá-la
+            # no filho mexeria nos arquivos e travas que ainda são do pai
+            if self._conn is not None:
+                self._inherited.append(self._conn)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._pid = os.getpid()
+            with self._conn:
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS response_cache ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                    'expires_at REAL, last_access REAL NOT NULL)'
+                )
+                self._conn.execute(
+                    'CREATE INDEX IF NOT EXISTS ix_response_cache_last_access '
+                    'ON response_cache (last_access)'
+                )
+        return self._conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connection() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] and row[1] < now:
+                conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                return None
+            conn.execute(
+                'UPDATE response_cache SET last_access = ? WHERE key = ?', (now, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock, self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now + ttl if ttl else None, now)
+            )
+            # Limite de tamanho: descartar expirados e os acessados há mais tempo
+            conn.execute(
+                'DELETE FROM response_cache WHERE expires_at IS NOT NULL AND expires_at < ?', (now,)
+            )
+            conn.execute(
+                'DELETE FROM response_cache WHERE key IN ('
+                'SELECT key FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock, self._connection() as conn:
+            conn.execute('DELETE FROM response_cache')
+
+    def size(self):
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+
+class ResponseCache:
+    """Cache de respostas completas indexado por modelo, mensagem normalizada,
+    contexto e parâmetros de amostragem"""
+
+    def __init__(self, backend, ttl=3600, max_temperature=0.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0}
+
+    @staticmethod
+    def normalize_message(message):
+        """Normaliza a mensagem para que variações triviais caiam na mesma chave"""
+        text = unicodedata.normalize('NFKC', message).casefold()
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text.rstrip(' .!?…')
+
+    def make_key(self, model, message, context, params):
+        """Calcula a chave do cache"""
+        payload = json.dumps({
+            'model': model,
+            'message': self.normalize_message(message),
+            'context': hashlib.sha256(
+                json.dumps(context or [], sort_keys=True, ensure_ascii=False).encode('utf-8')
+            ).hexdigest(),
+            'params': params
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_cacheable(self, params):
+        """Amostragem acima da temperatura configurada não é reaproveitada"""
+        return params.get('temperature', 0) <= self.max_temperature
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Erro ao ler cache de respostas: {e}")
+            value = None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+            self._count('stores')
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache de respostas: {e}")
+
+    def record_bypass(self):
+        self._count('bypassed')
+
+    def clear(self):
+        self.backend.clear()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self):
+        """Retorna métricas do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats['backend'] = type(self.backend).__name__
+        try:
+            stats['entries'] = self.backend.size()
+        except Exception:
+            stats['entries'] = None
+        return stats
+
+
+def create_response_cache():
+    """Cria o cache de respostas a partir das variáveis de ambiente (opt-in)"""
+    if os.getenv('AI_RESPONSE_CACHE_ENABLED', 'false').lower() != 'true':
+        return None
+
+    backend_name = os.getenv('AI_RESPONSE_CACHE_BACKEND', 'memory')
+    max_entries = int(os.getenv('AI_RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    if backend_name == 'sqlite':
+        backend = SQLiteCacheBackend(
+            os.getenv('AI_RESPONSE_CACHE_PATH', 'src/database/response_cache.db'),
+            max_entries=max_entries
+        )
+    else:
+        backend = MemoryCacheBackend(max_entries=max_entries)
+
+    logger.info(f"Cache de respostas ativo ({backend_name})")
+    return ResponseCache(
+        backend,
+        ttl=int(os.getenv('AI_RESPONSE_CACHE_TTL', 3600)),
+        max_temperature=float(os.getenv('AI_RESPONSE_CACHE_MAX_TEMPERATURE', 0.0))
+    )
@@ -0,0 +1,494 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from src.services.scheduler import QueueFullError, DeadlineExceededError
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (segundos) dos intervalos do histograma de latência
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class CircuitBreaker:
+    """Disjuntor de um backend
+
+    Abre após ``failure_threshold`` falhas consecutivas; depois de
+    ``reset_timeout`` segundos libera uma única requisição de teste (half-open),
+    que fecha o disjuntor se tiver sucesso ou o reabre se falhar.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+
+    def available(self):
+        """Indica se o backend pode receber requisições agora (sem efeitos colaterais)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.reset_timeout
+        return not self._probing
+
+    def acquire(self):
+        """Reserva a passagem de uma requisição; em half-open apenas uma por vez"""
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == self.CLOSED
+
+    def release(self):
+        """Libera a requisição de teste sem resultado (ex.: fila cheia, cancelamento)"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"Disjuntor aberto após {self.failures} falha(s)")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class LatencyHistogram:
+    """Histograma cumulativo de latências com intervalos fixos"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Estimativa do quantil: limite superior do intervalo que o contém"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self._counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return '+Inf'
+
+    def to_dict(self):
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self._counts):
+            cumulative += count
+            buckets.append({'le': bound, 'count': cumulative})
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': buckets
+        }
+
+
+class _Backend:
+    """Estado do roteador para um backend"""
+
+    def __init__(self, name, service, breaker, priority):
+        self.name = name
+        self.service = service
+        self.breaker = breaker
+        self.priority = priority
+        self.ewma = None
+        self.in_flight = 0
+        self.histogram = LatencyHistogram()
+        self.stats = {'routed': 0, 'succeeded': 0, 'failed': 0, 'rejected': 0, 'cancelled': 0}
+
+    def capacity(self):
+        """Quantas requisições o backend atende em paralelo"""
+        service = self.service
+        if service.scheduler:
+            return service.scheduler.max_batch_size if service.scheduler.batch_generate_fn else 1
+        if service.openai_client:
+            return service.openai_client.max_concurrency
+        return 1
+
+
+class ModelRouter:
+    """Roteador entre vários backends inicializados ao mesmo tempo
+
+    Cada requisição vai para o backend com menor tempo estimado de resposta,
+    calculado a partir da latência média móvel (EWMA) e da carga atual
+    (requisições em andamento divididas pela capacidade paralela). Backends com
+    o disjuntor aberto ficam de fora; falhas e filas cheias passam a requisição
+    para o próximo candidato. O backend ``fallback`` (modo demonstração) só é
+    usado quando todos os demais falharam.
+    """
+
+    def __init__(self, backends, fallback=None, failure_threshold=3, reset_timeout=30.0,
+                 ewma_alpha=0.3, initial_latency=1.0, history=20):
+        self.ewma_alpha = ewma_alpha
+        self.initial_latency = initial_latency
+        self.backends = [
+            _Backend(name, service, CircuitBreaker(failure_threshold, reset_timeout), priority)
+            for priority, (name, service) in enumerate(backends.items())
+        ]
+        self.fallback = _Backend('fallback', fallback, CircuitBreaker(), len(backends)) if fallback else None
+
+        self._lock = threading.Lock()
+        self._decisions = deque(maxlen=history)
+        self._stats = {'requests': 0, 'failovers': 0, 'fallbacks': 0}
+
+    # API síncrona
+
+    def generate(self, call):
+        """Executa ``call(service)`` no melhor backend, com failover
+
+        Levanta QueueFullError se algum backend estava apenas ocupado e nenhum
+        conseguiu atender; DeadlineExceededError é repassada sem failover.
+        """
+        decision, candidates = self._plan()
+        rejected = False
+        for backend in candidates:
+            if backend is self.fallback and rejected:
+                break
+            if not self._acquire(backend, decision):
+                continue
+            started = time.monotonic()
+            try:
+                response = call(backend.service)
+            except QueueFullError:
+                self._finish(backend, started, 'rejected', decision)
+                rejected = True
+                continue
+            except DeadlineExceededError:
+                self._finish(backend, started, 'failed', decision)
+                raise
+            except Exception as e:
+                logger.error(f"Erro no backend {backend.name}: {e}")
+                self._finish(backend, started, 'failed', decision)
+                continue
+            if backend is not self.fallback and response.get('status') == 'error':
+                self._finish(backend, started, 'failed', decision)
+                continue
+            self._finish(backend, started, 'succeeded', decision)
+            return dict(response, backend=backend.name)
+        raise QueueFullError("Todos os backends estão ocupados")
+
+    def stream(self, open_stream):
+        """Abre ``open_stream(service)`` no melhor backend e retorna o iterador de chunks
+
+        A abertura é imediata (QueueFullError antes da resposta começar). Se um
+        backend falhar antes de emitir o primeiro chunk, o próximo é tentado.
+        """
+        decision, candidates = self._plan()
+        remaining = iter(candidates)
+        attempt = self._open_stream(remaining, open_stream, decision)
+        return _RoutedStream(self, attempt, decision, self._relay(attempt, remaining, open_stream, decision))
+
+    # API assíncrona
+
+    async def generate_async(self, call):
+        """Versão assíncrona de generate: ``call(service)`` retorna um awaitable"""
+        decision, candidates = self._plan()
+        rejected = False
+        for backend in candidates:
+            if backend is self.fallback and rejected:
+                break
+            if not self._acquire(backend, decision):
+                continue
+            started = time.monotonic()
+            try:
+                response = await call(backend.service)
+            except QueueFullError:
+                self._finish(backend, started, 'rejected', decision)
+                rejected = True
+                continue
+            except DeadlineExceededError:
+                self._finish(backend, started, 'failed', decision)
+                raise
+            except Exception as e:
+                logger.error(f"Erro no backend {backend.name}: {e}")
+                self._finish(backend, started, 'failed', decision)
+                continue
+            if backend is not self.fallback and response.get('status') == 'error':
+                self._finish(backend, started, 'failed', decision)
+                continue
+            self._finish(backend, started, 'succeeded', decision)
+            return dict(response, backend=backend.name)
+        raise QueueFullError("Todos os backends estão ocupados")
+
+    def stream_async(self, open_stream):
+        """Versão assíncrona de stream: ``open_stream(service)`` retorna um iterador assíncrono"""
+        decision, candidates = self._plan()
+        remaining = iter(candidates)
+        attempt = self._open_stream(remaining, open_stream, decision)
+        return _AsyncRoutedStream(
+            self, attempt, decision, self._relay_async(attempt, remaining, open_stream, decision)
+        )
+
+    def get_stats(self):
+        """Retorna o estado de cada backend e as decisões de roteamento recentes"""
+        with self._lock:
+            backends = []
+            for backend in self.backends + ([self.fallback] if self.fallback else []):
+                backends.append({
+                    'name': backend.name,
+                    'model_type': backend.service.model_type,
+                    'model_name': backend.service.model_name,
+                    'circuit': backend.breaker.state,
+                    'circuit_trips': backend.breaker.trips,
+                    'in_flight': backend.in_flight,
+                    'capacity': backend.capacity(),
+                    'ewma_latency': round(backend.ewma, 3) if backend.ewma is not None else None,
+                    'estimated_wait': round(self._score(backend), 3),
+                    'latency': backend.histogram.to_dict(),
+                    **backend.stats
+                })
+            stats = dict(self._stats)
+            stats['backends'] = backends
+            stats['recent_decisions'] = [dict(decision) for decision in self._decisions]
+        return stats
+
+    # Internos
+
+    def _score(self, backend):
+        """Tempo estimado de resposta: latência típica escalada pela fila à frente"""
+        latency = backend.ewma if backend.ewma is not None else self.initial_latency
+        return latency * (1 + backend.in_flight / backend.capacity())
+
+    def _plan(self):
+        """Ordena os backends disponíveis pelo tempo estimado de resposta"""
+        with self._lock:
+            available = [backend for backend in self.backends if backend.breaker.available()]
+            ranked = sorted(available, key=lambda backend: (self._score(backend), backend.priority))
+            decision = {
+                'timestamp': datetime.utcnow().isoformat(),
+                'ranking': [[backend.name, round(self._score(backend), 3)] for backend in ranked],
+                'skipped': [backend.name for backend in self.backends if backend not in available],
+                'attempts': [],
+                'backend': None,
+                'outcome': None
+            }
+            self._decisions.append(decision)
+            self._stats['requests'] += 1
+        if self.fallback:
+            ranked.append(self.fallback)
+        return decision, ranked
+
+    def _acquire(self, backend, decision):
+        with self._lock:
+            if not backend.breaker.acquire():
+                return False
+            backend.in_flight += 1
+            backend.stats['routed'] += 1
+            decision['attempts'].append(backend.name)
+            if len(decision['attempts']) == 2:
+                self._stats['failovers'] += 1
+            if backend is self.fallback:
+                self._stats['fallbacks'] += 1
+        return True
+
+    def _finish(self, backend, started, outcome, decision):
+        latency = time.monotonic() - started
+        with self._lock:
+            backend.in_flight -= 1
+            backend.stats[outcome] += 1
+            if outcome == 'succeeded':
+                backend.breaker.record_success()
+                backend.histogram.observe(latency)
+                if backend.ewma is None:
+                    backend.ewma = latency
+                else:
+                    backend.ewma += self.ewma_alpha * (latency - backend.ewma)
+            elif outcome == 'failed':
+                backend.breaker.record_failure()
+            else:
+                backend.breaker.release()
+            if outcome != 'rejected':
+                decision['backend'] = backend.name
+                decision['outcome'] = outcome
+
+    def _open_stream(self, candidates, open_stream, decision, attempt=None):
+        """Abre o stream no primeiro candidato que aceitar a requisição
+
+        Retorna (ou atualiza) a tentativa em andamento: backend, início e
+        stream, este último None depois que a vaga do backend foi liberada.
+        """
+        rejected = False
+        for backend in candidates:
+            if backend is self.fallback and rejected:
+                break
+            if not self._acquire(backend, decision):
+                continue
+            started = time.monotonic()
+            try:
+                stream = open_stream(backend.service)
+            except QueueFullError:
+                self._finish(backend, started, 'rejected', decision)
+                rejected = True
+            except Exception as e:
+                logger.error(f"Erro ao abrir streaming no backend {backend.name}: {e}")
+                self._finish(backend, started, 'failed', decision)
+            else:
+                attempt = attempt if attempt is not None else {}
+                attempt.update(backend=backend, started=started, stream=stream)
+                return attempt
+        raise QueueFullError("Todos os backends estão ocupados")
+
+    def _stream_failed_early(self, backend, chunk):
+        """Um chunk final com erro antes de qualquer texto: vale tentar outro backend"""
+        return backend is not self.fallback and chunk.get('is_final') and chunk.get('status') == 'error'
+
+    def _relay(self, attempt, candidates, open_stream, decision):
+        while True:
+            backend, stream = attempt['backend'], attempt['stream']
+            emitted = False
+            outcome = 'cancelled'
+            try:
+                for chunk in stream:
+                    if not emitted and self._stream_failed_early(backend, chunk):
+                        outcome = 'failed'
+                        break
+                    emitted = True
+                    if chunk.get('is_final'):
+                        outcome = 'failed' if chunk.get('status') == 'error' else 'succeeded'
+                        chunk = dict(chunk, backend=backend.name)
+                    yield chunk
+            except Exception:
+                outcome = 'failed'
+                raise
+            finally:
+                self._close_attempt(attempt, outcome, decision)
+            if emitted or outcome != 'failed':
+                return
+            self._open_stream(candidates, open_stream, decision, attempt)
+
+    async def _relay_async(self, attempt, candidates, open_stream, decision):
+        while True:
+            backend, stream = attempt['backend'], attempt['stream']
+            emitted = False
+            outcome = 'cancelled'
+            try:
+                async for chunk in stream:
+                    if not emitted and self._stream_failed_early(backend, chunk):
+                        outcome = 'failed'
+                        break
+                    emitted = True
+                    if chunk.get('is_final'):
+                        outcome = 'failed' if chunk.get('status') == 'error' else 'succeeded'
+                        chunk = dict(chunk, backend=backend.name)
+                    yield chunk
+            except Exception:
+                outcome = 'failed'
+                raise
+            finally:
+                await self._aclose_attempt(attempt, outcome, decision)
+            if emitted or outcome != 'failed':
+                return
+            self._open_stream(candidates, open_stream, decision, attempt)
+
+    def _close_attempt(self, attempt, outcome, decision):
+        """Fecha o stream da tentativa e libera a vaga (e a sonda half-open) uma única vez"""
+        stream, attempt['stream'] = attempt['stream'], None
+        if stream is None:
+            return
+        try:
+            stream.close()
+        finally:
+            self._finish(attempt['backend'], attempt['started'], outcome, decision)
+
+    async def _aclose_attempt(self, attempt, outcome, decision):
+        stream, attempt['stream'] = attempt['stream'], None
+        if stream is None:
+            return
+        try:
+            await stream.aclose()
+        finally:
+            self._finish(attempt['backend'], attempt['started'], outcome, decision)
+
+
+class _RoutedStream:
+    """Iterador de um stream roteado
+
+    Fechar libera a vaga do backend e a sonda half-open mesmo que o stream
+    nunca tenha sido iterado: o ``finally`` de um gerador que não começou não
+    executa, e o backend ficaria com a vaga (e o disjuntor com a sonda) presa.
+    """
+
+    def __init__(self, router, attempt, decision, chunks):
+        self._router = router
+        self._attempt = attempt
+        self._decision = decision
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        try:
+            self._chunks.close()
+        finally:
+            self._router._close_attempt(self._attempt, 'cancelled', self._decision)
+
+
+class _AsyncRoutedStream:
+    """Versão assíncrona de _RoutedStream (``aclose`` sempre libera a vaga)"""
+
+    def __init__(self, router, attempt, decision, chunks):
+        self._router = router
+        self._attempt = attempt
+        self._decision = decision
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self._chunks.__anext__()
+
+    async def aclose(self):
+        try:
+            await self._chunks.aclose()
+        finally:
+            await self._router._aclose_attempt(self._attempt, 'cancelled', self._decision)
+
+def create_model_router(backends, fallback=None):
+    """Cria o roteador a partir das variáveis de ambiente AI_ROUTER_*"""
+    return ModelRouter(
+        backends,
+        fallback=fallback,
+        failure_threshold=int(os.getenv('AI_ROUTER_FAILURE_THRESHOLD', 3)),
+        reset_timeout=float(os.getenv('AI_ROUTER_RESET_TIMEOUT', 30)),
+        ewma_alpha=float(os.getenv('AI_ROUTER_EWMA_ALPHA', 0.3)),
+        initial_latency=float(os.getenv('AI_ROUTER_INITIAL_LATENCY', 1.0))
+    )
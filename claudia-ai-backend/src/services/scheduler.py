@@ -0,0 +1,370 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Marcador de fim do stream na fila de saída de um job
+_END_OF_STREAM = object()
+
+
+class SchedulerError(Exception):
+    """Erro base do agendador de inferência"""
+
+
+class QueueFullError(SchedulerError):
+    """Fila de inferência cheia (backpressure -> HTTP 429)"""
+
+
+class DeadlineExceededError(SchedulerError):
+    """Requisição excedeu o prazo antes de ser atendida"""
+
+
+class _Job:
+    """Requisição enfileirada no agendador"""
+
+    def __init__(self, kind, message, context, conversation_id, timeout, listener=None, sampling=None):
+        self.kind = kind  # 'generate' ou 'stream'
+        self.message = message
+        self.context = context
+        self.conversation_id = conversation_id
+        # Sobrescritas de max_tokens/temperature; jobs com elas não entram em lotes
+        self.sampling = sampling
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + timeout
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.output = queue.Queue() if kind == 'stream' else None
+        # Callback sem argumentos chamado (na thread do worker) a cada novidade
+        self.listener = listener
+
+    def remaining(self):
+        return max(self.deadline - time.monotonic(), 0)
+
+    def expired(self):
+        return self.cancelled or time.monotonic() > self.deadline
+
+    def emit(self, item):
+        self.output.put(item)
+        self._notify()
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        if self.output is not None:
+            self.output.put(error if error else _END_OF_STREAM)
+        self.done.set()
+        self._notify()
+
+    def _notify(self):
+        if self.listener:
+            try:
+                self.listener()
+            except Exception as e:
+                logger.warning(f"Falha ao notificar consumidor: {e}")
+
+
+class _JobStream:
+    """Iterador dos chunks de um job de streaming
+
+    Fechar o iterador cancela o job mesmo que ele nunca tenha sido iterado
+    (cliente desconectado antes do primeiro chunk): o ``finally`` de um
+    gerador que não começou não executa, e o job ocuparia o worker até o fim.
+    """
+
+    def __init__(self, job, chunks):
+        self.job = job
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        self.job.cancelled = True
+        self._chunks.close()
+
+    def __del__(self):
+        self.job.cancelled = True
+
+
+class _AsyncJobStream:
+    """Versão assíncrona de _JobStream (``aclose`` sempre cancela o job)"""
+
+    def __init__(self, job, chunks):
+        self.job = job
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        return self._chunks.__anext__()
+
+    async def aclose(self):
+        self.job.cancelled = True
+        await self._chunks.aclose()
+
+    def __del__(self):
+        self.job.cancelled = True
+
+
+class InferenceScheduler:
+    """Agendador que serializa o acesso ao modelo em uma thread dedicada
+
+    As chamadas de geração são enfileiradas e atendidas pela thread worker, que é
+    a única a tocar no modelo. Requisições de geração que chegam juntas são
+    agrupadas em lotes dinâmicos quando o backend oferece ``batch_generate_fn``.
+    """
+
+    def __init__(self, generate_fn, stream_fn, batch_generate_fn=None,
+                 max_batch_size=4, max_queue_size=32, default_timeout=120.0,
+                 batch_wait=0.01, name='ai-scheduler'):
+        self.generate_fn = generate_fn
+        self.stream_fn = stream_fn
+        self.batch_generate_fn = batch_generate_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_queue_size = max(1, max_queue_size)
+        self.default_timeout = default_timeout
+        self.batch_wait = batch_wait
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._stats = {
+            'processed': 0,
+            'rejected': 0,
+            'timed_out': 0,
+            'batches': 0,
+            'batched_requests': 0
+        }
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    # API usada pelo AIService
+
+    def generate(self, message, context=None, conversation_id=None, timeout=None, sampling=None):
+        """Enfileira uma geração e bloqueia até o resultado ou o prazo"""
+        job = self._submit('generate', message, context, conversation_id, timeout, sampling=sampling)
+        if not job.done.wait(job.remaining()):
+            job.cancelled = True
+            self._count('timed_out')
+            raise DeadlineExceededError("Tempo limite da requisição excedido")
+        if job.error:
+            raise job.error
+        return job.result
+
+    def stream(self, message, context=None, conversation_id=None, timeout=None, sampling=None):
+        """Enfileira uma geração em streaming e retorna o iterador de chunks
+
+        A submissão é imediata (para que a fila cheia possa virar 429 antes da
+        resposta começar); o prazo vale até o início da geração.
+        """
+        job = self._submit('stream', message, context, conversation_id, timeout, sampling=sampling)
+        return _JobStream(job, self._relay(job))
+
+    async def generate_async(self, message, context=None, conversation_id=None, timeout=None,
+                             sampling=None):
+        """Versão assíncrona de generate: aguarda o resultado sem ocupar uma thread"""
+        wakeup = asyncio.Event()
+        job = self._submit(
+            'generate', message, context, conversation_id, timeout,
+            listener=self._wakeup_listener(wakeup), sampling=sampling
+        )
+        try:
+            await asyncio.wait_for(wakeup.wait(), job.remaining())
+        except asyncio.TimeoutError:
+            job.cancelled = True
+            self._count('timed_out')
+            raise DeadlineExceededError("Tempo limite da requisição excedido")
+        if job.error:
+            raise job.error
+        return job.result
+
+    def stream_async(self, message, context=None, conversation_id=None, timeout=None, sampling=None):
+        """Versão assíncrona de stream: retorna um gerador assíncrono de chunks"""
+        wakeup = asyncio.Event()
+        job = self._submit(
+            'stream', message, context, conversation_id, timeout,
+            listener=self._wakeup_listener(wakeup), sampling=sampling
+        )
+        return _AsyncJobStream(job, self._relay_async(job, wakeup))
+
+    def get_stats(self):
+        """Retorna métricas da fila e dos lotes"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['queue_depth'] = len(self._pending)
+        stats['max_queue_size'] = self.max_queue_size
+        stats['max_batch_size'] = self.max_batch_size
+        stats['avg_batch_size'] = (
+            round(stats['batched_requests'] / stats['batches'], 2) if stats['batches'] else 0
+        )
+        return stats
+
+    # Internos
+
+    def _submit(self, kind, message, context, conversation_id, timeout, listener=None, sampling=None):
+        job = _Job(
+            kind, message, context, conversation_id, timeout or self.default_timeout, listener, sampling
+        )
+        with self._cond:
+            if len(self._pending) >= self.max_queue_size:
+                self._stats['rejected'] += 1
+                raise QueueFullError("Fila de inferência cheia")
+            self._pending.append(job)
+            self._cond.notify()
+        return job
+
+    def _relay(self, job):
+        try:
+            started = False
+            while True:
+                try:
+                    item = job.output.get(timeout=None if started else job.remaining() or 0.001)
+                except queue.Empty:
+                    job.cancelled = True
+                    self._count('timed_out')
+                    raise DeadlineExceededError("Tempo limite da requisição excedido")
+                started = True
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consumidor encerrou (fim ou desconexão): sinalizar ao worker
+            job.cancelled = True
+
+    async def _relay_async(self, job, wakeup):
+        try:
+            started = False
+            while True:
+                try:
+                    item = job.output.get_nowait()
+                except queue.Empty:
+                    wakeup.clear()
+                    # Um item pode ter chegado entre o get e o clear
+                    if not job.output.empty():
+                        continue
+                    try:
+                        await asyncio.wait_for(
+                            wakeup.wait(), None if started else job.remaining() or 0.001
+                        )
+                    except asyncio.TimeoutError:
+                        job.cancelled = True
+                        self._count('timed_out')
+                        raise DeadlineExceededError("Tempo limite da requisição excedido")
+                    continue
+                started = True
+                if item is _END_OF_STREAM:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            job.cancelled = True
+
+    @staticmethod
+    def _wakeup_listener(wakeup):
+        """Cria um callback que acorda o event loop atual a partir do worker"""
+        loop = asyncio.get_running_loop()
+
+        def notify():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(wakeup.set)
+        return notify
+
+    def _count(self, key, amount=1):
+        with self._cond:
+            self._stats[key] += amount
+
+    def _next_batch(self):
+        """Retira da fila o próximo job e, se possível, outros para o mesmo lote"""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            first = self._pending.popleft()
+            if not self._batchable(first) or not self.batch_generate_fn or self.max_batch_size == 1:
+                return [first]
+
+            # Aguardar brevemente por requisições concorrentes para formar o lote
+            wait_until = time.monotonic() + self.batch_wait
+            while len(self._pending) < self.max_batch_size - 1:
+                remaining = wait_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = [first]
+            kept = deque()
+            while self._pending and len(batch) < self.max_batch_size:
+                job = self._pending.popleft()
+                (batch if self._batchable(job) else kept).append(job)
+            kept.extend(self._pending)
+            self._pending = kept
+            return batch
+
+    @staticmethod
+    def _batchable(job):
+        """O lote usa a amostragem padrão: só entram gerações sem sobrescritas"""
+        return job.kind == 'generate' and not job.sampling
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            live = []
+            for job in batch:
+                if job.expired():
+                    job.finish(error=DeadlineExceededError("Tempo limite da requisição excedido"))
+                else:
+                    live.append(job)
+            if not live:
+                continue
+
+            try:
+                if live[0].kind == 'stream':
+                    self._run_stream(live[0])
+                elif len(live) > 1:
+                    self._run_batch(live)
+                else:
+                    job = live[0]
+                    job.finish(result=self.generate_fn(
+                        job.message, job.context, job.conversation_id, job.sampling
+                    ))
+            except Exception as e:
+                logger.error(f"Erro no worker de inferência: {e}")
+                for job in live:
+                    if not job.done.is_set():
+                        job.finish(error=e)
+            self._count('processed', len(live))
+
+    def _run_batch(self, jobs):
+        self._count('batches')
+        self._count('batched_requests', len(jobs))
+        try:
+            results = self.batch_generate_fn([(job.message, job.context) for job in jobs])
+        except Exception as e:
+            logger.error(f"Erro na geração em lote, processando individualmente: {e}")
+            results = [self.generate_fn(job.message, job.context, job.conversation_id) for job in jobs]
+        for job, result in zip(jobs, results):
+            job.finish(result=result)
+
+    def _run_stream(self, job):
+        stream = self.stream_fn(job.message, job.context, job.conversation_id, job.sampling)
+        try:
+            for chunk in stream:
+                if job.cancelled:
+                    logger.info("Streaming cancelado pelo cliente")
+                    break
+                job.emit(chunk)
+        finally:
+            stream.close()
+        job.finish()
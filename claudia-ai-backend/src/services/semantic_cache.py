@@ -0,0 +1,447 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SentenceTransformerEmbedder:
+    """Gera embeddings normalizados na CPU com sentence-transformers"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self._model = SentenceTransformer(model_name, device='cpu')
+        self._lock = threading.Lock()
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, text):
+        with self._lock:
+            vector = self._model.encode(text, normalize_embeddings=True)
+        return np.asarray(vector, dtype=np.float32)
+
+
+class VectorIndex:
+    """Vetores normalizados em arquivos mapeados em memória, compartilhados entre processos
+
+    Cada vetor ocupa uma posição fixa (``capacity`` posições, reaproveitadas
+    em anel) e ``seqs`` guarda o número de sequência da entrada gravada ali
+    (0 = vazia). A busca é exata (força bruta com NumPy) até ``ann_threshold``
+    vetores; acima disso um índice IVF (k-means + listas invertidas),
+    persistido em ``<path>.ivf.npz``, restringe os candidatos. Posições
+    gravadas depois da construção do IVF são sempre examinadas.
+    """
+
+    def __init__(self, path, dim, capacity, ann_threshold=5000, nprobe=8):
+        self.path = path
+        self.dim = dim
+        self.capacity = max(1, capacity)
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        # Arquivos esparsos: só as posições gravadas ocupam disco
+        self._vectors = self._open(path, np.float32, (self.capacity, dim))
+        self._seqs = self._open(f"{path}.seqs", np.int64, (self.capacity,))
+        self._ivf_path = f"{path}.ivf.npz"
+        self._ivf_stamp = None
+        self._centroids = None
+        self._lists = None
+        self._ivf_seq = 0
+        self._load_ivf()
+
+    def __len__(self):
+        return int(np.count_nonzero(self._seqs))
+
+    def seq_at(self, slot):
+        return int(self._seqs[slot])
+
+    def write(self, slot, seq, vector):
+        """Grava o vetor da entrada ``seq`` na posição (com o lock entre processos)
+
+        A posição fica marcada como vazia durante a escrita: quem ler o vetor
+        pela metade encontra um ``seq`` diferente do esperado e o descarta.
+        """
+        self._seqs[slot] = 0
+        self._vectors[slot] = vector
+        self._seqs[slot] = seq
+        self._vectors.flush()
+        self._seqs.flush()
+
+    def clear(self, slots):
+        self._seqs[slots] = 0
+        self._seqs.flush()
+
+    def search(self, vector, k=8, allowed=None):
+        """Retorna as posições e similaridades (cosseno) dos k vizinhos mais próximos
+
+        ``allowed`` restringe a busca a essas posições antes do corte em k.
+        """
+        self._load_ivf()
+        seqs = np.asarray(self._seqs)
+        if self._centroids is not None:
+            centroid_scores = self._centroids @ vector
+            probes = np.argsort(-centroid_scores)[:self.nprobe]
+            members = np.concatenate([self._lists[i] for i in probes])
+            # Posições regravadas após a construção saem das listas e entram na cauda
+            members = members[(seqs[members] > 0) & (seqs[members] <= self._ivf_seq)]
+            candidates = np.concatenate([members, np.flatnonzero(seqs > self._ivf_seq)])
+        else:
+            candidates = np.flatnonzero(seqs)
+        if allowed is not None:
+            candidates = candidates[np.isin(candidates, allowed)]
+        if not len(candidates):
+            return [], []
+
+        scores = self._vectors[candidates] @ vector
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top].tolist(), scores[top].tolist()
+
+    def maybe_rebuild(self, last_seq):
+        """Reconstrói o IVF quando a cauda fora dele dobra (com o lock entre processos)"""
+        self._load_ivf()
+        live = len(self)
+        if live < self.ann_threshold:
+            return
+        indexed = int(np.count_nonzero((self._seqs > 0) & (self._seqs <= self._ivf_seq)))
+        if indexed and live - indexed < indexed:
+            return
+        self._build_ivf(last_seq)
+
+    def reset(self):
+        self._seqs[:] = 0
+        self._seqs.flush()
+        if os.path.exists(self._ivf_path):
+            os.remove(self._ivf_path)
+        self._centroids = self._lists = None
+        self._ivf_seq = 0
+        self._ivf_stamp = None
+
+    def _open(self, path, dtype, shape):
+        expected = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        mode = 'r+' if os.path.exists(path) and os.path.getsize(path) == expected else 'w+'
+        return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def _build_ivf(self, last_seq, iterations=8):
+        """Agrupa os vetores com k-means esférico para a busca aproximada"""
+        slots = np.flatnonzero(self._seqs)
+        data = np.asarray(self._vectors[slots])
+        n_lists = max(1, int(np.sqrt(len(slots))))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(slots), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = data[assignments == i]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1)
+        assignments = np.argmax(data @ centroids.T, axis=1)
+
+        # Gravação atômica: os outros processos recarregam ao ver o arquivo novo
+        tmp_path = f"{self._ivf_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=centroids, slots=slots, assignments=assignments, seq=last_seq)
+        os.replace(tmp_path, self._ivf_path)
+        self._ivf_stamp = None
+        self._load_ivf()
+        logger.info(f"Índice IVF do cache semântico reconstruído ({len(slots)} vetores, {n_lists} listas)")
+
+    def _load_ivf(self):
+        """Carrega o IVF persistido se ele mudou desde a última leitura"""
+        try:
+            stat = os.stat(self._ivf_path)
+        except FileNotFoundError:
+            self._centroids = self._lists = None
+            self._ivf_seq = 0
+            self._ivf_stamp = None
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._ivf_stamp:
+            return
+        with np.load(self._ivf_path) as data:
+            centroids, slots, assignments = data['centroids'], data['slots'], data['assignments']
+            self._ivf_seq = int(data['seq'])
+        self._centroids = centroids
+        self._lists = [slots[assignments == i] for i in range(len(centroids))]
+        self._ivf_stamp = stamp
+
+
+class SemanticCache:
+    """Cache de respostas por similaridade semântica da mensagem
+
+    Cada entrada guarda um escopo (modelo, prompt de sistema, contexto e
+    parâmetros) para que uma resposta só seja reaproveitada nas mesmas condições.
+
+    Os arquivos são compartilhados pelos workers: as gravações acontecem sob
+    um lock de arquivo (``<path>.lock``) e cada processo acompanha as
+    entradas dos demais pelo JSONL, só de acréscimo. As entradas expiram
+    após ``ttl`` segundos e, cheio o cache, a mais antiga dá lugar à nova
+    (as posições dos vetores são reaproveitadas em anel).
+
+    Como no cache exato, só respostas com temperatura até ``max_temperature``
+    são reaproveitadas: por padrão, só as determinísticas.
+    """
+
+    def __init__(self, embedder, path, threshold=0.92, max_entries=50000, ann_threshold=5000, ttl=86400,
+                 max_temperature=0.0):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'expired': 0}
+
+        db_dir = os.path.dirname(path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        self._entries_path = f"{path}.jsonl"
+        self._meta_path = f"{path}.meta.json"
+        self._lock_file = open(f"{path}.lock", 'a')
+        vectors_path = f"{path}.vectors"
+
+        self._entries = {}  # posição -> entrada
+        self._scopes = {}  # escopo -> posições das entradas
+        self._last_seq = 0
+        self._lines = 0
+        self._offset = 0
+        self._inode = None
+        with self._file_lock():
+            self._check_meta(vectors_path)
+            self.index = VectorIndex(
+                vectors_path, embedder.dim, self.max_entries, ann_threshold=ann_threshold
+            )
+            self._sync()
+
+    @staticmethod
+    def make_scope(model, context, params):
+        """Calcula o escopo em que uma resposta pode ser reaproveitada"""
+        payload = json.dumps(
+            {'model': model, 'context': context or [], 'params': params},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def is_cacheable(self, params):
+        """Amostragem acima da temperatura configurada não é reaproveitada"""
+        return params.get('temperature', 0) <= self.max_temperature
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats['bypassed'] += 1
+
+    def lookup(self, message, scope):
+        """Retorna (resposta, similaridade) do vizinho mais próximo acima do limiar"""
+        vector = self.embedder.encode(message)
+        with self._lock:
+            self._sync()
+            # Filtro de escopo antes do corte em k: vizinhos de outros escopos não ocupam as vagas
+            allowed = self._scopes.get(scope)
+            if not allowed:
+                self._stats['misses'] += 1
+                return None, None
+            slots, scores = self.index.search(vector, allowed=np.fromiter(allowed, dtype=np.int64))
+            now = time.time()
+            for slot, score in zip(slots, scores):
+                if score < self.threshold:
+                    break
+                entry = self._entries.get(slot)
+                if entry is None or entry['scope'] != scope:
+                    continue
+                # Posição regravada por outro processo depois da última sincronização
+                if self.index.seq_at(slot) != entry['seq']:
+                    continue
+                if self._expired(entry, now):
+                    self._stats['expired'] += 1
+                    continue
+                self._stats['hits'] += 1
+                return entry['response'], score
+            self._stats['misses'] += 1
+        return None, None
+
+    def add(self, message, scope, response):
+        """Armazena a resposta gerada para a mensagem"""
+        vector = self.embedder.encode(message)
+        with self._lock, self._file_lock():
+            self._sync()
+            seq = self._last_seq + 1
+            slot = (seq - 1) % self.max_entries
+            entry = {
+                'seq': seq,
+                'slot': slot,
+                'created_at': time.time(),
+                'scope': scope,
+                'message': message,
+                'response': response
+            }
+            # O vetor é gravado antes da entrada: vetor sem entrada nunca vira acerto
+            self.index.write(slot, seq, vector)
+            line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+            with open(self._entries_path, 'ab') as f:
+                f.write(line)
+            self._offset += len(line)
+            self._lines += 1
+            self._set_entry(entry)
+            self._last_seq = seq
+            self._stats['stores'] += 1
+
+            self.index.maybe_rebuild(seq)
+            if self._lines > 2 * self.max_entries:
+                self._compact()
+
+    def get_stats(self):
+        """Retorna métricas do cache"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats['threshold'] = self.threshold
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['max_temperature'] = self.max_temperature
+        stats['index'] = 'ivf' if self.index._centroids is not None else 'brute_force'
+        stats['embedding_model'] = self.embedder.model_name
+        return stats
+
+    # Internos
+
+    def _file_lock(self):
+        return _FileLock(self._lock_file)
+
+    def _set_entry(self, entry):
+        """Registra a entrada na sua posição, substituindo a anterior"""
+        slot = entry['slot']
+        previous = self._entries.get(slot)
+        if previous is not None:
+            slots = self._scopes[previous['scope']]
+            slots.discard(slot)
+            if not slots:
+                del self._scopes[previous['scope']]
+        self._entries[slot] = entry
+        self._scopes.setdefault(entry['scope'], set()).add(slot)
+
+    def _expired(self, entry, now):
+        return bool(self.ttl) and now - entry['created_at'] > self.ttl
+
+    def _sync(self):
+        """Lê as entradas acrescentadas por outros processos desde a última leitura"""
+        try:
+            stat = os.stat(self._entries_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            # Arquivo novo (primeira leitura ou compactação): recarregar do início
+            self._entries.clear()
+            self._scopes.clear()
+            self._offset = self._lines = 0
+            self._inode = stat.st_ino if stat else None
+        if stat is None or stat.st_size == self._offset:
+            return
+
+        with open(self._entries_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Só linhas completas: uma escrita em andamento é lida na próxima vez
+        data = data[:data.rfind(b'\n') + 1]
+        self._offset += len(data)
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Linha parcial de uma escrita interrompida
+                continue
+            self._lines += 1
+            current = self._entries.get(entry['slot'])
+            if current is None or current['seq'] < entry['seq']:
+                self._set_entry(entry)
+            self._last_seq = max(self._last_seq, entry['seq'])
+
+    def _compact(self):
+        """Reescreve o JSONL só com as entradas vivas (com o lock entre processos)"""
+        now = time.time()
+        live, expired = [], []
+        for slot, entry in sorted(self._entries.items(), key=lambda item: item[1]['seq']):
+            if self.index.seq_at(slot) != entry['seq']:
+                continue
+            (expired if self._expired(entry, now) else live).append(entry)
+        if expired:
+            self.index.clear([entry['slot'] for entry in expired])
+
+        tmp_path = f"{self._entries_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in live:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self._entries_path)
+        last_seq = self._last_seq
+        self._inode = None
+        self._sync()
+        if live:
+            # A sequência continua de onde estava mesmo que as últimas entradas tenham expirado
+            self._last_seq = max(self._last_seq, last_seq)
+        else:
+            # Nada vivo: a sequência recomeça e o IVF (ligado às sequências antigas) é descartado
+            self.index.reset()
+        logger.info(f"Cache semântico compactado ({len(live)} entradas vivas, {len(expired)} expiradas)")
+
+    def _check_meta(self, vectors_path):
+        """Descarta os arquivos se o modelo de embeddings ou a capacidade mudaram"""
+        expected = {'model': self.embedder.model_name, 'dim': self.embedder.dim, 'max_entries': self.max_entries}
+        try:
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            meta = None
+
+        if meta != expected:
+            for suffix in ('', '.seqs', '.ivf.npz'):
+                stale = vectors_path + suffix
+                if os.path.exists(stale):
+                    os.remove(stale)
+            if os.path.exists(self._entries_path):
+                os.remove(self._entries_path)
+            with open(self._meta_path, 'w') as f:
+                json.dump(expected, f)
+
+
+class _FileLock:
+    """Lock exclusivo entre processos sobre um arquivo aberto (flock)"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def __enter__(self):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+
+def create_semantic_cache():
+    """Cria o cache semântico a partir das variáveis de ambiente (opt-in)"""
+    if os.getenv('AI_SEMANTIC_CACHE_ENABLED', 'false').lower() != 'true':
+        return None
+
+    embedder = SentenceTransformerEmbedder(
+        os.getenv('AI_SEMANTIC_CACHE_MODEL', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+    )
+    cache = SemanticCache(
+        embedder,
+        os.getenv('AI_SEMANTIC_CACHE_PATH', 'src/database/semantic_cache'),
+        threshold=float(os.getenv('AI_SEMANTIC_CACHE_THRESHOLD', 0.92)),
+        max_entries=int(os.getenv('AI_SEMANTIC_CACHE_MAX_ENTRIES', 50000)),
+        ann_threshold=int(os.getenv('AI_SEMANTIC_CACHE_ANN_THRESHOLD', 5000)),
+        ttl=int(os.getenv('AI_SEMANTIC_CACHE_TTL', 86400)),
+        max_temperature=float(os.getenv('AI_SEMANTIC_CACHE_MAX_TEMPERATURE', 0.0))
+    )
+    logger.info(f"Cache semântico ativo ({len(cache.index)} entradas carregadas)")
+    return cache
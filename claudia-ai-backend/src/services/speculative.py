@@ -0,0 +1,212 @@
+# Decodificação especulativa com um modelo rascunho pequeno
+
+import os
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativeDecoder:
+    """Modelo rascunho que propõe tokens verificados em lote pelo modelo principal
+
+    A cada rodada o rascunho propõe até ``draft_length`` tokens e o modelo
+    principal os avalia em uma única passada, aceitando o maior prefixo que
+    ele mesmo teria gerado: a saída é a mesma da geração normal, só que com
+    menos passadas do modelo grande. Se a taxa de aceitação nos últimos
+    ``window`` tokens propostos ficar abaixo de ``min_acceptance``, o
+    rascunho só custa tempo e é desligado até o próximo carregamento.
+
+    No Llama o rascunho é outro GGUF ligado ao ``draft_model`` do llama.cpp;
+    no Hugging Face, um modelo com o mesmo tokenizador usado como
+    ``assistant_model`` do generate.
+    """
+
+    def __init__(self, model_path, draft_length=4, min_acceptance=0.3, window=512):
+        self.model_path = model_path
+        self.draft_length = max(1, draft_length)
+        self.min_acceptance = min_acceptance
+        self.window = window
+        self.draft = None
+        self.enabled = False
+        self.disabled_reason = None
+        self._recent = deque()
+        self._recent_proposed = 0
+        self._recent_accepted = 0
+        self._forwards = {'main': 0, 'draft': 0}
+        self._on_disable = None
+        self._lock = threading.Lock()
+        self._stats = {'rounds': 0, 'proposed': 0, 'accepted': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Cria o decodificador se SPECULATIVE_DRAFT_MODEL estiver definido (opt-in)"""
+        model_path = os.getenv('SPECULATIVE_DRAFT_MODEL')
+        if not model_path:
+            return None
+        return cls(
+            model_path,
+            draft_length=int(os.getenv('SPECULATIVE_DRAFT_TOKENS', 4)),
+            min_acceptance=float(os.getenv('SPECULATIVE_MIN_ACCEPTANCE', 0.3)),
+            window=int(os.getenv('SPECULATIVE_WINDOW', 512))
+        )
+
+    # Carregamento por backend
+
+    def load_llama(self, model, runtime):
+        """Carrega o GGUF rascunho e o liga ao modelo Llama principal"""
+        from llama_cpp import Llama
+
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Modelo rascunho não encontrado: {self.model_path}")
+        self.draft = Llama(
+            model_path=self.model_path,
+            n_ctx=runtime.n_ctx,
+            n_batch=runtime.n_batch,
+            n_threads=runtime.n_threads,
+            n_threads_batch=runtime.n_threads_batch,
+            use_mmap=runtime.use_mmap,
+            verbose=False
+        )
+        model.draft_model = _GGUFDraftModel(self)
+        self._on_disable = lambda: setattr(model, 'draft_model', None)
+        self.enabled = True
+        logger.info(f"Decodificação especulativa ativa: {self.model_path} ({self.draft_length} tokens por rodada)")
+
+    def load_huggingface(self, model, runtime):
+        """Carrega o modelo assistente (mesmo tokenizador) do generate do Hugging Face"""
+        import torch
+        from transformers import AutoModelForCausalLM
+
+        if runtime.static_cache:
+            raise ValueError("decodificação especulativa não é compatível com HF_STATIC_CACHE")
+        draft = AutoModelForCausalLM.from_pretrained(self.model_path).to(model.device)
+        if runtime.dtype == 'bfloat16':
+            draft = draft.to(torch.bfloat16)
+        draft.eval()
+        # Comprimento fixo do rascunho (o padrão "heuristic" o ajusta sozinho)
+        draft.generation_config.num_assistant_tokens = self.draft_length
+        draft.generation_config.num_assistant_tokens_schedule = 'constant'
+        # Cada passada do principal é uma rodada de verificação; cada passada do rascunho, um token proposto
+        model.register_forward_pre_hook(lambda module, args: self._count_forward('main'))
+        draft.register_forward_pre_hook(lambda module, args: self._count_forward('draft'))
+        self.draft = draft
+        self.enabled = True
+        logger.info(f"Decodificação especulativa ativa: {self.model_path} ({self.draft_length} tokens por rodada)")
+
+    # Hugging Face
+
+    def hf_generate_kwargs(self):
+        """Argumentos extras do generate enquanto a especulação está ativa"""
+        return {'assistant_model': self.draft} if self.enabled else {}
+
+    def hf_snapshot(self):
+        with self._lock:
+            return dict(self._forwards)
+
+    def record_hf(self, snapshot, generated):
+        """Contabiliza uma geração assistida a partir das passadas desde ``snapshot``
+
+        Cada rodada produz os tokens aceitos mais um do próprio modelo
+        principal, então aceitos = gerados - rodadas.
+        """
+        with self._lock:
+            rounds = self._forwards['main'] - snapshot['main']
+            proposed = self._forwards['draft'] - snapshot['draft']
+        if rounds and proposed:
+            self.record(proposed, min(max(generated - rounds, 0), proposed), rounds)
+
+    def _count_forward(self, model):
+        with self._lock:
+            self._forwards[model] += 1
+
+    # Métricas
+
+    def record(self, proposed, accepted, rounds=1):
+        """Registra tokens propostos e aceitos; desliga a especulação abaixo do limiar"""
+        with self._lock:
+            self._stats['rounds'] += rounds
+            self._stats['proposed'] += proposed
+            self._stats['accepted'] += accepted
+            self._recent.append((proposed, accepted))
+            self._recent_proposed += proposed
+            self._recent_accepted += accepted
+            while len(self._recent) > 1 and self._recent_proposed - self._recent[0][0] >= self.window:
+                old_proposed, old_accepted = self._recent.popleft()
+                self._recent_proposed -= old_proposed
+                self._recent_accepted -= old_accepted
+            rate = self._recent_accepted / self._recent_proposed
+            low = self.enabled and self._recent_proposed >= self.window and rate < self.min_acceptance
+        if low:
+            self.disable(f"taxa de aceitação {rate:.2f} abaixo de {self.min_acceptance}")
+
+    def disable(self, reason):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.disabled_reason = reason
+        if self._on_disable:
+            self._on_disable()
+        logger.warning(f"Decodificação especulativa desativada: {reason}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            recent = self._recent_accepted / self._recent_proposed if self._recent_proposed else None
+        stats['acceptance_rate'] = round(stats['accepted'] / stats['proposed'], 3) if stats['proposed'] else None
+        stats['recent_acceptance_rate'] = round(recent, 3) if recent is not None else None
+        stats['tokens_per_round'] = (
+            round((stats['accepted'] + stats['rounds']) / stats['rounds'], 2) if stats['rounds'] else None
+        )
+        stats.update({
+            'enabled': self.enabled,
+            'draft_model': self.model_path,
+            'draft_length': self.draft_length,
+            'min_acceptance': self.min_acceptance,
+            'window': self.window,
+            'disabled_reason': self.disabled_reason
+        })
+        return stats
+
+
+class _GGUFDraftModel:
+    """``draft_model`` do llama.cpp: propõe tokens com o GGUF rascunho (decodificação gulosa)
+
+    O llama.cpp chama o rascunho a cada rodada com todos os tokens até o
+    último aceito; comparando-os com a proposta anterior sabemos quantos
+    tokens dela foram aceitos. O rascunho reaproveita o prefixo já avaliado
+    no próprio contexto, então cada chamada avalia só os tokens novos.
+    """
+
+    def __init__(self, decoder):
+        self.decoder = decoder
+        self._pending = None
+
+    def __call__(self, input_ids, **kwargs):
+        import numpy as np
+
+        ids = [int(token) for token in input_ids]
+        if self._pending is not None:
+            base, proposed = self._pending
+            self._pending = None
+            # Mesma geração: os tokens após a base são os aceitos mais o do modelo principal
+            if len(ids) > len(base) and ids[:len(base)] == base:
+                accepted = 0
+                for token, guess in zip(ids[len(base):], proposed):
+                    if token != guess:
+                        break
+                    accepted += 1
+                self.decoder.record(len(proposed), accepted)
+
+        draft = self.decoder.draft
+        tokens = []
+        for token in draft.generate(ids, top_k=1, temp=0.0, reset=True):
+            if token == draft.token_eos():
+                break
+            tokens.append(token)
+            if len(tokens) >= self.decoder.draft_length:
+                break
+        if tokens:
+            self._pending = (ids, tokens)
+        return np.array(tokens, dtype=np.intc)
@@ -0,0 +1,158 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from src.models.user import db
+from src.models.conversation import ConversationSummary, Message
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Atualize o resumo de uma conversa entre um usuário e a assistente Claudia, "
+    "incorporando as novas mensagens. Preserve fatos, nomes, preferências, pedidos "
+    "e decisões importantes. Responda apenas com o resumo, em português, com no "
+    "máximo {max_words} palavras.\n\n"
+    "Resumo atual:\n{summary}\n\n"
+    "Novas mensagens:\n{messages}"
+)
+
+
+class ConversationSummarizer:
+    """Resumo incremental das conversas longas, atualizado em segundo plano
+
+    Após cada resposta, se as mensagens ainda não resumidas passarem de
+    ``trigger_tokens``, as mais antigas são incorporadas ao resumo da conversa
+    (``ConversationSummary``) até restarem cerca de ``keep_tokens`` recentes.
+    O resumo anterior é reaproveitado: cada atualização processa apenas as
+    mensagens novas, e o contexto enviado ao modelo passa a ser resumo +
+    turnos recentes.
+    """
+
+    def __init__(self, service, context_builder, trigger_tokens=1500, keep_tokens=500,
+                 max_fold_tokens=1500, max_words=200):
+        self.service = service
+        self.context_builder = context_builder
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = min(keep_tokens, trigger_tokens)
+        self.max_fold_tokens = max_fold_tokens
+        self.max_words = max_words
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-summary')
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._stats = {'runs': 0, 'updates': 0, 'folded_messages': 0, 'failures': 0}
+
+    def schedule(self, conversation_id):
+        """Agenda a atualização do resumo da conversa (deve ser chamado no contexto do app)"""
+        app = current_app._get_current_object()
+        with self._lock:
+            if conversation_id in self._pending:
+                return
+            self._pending.add(conversation_id)
+        self.executor.submit(self._run, app, conversation_id)
+
+    def update(self, conversation_id):
+        """Incorpora ao resumo as mensagens antigas excedentes; retorna True se atualizou"""
+        summary = db.session.get(ConversationSummary, conversation_id)
+        summarized_until = summary.summarized_until_id if summary else 0
+        messages = Message.query.filter(
+            Message.conversation_id == conversation_id,
+            Message.id > summarized_until
+        ).order_by(Message.id).all()
+
+        for msg in messages:
+            self.context_builder.ensure_counted(msg)
+        remaining = sum(msg.tokens for msg in messages)
+        if remaining < self.trigger_tokens:
+            db.session.commit()
+            return False
+
+        # Mensagens mais antigas até sobrar a janela recente (limitado por chamada)
+        fold = []
+        folded_tokens = 0
+        for msg in messages:
+            if remaining <= self.keep_tokens:
+                break
+            if fold and folded_tokens + msg.tokens > self.max_fold_tokens:
+                break
+            fold.append(msg)
+            folded_tokens += msg.tokens
+            remaining -= msg.tokens
+
+        response = self.service.generate_response(
+            self._build_prompt(summary, fold), use_cache=False
+        )
+        if response.get('status') != 'success' or not response.get('response'):
+            # Modo demonstração ou falha: mantém as mensagens para a próxima tentativa
+            db.session.commit()
+            logger.warning(f"Resumo da conversa {conversation_id} não atualizado ({response.get('status')})")
+            return False
+
+        if summary is None:
+            summary = ConversationSummary(conversation_id)
+            db.session.add(summary)
+        summary.content = response['response']
+        summary.summarized_until_id = fold[-1].id
+        summary.summarized_messages += len(fold)
+        summary.tokenizer = None
+        self.context_builder.ensure_counted(summary)
+        db.session.commit()
+
+        self._count('updates')
+        self._count('folded_messages', len(fold))
+        logger.info(f"Resumo da conversa {conversation_id} atualizado ({len(fold)} mensagens incorporadas)")
+        return True
+
+    def get_stats(self):
+        """Retorna métricas do resumo incremental"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['trigger_tokens'] = self.trigger_tokens
+        stats['keep_tokens'] = self.keep_tokens
+        return stats
+
+    def _run(self, app, conversation_id):
+        with self._lock:
+            # Liberado antes do trabalho: respostas novas podem reagendar
+            self._pending.discard(conversation_id)
+        self._count('runs')
+        with app.app_context():
+            try:
+                # Pode precisar de mais de uma rodada após um período sem resumo
+                while self.update(conversation_id):
+                    pass
+            except Exception as e:
+                self._count('failures')
+                db.session.rollback()
+                logger.error(f"Erro ao resumir conversa {conversation_id}: {e}")
+
+    def _build_prompt(self, summary, messages):
+        labels = {'user': 'Usuário', 'assistant': 'Claudia'}
+        lines = "\n".join(f"{labels.get(msg.role, msg.role)}: {msg.content}" for msg in messages)
+        return SUMMARY_PROMPT.format(
+            max_words=self.max_words,
+            summary=summary.content if summary and summary.content else "(vazio)",
+            messages=lines
+        )
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+
+def create_summarizer(service, context_builder):
+    """Cria o resumo incremental a partir das variáveis de ambiente (opt-in)"""
+    if os.getenv('AI_SUMMARY_ENABLED', 'false').lower() != 'true':
+        return None
+
+    return ConversationSummarizer(
+        service,
+        context_builder,
+        trigger_tokens=int(os.getenv('AI_SUMMARY_TRIGGER_TOKENS', 1500)),
+        keep_tokens=int(os.getenv('AI_SUMMARY_KEEP_TOKENS', 500)),
+        max_fold_tokens=int(os.getenv('AI_SUMMARY_MAX_FOLD_TOKENS', 1500)),
+        max_words=int(os.getenv('AI_SUMMARY_MAX_WORDS', 200))
+    )
@@ -0,0 +1,173 @@
+import json
+import time
+import logging
+from datetime import datetime
+
+from sqlalchemy import insert, literal, select
+
+from src.models.user import db
+from src.models.conversation import Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 20
+
+CONVERSATION_COLUMNS = ('id', 'user_id', 'title', 'created_at', 'updated_at', 'is_active', 'metadata_json')
+MESSAGE_COLUMNS = ('id', 'conversation_id', 'role', 'content', 'created_at', 'tokens', 'tokenizer', 'metadata_json')
+
+
+def _export_columns(table, kind, columns):
+    """Colunas do registro exportado: o tipo como literal e metadata_json como metadata"""
+    return [literal(kind).label('type')] + [
+        table.c[name].label('metadata' if name == 'metadata_json' else name) for name in columns
+    ]
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+class TransferProgress:
+    """Contagem de linhas e taxa (linhas/s) para relatórios de progresso"""
+
+    def __init__(self, callback=None, every=10000):
+        self.callback = callback
+        self.every = every
+        self.rows = 0
+        self.started = time.perf_counter()
+        self._reported = 0
+
+    def add(self, count=1, force=False):
+        self.rows += count
+        if self.callback and (force or self.rows - self._reported >= self.every):
+            self._reported = self.rows
+            self.callback(self)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def export_ndjson(dumps, user_id=None, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Gera o histórico em NDJSON: conversas, depois mensagens agrupadas por conversa
+
+    As linhas são lidas com cursor no servidor (``yield_per``) e enviadas em
+    blocos de ``batch_size`` registros; nada é materializado por inteiro.
+    ``dumps`` é o do provider JSON do app (serializa datetime).
+    """
+    progress = progress or TransferProgress()
+    conversations = Conversation.__table__
+    messages = Message.__table__
+
+    conversation_query = select(*_export_columns(conversations, 'conversation', CONVERSATION_COLUMNS))
+    message_query = select(*_export_columns(messages, 'message', MESSAGE_COLUMNS))
+    if user_id is not None:
+        conversation_query = conversation_query.where(conversations.c.user_id == user_id)
+        message_query = message_query.join(
+            conversations, conversations.c.id == messages.c.conversation_id
+        ).where(conversations.c.user_id == user_id)
+    conversation_query = conversation_query.order_by(conversations.c.id)
+    message_query = message_query.order_by(messages.c.conversation_id, messages.c.created_at, messages.c.id)
+
+    for query in (conversation_query, message_query):
+        result = db.session.execute(query.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            yield ''.join(dumps(row._asdict()) + '\n' for row in partition)
+            progress.add(len(partition))
+    progress.add(0, force=True)
+
+
+def import_ndjson(lines, user_id=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, loads=json.loads):
+    """Importa NDJSON gerado por ``export_ndjson`` em transações de ``batch_size`` linhas
+
+    As conversas recebem ids novos e as mensagens são religadas a eles; com
+    ``user_id`` todas as conversas passam a pertencer a esse usuário. Linhas
+    inválidas são contadas e ignoradas. Retorna as estatísticas da importação;
+    se uma transação falhar, o que já foi confirmado permanece e ``error`` é
+    preenchido.
+    """
+    progress = progress or TransferProgress()
+    stats = {'conversations': 0, 'messages': 0, 'skipped': 0, 'invalid': 0, 'errors': []}
+    id_map = {}
+    seen_conversations = set()  # ids originais já lidos do arquivo
+    pending_conversations = []  # (id original, linha)
+    pending_messages = []
+
+    def reject(line_number, reason, key='invalid'):
+        stats[key] += 1
+        if len(stats['errors']) < MAX_REPORTED_ERRORS:
+            stats['errors'].append({'line': line_number, 'error': reason})
+
+    def flush():
+        if pending_conversations:
+            new_ids = db.session.execute(
+                insert(Conversation).returning(Conversation.id, sort_by_parameter_order=True),
+                [row for _, row in pending_conversations]
+            ).scalars().all()
+            id_map.update(zip((old_id for old_id, _ in pending_conversations), new_ids))
+        if pending_messages:
+            for row in pending_messages:
+                row['conversation_id'] = id_map[row['conversation_id']]
+            db.session.execute(insert(Message), pending_messages)
+        db.session.commit()
+        stats['conversations'] += len(pending_conversations)
+        stats['messages'] += len(pending_messages)
+        progress.add(len(pending_conversations) + len(pending_messages))
+        pending_conversations.clear()
+        pending_messages.clear()
+
+    try:
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = loads(line)
+                kind = record.get('type')
+                if kind == 'conversation':
+                    owner = user_id if user_id is not None else record['user_id']
+                    seen_conversations.add(record.get('id'))
+                    pending_conversations.append((record.get('id'), {
+                        'user_id': owner,
+                        'title': record.get('title') or 'Nova Conversa',
+                        'created_at': _parse_datetime(record.get('created_at')),
+                        'updated_at': _parse_datetime(record.get('updated_at') or record.get('created_at')),
+                        'is_active': record.get('is_active', True),
+                        'metadata_json': record.get('metadata') or {}
+                    }))
+                elif kind == 'message':
+                    conversation_id = record['conversation_id']
+                    if conversation_id not in seen_conversations:
+                        reject(line_number, f'conversa {conversation_id} não encontrada no arquivo', 'skipped')
+                        continue
+                    pending_messages.append({
+                        'conversation_id': conversation_id,
+                        'role': record['role'],
+                        'content': record['content'],
+                        'created_at': _parse_datetime(record.get('created_at')),
+                        'tokens': record.get('tokens') or 0,
+                        'tokenizer': record.get('tokenizer'),
+                        'metadata_json': record.get('metadata') or {}
+                    })
+                else:
+                    reject(line_number, f'tipo de registro desconhecido: {kind!r}')
+                    continue
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                reject(line_number, f'registro inválido: {e}')
+                continue
+
+            if len(pending_conversations) + len(pending_messages) >= batch_size:
+                flush()
+        flush()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erro ao importar conversas: {e}")
+        stats['error'] = str(e)
+
+    progress.add(0, force=True)
+    stats['rows_per_second'] = round(progress.rate, 1)
+    return stats
@@ -0,0 +1,52 @@
+import pytest
+
+from src.services import ai_service as ai_module
+from src.services.ai_service import ai_service, parse_timeout
+from src.services.scheduler import DeadlineExceededError
+
+
+@pytest.mark.parametrize('path', ['/api/ai/generate', '/api/ai/stream'])
+@pytest.mark.parametrize('timeout', ['30', 0, -5, True])
+def test_invalid_timeout_is_rejected(client, path, timeout):
+    response = client.post(path, json={'message': 'olá', 'timeout': timeout})
+
+    assert response.status_code == 400
+    assert 'timeout' in response.get_json()['error']
+
+
+def test_timeout_is_clamped(client, monkeypatch):
+    received = {}
+
+    def generate_response(**kwargs):
+        received['timeout'] = kwargs['timeout']
+        return {'response': 'oi', 'status': 'success'}
+
+    monkeypatch.setattr(ai_service, 'generate_response', generate_response)
+    response = client.post('/api/ai/generate', json={'message': 'olá', 'timeout': 10 ** 9})
+
+    assert response.status_code == 200
+    assert received['timeout'] == ai_module.MAX_REQUEST_TIMEOUT
+
+
+def test_parse_timeout():
+    assert parse_timeout({}) is None
+    assert parse_timeout({'timeout': 2}) == 2.0
+
+
+def test_ai_test_deadline_returns_504(client, monkeypatch):
+    def generate_response(**kwargs):
+        raise DeadlineExceededError('prazo excedido')
+
+    monkeypatch.setattr(ai_service, 'generate_response', generate_response)
+    response = client.post('/api/ai/test')
+
+    assert response.status_code == 504
+    assert response.get_json()['test_status'] == 'failed'
+
+
+def test_models_lists_runtime_stats_without_etag(client):
+    response = client.get('/api/ai/models')
+
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert 'router' in response.get_json()['current']
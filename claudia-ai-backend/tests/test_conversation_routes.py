@@ -0,0 +1,87 @@
+from src.models.user import User, db
+
+
+def _user(app):
+    with app.app_context():
+        user = User(username='ana', email='ana@example.com')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def test_posted_message_invalidates_the_list_etag(app, client):
+    user_id = _user(app)
+    conversation_id = client.post('/api/conversations', json={'user_id': user_id}).get_json()['id']
+    listing = client.get('/api/conversations')
+    etag = listing.headers['ETag']
+    assert client.get('/api/conversations', headers={'If-None-Match': etag}).status_code == 304
+
+    response = client.post(f'/api/conversations/{conversation_id}/messages',
+                           json={'role': 'user', 'content': 'olá'})
+    assert response.status_code == 201
+
+    listing = client.get('/api/conversations', headers={'If-None-Match': etag})
+    assert listing.status_code == 200
+    assert listing.get_json()[0]['message_count'] == 1
+
+
+def test_listing_pages_through_rows_without_updated_at(app, client):
+    from sqlalchemy import text
+
+    user_id = _user(app)
+    for i in range(3):
+        client.post('/api/conversations', json={'user_id': user_id, 'title': f'c{i}'})
+    with app.app_context():
+        # Linhas antigas, anteriores ao updated_at
+        db.session.execute(text('UPDATE conversations SET updated_at = NULL WHERE title != :title'),
+                           {'title': 'c2'})
+        db.session.commit()
+
+    titles = []
+    response = client.get('/api/conversations?limit=1')
+    while True:
+        assert response.status_code == 200
+        titles += [row['title'] for row in response.get_json()]
+        if 'X-Next-Cursor' not in response.headers:
+            break
+        response = client.get(f"/api/conversations?limit=1&cursor={response.headers['X-Next-Cursor']}")
+
+    assert titles == ['c2', 'c1', 'c0']
+
+
+def test_invalid_cursor_is_rejected(client):
+    import base64
+
+    aware = base64.urlsafe_b64encode(b'2026-01-01T00:00:00+00:00|5').decode()
+    for cursor in ('lixo', aware):
+        response = client.get(f'/api/conversations?cursor={cursor}')
+        assert response.status_code == 400
+
+
+def test_legacy_invalid_json_text_is_cleared_on_upgrade(tmp_path, monkeypatch):
+    import sqlite3
+
+    # Banco anterior ao tipo JSON: metadados e preferências em colunas de texto
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80), email VARCHAR(120),
+                            preferences TEXT);
+        CREATE TABLE conversations (id INTEGER PRIMARY KEY, user_id INTEGER, title VARCHAR(200),
+                                    created_at DATETIME, metadata_json TEXT);
+        INSERT INTO users VALUES (1, 'ana', 'ana@example.com', '{quebrado');
+        INSERT INTO conversations VALUES (1, 1, 'antiga', '2024-01-01 00:00:00', 'não é json');
+        INSERT INTO conversations VALUES (2, 1, 'válida', '2024-01-02 00:00:00', '{"tema": "x"}');
+    """)
+    conn.commit()
+    conn.close()
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setenv('AI_LOAD_MODE', 'sync')
+    monkeypatch.chdir(tmp_path)
+    from src.main import create_app
+
+    client = create_app().test_client()
+    response = client.get('/api/conversations')
+
+    assert response.status_code == 200
+    metadata = {item['title']: item['metadata'] for item in response.get_json()}
+    assert metadata == {'antiga': {}, 'válida': {'tema': 'x'}}
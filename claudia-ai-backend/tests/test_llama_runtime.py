@@ -0,0 +1,31 @@
+import os
+import threading
+
+import pytest
+
+from src.services.llama_runtime import LlamaRuntimeConfig, allowed_cpus
+
+
+@pytest.mark.skipif(not hasattr(os, 'sched_setaffinity') or len(allowed_cpus()) < 2,
+                    reason='requer sched_setaffinity e ao menos duas CPUs')
+def test_affinity_pins_threads_that_already_exist():
+    original = allowed_cpus()
+    started, release = threading.Event(), threading.Event()
+
+    def wait():
+        started.set()
+        release.wait()
+
+    # Thread criada antes, como o agendador ou as de requisição
+    thread = threading.Thread(target=wait, daemon=True)
+    thread.start()
+    started.wait()
+    try:
+        LlamaRuntimeConfig(cpus=original[:1]).apply_affinity()
+
+        assert os.sched_getaffinity(0) == {original[0]}
+        assert os.sched_getaffinity(thread.native_id) == {original[0]}
+    finally:
+        LlamaRuntimeConfig(cpus=original).apply_affinity()
+        release.set()
+        thread.join()
@@ -0,0 +1,83 @@
+import json
+import os
+
+from src.models.conversation import Conversation, Message
+from src.models.user import User, db
+from src.services.message_writer import MessageWriter, message_row
+
+
+def _conversation(app):
+    with app.app_context():
+        user = User(username='ana', email='ana@example.com')
+        db.session.add(user)
+        db.session.flush()
+        conversation = Conversation(user_id=user.id)
+        db.session.add(conversation)
+        db.session.commit()
+        return conversation.id
+
+
+def _write_spill(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(row, created_at=row['created_at'].isoformat())) + '\n')
+
+
+def _messages(app):
+    with app.app_context():
+        return [message.content for message in Message.query.order_by(Message.id)]
+
+
+def test_spill_is_replayed_by_a_single_writer(app, tmp_path):
+    conversation_id = _conversation(app)
+    spill = str(tmp_path / 'pending.jsonl')
+    _write_spill(spill, [message_row(conversation_id, 'user', 'pendente')])
+
+    writers = [MessageWriter(app, spill_path=spill) for _ in range(3)]
+    for writer in writers:
+        writer.close()
+
+    assert _messages(app) == ['pendente']
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('pending')]
+
+
+def test_bad_row_does_not_block_the_batch(app, tmp_path):
+    conversation_id = _conversation(app)
+    spill = str(tmp_path / 'pending.jsonl')
+    writer = MessageWriter(app, spill_path=spill, max_attempts=1)
+
+    rows = [message_row(conversation_id, 'user', 'ok 1'),
+            message_row(conversation_id, None, 'inválida'),
+            message_row(conversation_id, 'assistant', 'ok 2')]
+    assert writer.enqueue(rows)
+    assert writer.wait_for(conversation_id, timeout=5)
+    writer.close()
+
+    assert _messages(app) == ['ok 1', 'ok 2']
+    assert not os.path.exists(spill)
+    with open(str(tmp_path / 'pending.failed.jsonl'), encoding='utf-8') as f:
+        assert [json.loads(line)['content'] for line in f] == ['inválida']
+    assert writer.get_stats()['failed_rows'] == 1
+
+
+def test_replay_drains_valid_rows_and_sets_bad_ones_aside(app, tmp_path):
+    conversation_id = _conversation(app)
+    spill = str(tmp_path / 'pending.jsonl')
+    _write_spill(spill, [message_row(conversation_id, 'user', 'boa'),
+                         message_row(conversation_id, None, 'ruim')])
+
+    MessageWriter(app, spill_path=spill).close()
+
+    assert _messages(app) == ['boa']
+    assert not os.path.exists(spill)
+    assert os.path.exists(str(tmp_path / 'pending.failed.jsonl'))
+
+
+def test_claim_left_by_dead_process_is_resumed(app, tmp_path):
+    conversation_id = _conversation(app)
+    spill = str(tmp_path / 'pending.jsonl')
+    _write_spill(f'{spill}.999999999.replay', [message_row(conversation_id, 'user', 'retomada')])
+
+    MessageWriter(app, spill_path=spill).close()
+
+    assert _messages(app) == ['retomada']
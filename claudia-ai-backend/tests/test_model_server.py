@@ -0,0 +1,86 @@
+import json
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from src.services.model_server import ModelServerClient
+
+
+class _FakeServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Responde ``count_tokens`` contando as requisições recebidas"""
+
+    daemon_threads = True
+
+    def __init__(self, path, delay=0.0):
+        self.received = 0
+        self.delay = delay
+        self.connections = []
+        super().__init__(path, _Handler)
+
+    def drop_connections(self):
+        # Simula o reinício do servidor: as conexões ociosas dos clientes morrem
+        for conn in self.connections:
+            conn.shutdown(socket.SHUT_RDWR)
+        self.connections.clear()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections.append(self.connection)
+        try:
+            for line in self.rfile:
+                self.server.received += 1
+                time.sleep(self.server.delay)
+                self.wfile.write(json.dumps({'tokens': len(json.loads(line)['text'])}).encode() + b'\n')
+                self.wfile.flush()
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    servers = []
+
+    def start(delay=0.0):
+        server = _FakeServer(str(tmp_path / 'model.sock'), delay)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_closed_idle_connection_is_retried_once(server, tmp_path):
+    fake = server()
+    client = ModelServerClient(str(tmp_path / 'model.sock'), timeout=2.0)
+    # Duas conexões ociosas, ambas derrubadas pelo "reinício"
+    first, _ = client._request({'op': 'count_tokens', 'text': 'a'})
+    second, _ = client._request({'op': 'count_tokens', 'text': 'a'})
+    client._release(first)
+    client._release(second)
+    fake.drop_connections()
+
+    assert client.count_tokens('olá') == 3
+    assert fake.received == 3
+    assert client.get_stats()['idle_connections'] == 1
+
+
+def test_timeout_is_not_resent(server, tmp_path):
+    fake = server(delay=0.5)
+    client = ModelServerClient(str(tmp_path / 'model.sock'), timeout=2.0)
+    client.count_tokens('olá')
+
+    client.timeout = 0.1
+    for conn in client._idle:
+        conn.sock.settimeout(0.1)
+    with pytest.raises(TimeoutError):
+        client.count_tokens('olá')
+    time.sleep(0.6)
+    assert fake.received == 2
+    assert client.get_stats()['errors'] == 1
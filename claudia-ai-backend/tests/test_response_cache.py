@@ -0,0 +1,31 @@
+import os
+
+from src.services.response_cache import SQLiteCacheBackend
+
+
+def test_sqlite_connection_is_opened_lazily(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.db'))
+
+    assert backend._conn is None
+    backend.set('chave', {'response': 'oi'}, 60)
+    assert backend.get('chave') == {'response': 'oi'}
+
+
+def test_forked_worker_opens_its_own_connection(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.db'))
+    backend.set('mestre', 1, 60)
+    parent_conn = backend._conn
+
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            backend.set('worker', 2, 60)
+            ok = backend._conn is not parent_conn and backend.get('mestre') == 1
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert backend._conn is parent_conn
+    assert backend.get('worker') == 2
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from src.services.router import CircuitBreaker, ModelRouter
+
+
+class FakeService:
+    model_type = 'fake'
+    model_name = 'fake'
+    scheduler = None
+    openai_client = None
+
+
+def _stream(service):
+    yield {'text': 'olá', 'is_final': True, 'status': 'success'}
+
+
+async def _astream(service):
+    yield {'text': 'olá', 'is_final': True, 'status': 'success'}
+
+
+def _half_open_router():
+    router = ModelRouter({'local': FakeService()}, reset_timeout=0.0)
+    backend = router.backends[0]
+    backend.breaker.state = CircuitBreaker.OPEN
+    backend.breaker.opened_at = time.monotonic() - 1
+    return router, backend
+
+
+def test_stream_closed_before_iteration_releases_slot_and_probe():
+    router, backend = _half_open_router()
+
+    stream = router.stream(_stream)
+    assert backend.in_flight == 1 and not backend.breaker.available()
+    stream.close()
+
+    assert backend.in_flight == 0
+    assert backend.breaker.available()
+    assert backend.stats['cancelled'] == 1
+
+
+def test_async_stream_closed_before_iteration_releases_slot_and_probe():
+    router, backend = _half_open_router()
+
+    async def open_and_close():
+        stream = router.stream_async(_astream)
+        await stream.aclose()
+
+    asyncio.run(open_and_close())
+
+    assert backend.in_flight == 0
+    assert backend.breaker.available()
+
+
+def test_consumed_stream_is_finished_once():
+    router, backend = _half_open_router()
+
+    stream = router.stream(_stream)
+    chunks = list(stream)
+    stream.close()
+
+    assert chunks[0]['backend'] == 'local'
+    assert backend.in_flight == 0
+    assert backend.stats['succeeded'] == 1 and backend.stats['cancelled'] == 0
+    assert backend.breaker.state == CircuitBreaker.CLOSED
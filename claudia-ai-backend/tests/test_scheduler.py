@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from src.services.scheduler import InferenceScheduler
+
+
+def _scheduler(started):
+    release = threading.Event()
+    busy = threading.Event()
+
+    def generate_fn(message, context, conversation_id, sampling=None):
+        busy.set()
+        release.wait(2)
+        return {'response': message}
+
+    def stream_fn(message, context, conversation_id, sampling=None):
+        started.append(message)
+        yield {'text': message}
+
+    return InferenceScheduler(generate_fn, stream_fn), release, busy
+
+
+def _drain(scheduler, release):
+    release.set()
+    # Um job posterior só termina depois dos anteriores (worker único)
+    assert scheduler.generate('fim') == {'response': 'fim'}
+
+
+def test_stream_closed_before_iteration_is_cancelled():
+    started = []
+    scheduler, release, busy = _scheduler(started)
+    # Worker ocupado: o stream fica na fila até ser fechado
+    threading.Thread(target=scheduler.generate, args=('ocupado',), daemon=True).start()
+    assert busy.wait(2)
+
+    stream = scheduler.stream('nunca lido')
+    stream.close()
+    _drain(scheduler, release)
+
+    assert started == []
+
+
+def test_async_stream_closed_before_iteration_is_cancelled():
+    started = []
+    scheduler, release, busy = _scheduler(started)
+    # Worker ocupado: o stream fica na fila até ser fechado
+    threading.Thread(target=scheduler.generate, args=('ocupado',), daemon=True).start()
+    assert busy.wait(2)
+
+    async def open_and_close():
+        stream = scheduler.stream_async('nunca lido')
+        await stream.aclose()
+
+    asyncio.run(open_and_close())
+    _drain(scheduler, release)
+
+    assert started == []
+
+
+def test_stream_yields_chunks():
+    scheduler, release, _ = _scheduler([])
+    release.set()
+
+    assert list(scheduler.stream('olá')) == [{'text': 'olá'}]
@@ -0,0 +1,42 @@
+from src.models.conversation import Conversation, Message
+from src.models.search import search_index
+from src.models.user import User, db
+
+
+def _seed(app):
+    """Conversa antiga com o termo raro e muitas mensagens novas com o termo comum"""
+    with app.app_context():
+        owner = User(username='ana', email='ana@example.com')
+        other = User(username='bia', email='bia@example.com')
+        db.session.add_all([owner, other])
+        db.session.flush()
+        old = Conversation(user_id=owner.id, title='Antiga')
+        recent = Conversation(user_id=other.id, title='Recente')
+        db.session.add_all([old, recent])
+        db.session.flush()
+        db.session.add(Message(old.id, 'user', 'olá banana'))
+        db.session.flush()
+        db.session.add_all([Message(recent.id, 'user', f'olá {i}') for i in range(100)])
+        db.session.commit()
+        return owner.id, old.id
+
+
+def test_scoped_search_finds_matches_outside_global_window(app, client, monkeypatch):
+    monkeypatch.setattr(search_index, 'candidate_window', 50)
+    owner_id, old_id = _seed(app)
+
+    for scope in ({'conversation_id': old_id}, {'user_id': owner_id}):
+        response = client.get('/api/search', query_string={'q': 'olá', 'type': 'messages', **scope})
+        assert response.status_code == 200
+        results = response.get_json()['results']
+        assert [result['conversation_id'] for result in results] == [old_id]
+        assert '<mark>' in results[0]['snippet']
+
+
+def test_unscoped_search_ranks_within_window(app, client, monkeypatch):
+    monkeypatch.setattr(search_index, 'candidate_window', 50)
+    _seed(app)
+
+    response = client.get('/api/search', query_string={'q': 'olá', 'type': 'messages', 'limit': 100})
+    assert response.status_code == 200
+    assert len(response.get_json()['results']) == 50
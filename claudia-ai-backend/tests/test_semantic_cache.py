@@ -0,0 +1,132 @@
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from src.services.semantic_cache import SemanticCache
+
+
+class FakeEmbedder:
+    """Embeddings determinísticos por texto (mesmo texto, mesmo vetor)"""
+
+    model_name = 'fake'
+    dim = 16
+
+    def encode(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def _cache(tmp_path, **kwargs):
+    return SemanticCache(FakeEmbedder(), str(tmp_path / 'semantic'), **kwargs)
+
+
+def test_entries_written_by_other_processes_are_seen(tmp_path):
+    first, second = _cache(tmp_path), _cache(tmp_path)
+
+    first.add('olá', 'escopo', 'resposta 1')
+    second.add('tudo bem?', 'escopo', 'resposta 2')
+    first.add('bom dia', 'escopo', 'resposta 3')
+
+    # Cada entrada tem sua posição: nenhuma sobrescreve a de outro processo
+    for cache in (first, second, _cache(tmp_path)):
+        assert cache.lookup('olá', 'escopo')[0] == 'resposta 1'
+        assert cache.lookup('tudo bem?', 'escopo')[0] == 'resposta 2'
+        assert cache.lookup('bom dia', 'escopo')[0] == 'resposta 3'
+    assert len(second.index) == 3
+
+
+def test_scope_must_match(tmp_path):
+    cache = _cache(tmp_path)
+    cache.add('olá', 'escopo', 'resposta')
+
+    assert cache.lookup('olá', 'outro escopo') == (None, None)
+
+
+def test_oldest_entry_is_evicted_when_full(tmp_path):
+    first, second = _cache(tmp_path, max_entries=2), _cache(tmp_path, max_entries=2)
+
+    first.add('um', 'escopo', '1')
+    first.add('dois', 'escopo', '2')
+    second.add('três', 'escopo', '3')
+
+    for cache in (first, second):
+        assert cache.lookup('um', 'escopo') == (None, None)
+        assert cache.lookup('dois', 'escopo')[0] == '2'
+        assert cache.lookup('três', 'escopo')[0] == '3'
+
+
+def test_expired_entries_are_ignored(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, ttl=60)
+    cache.add('olá', 'escopo', 'resposta')
+    assert cache.lookup('olá', 'escopo')[0] == 'resposta'
+
+    later = time.time() + 120
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert cache.lookup('olá', 'escopo') == (None, None)
+    assert cache.get_stats()['expired'] == 1
+
+
+def test_compaction_keeps_live_entries(tmp_path):
+    cache = _cache(tmp_path, max_entries=3)
+    for i in range(10):
+        cache.add(f'mensagem {i}', 'escopo', str(i))
+
+    with open(f"{tmp_path / 'semantic'}.jsonl") as f:
+        assert len(f.readlines()) <= 6
+    reopened = _cache(tmp_path, max_entries=3)
+    assert reopened.lookup('mensagem 9', 'escopo')[0] == '9'
+    assert reopened.lookup('mensagem 6', 'escopo') == (None, None)
+
+    reopened.add('mensagem 10', 'escopo', '10')
+    assert cache.lookup('mensagem 10', 'escopo')[0] == '10'
+
+
+def test_ivf_is_persisted_and_reused(tmp_path):
+    cache = _cache(tmp_path, ann_threshold=20)
+    for i in range(30):
+        cache.add(f'mensagem {i}', 'escopo', str(i))
+
+    ivf_path = f"{tmp_path / 'semantic'}.vectors.ivf.npz"
+    assert os.path.exists(ivf_path)
+    built = os.stat(ivf_path).st_mtime_ns
+
+    reopened = _cache(tmp_path, ann_threshold=20)
+    assert reopened.get_stats()['index'] == 'ivf'
+    assert os.stat(ivf_path).st_mtime_ns == built
+    # Entradas posteriores ao IVF entram pela cauda
+    cache.add('mensagem nova', 'escopo', 'nova')
+    assert reopened.lookup('mensagem nova', 'escopo')[0] == 'nova'
+    assert reopened.lookup('mensagem 3', 'escopo')[0] == '3'
+
+
+def test_files_are_reset_when_the_embedding_model_changes(tmp_path):
+    cache = _cache(tmp_path)
+    cache.add('olá', 'escopo', 'resposta')
+
+    class OtherEmbedder(FakeEmbedder):
+        model_name = 'outro'
+
+    other = SemanticCache(OtherEmbedder(), str(tmp_path / 'semantic'))
+    assert len(other.index) == 0
+    assert other.lookup('olá', 'escopo') == (None, None)
+
+
+def test_scope_is_filtered_before_the_top_k_cut(tmp_path):
+    cache = _cache(tmp_path)
+    # Mais vizinhos idênticos em outros escopos do que o k da busca
+    for i in range(20):
+        cache.add('olá', f'outro {i}', 'errada')
+    cache.add('olá', 'escopo', 'certa')
+
+    assert cache.lookup('olá', 'escopo')[0] == 'certa'
+
+
+def test_only_deterministic_responses_are_cacheable_by_default(tmp_path):
+    cache = _cache(tmp_path)
+
+    assert cache.is_cacheable({'temperature': 0.0})
+    assert not cache.is_cacheable({'temperature': 0.7})
+    assert _cache(tmp_path, max_temperature=1.0).is_cacheable({'temperature': 0.7})